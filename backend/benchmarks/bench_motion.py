@@ -0,0 +1,126 @@
+"""
+Motion scoring benchmark: legacy per-sample seeking vs. sequential decoding.
+
+Encodes a long-GOP 1080p H.264 clip with ffmpeg (falls back to an mp4v clip
+written by OpenCV if ffmpeg is unavailable), then scores consecutive
+windows with:
+
+  * the legacy loop (``CAP_PROP_POS_MSEC`` seek after every sample, full
+    resolution diffs),
+  * ``window_motion`` (one seek per window, grab()/retrieve() decimation,
+    320px diffs) -- ``MOTION_BACKEND=window``,
+  * the cached timeline (one decode per clip, O(1) queries) --
+    ``MOTION_BACKEND=timeline``.
+
+Only motion scoring is timed. The highlight detector needs the whole-clip
+pass for scene cuts and loudness under either backend, so the window
+backend's speed-up does not carry over to a full detection run.
+
+Usage (from backend/):
+    python benchmarks/bench_motion.py [--seconds 30] [--window 5] [--gop 250]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pipeline import features as ft  # noqa: E402
+from pipeline.window_index import WindowIndex  # noqa: E402
+
+
+def make_clip(path: str, seconds: int, gop: int) -> None:
+    if shutil.which("ffmpeg"):
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size=1920x1080:rate=30:duration={seconds}",
+                "-c:v", "libx264", "-preset", "ultrafast", "-g", str(gop),
+                "-pix_fmt", "yuv420p", path,
+            ],
+            check=True,
+        )
+        return
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (1920, 1080))
+    for i in range(seconds * 30):
+        frame = np.full((1080, 1920, 3), (i * 3) % 255, np.uint8)
+        cv2.circle(frame, ((i * 20) % 1800 + 60, 540), 80, (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def legacy_motion_score(video_path: str, start: float, duration: float, sample_fps: int = 6) -> float:
+    """The pre-feature-store implementation, kept verbatim for comparison."""
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000.0)
+    prev = None
+    motion_values = []
+    ms_step = 1000.0 / sample_fps
+    while True:
+        pos = cap.get(cv2.CAP_PROP_POS_MSEC)
+        if pos - start * 1000.0 > duration * 1000.0:
+            break
+        ret, frame = cap.read()
+        if not ret:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if prev is not None:
+            motion_values.append(float(cv2.absdiff(gray, prev).mean()))
+        prev = gray
+        cap.set(cv2.CAP_PROP_POS_MSEC, pos + ms_step)
+    cap.release()
+    return float(np.median(motion_values)) if motion_values else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--window", type=float, default=5.0)
+    parser.add_argument("--gop", type=int, default=250)
+    args = parser.parse_args()
+
+    ft.load_pcm = lambda *_: None  # video-only benchmark
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "long_gop.mp4")
+        make_clip(path, args.seconds, args.gop)
+        windows = [(s, args.window) for s in np.arange(0.0, args.seconds - 1e-6, args.window)]
+
+        timings = {}
+        scores = {}
+
+        start = time.perf_counter()
+        scores["legacy seek per sample"] = [legacy_motion_score(path, s, d) for s, d in windows]
+        timings["legacy seek per sample"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores["window: sequential decimated"] = [
+            float(np.median(v)) if (v := ft.window_motion(path, s, d)).size else 0.0
+            for s, d in windows
+        ]
+        timings["window: sequential decimated"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = WindowIndex(ft.extract_clip_features(path, ft.FULL_PROFILE))
+        scores["timeline: one pass + index"] = [index.motion_median(s, d) for s, d in windows]
+        timings["timeline: one pass + index"] = time.perf_counter() - start
+
+    baseline = timings["legacy seek per sample"]
+    print(f"{args.seconds}s 1080p30 clip, GOP {args.gop}, {len(windows)} x {args.window:g}s windows")
+    print(f"{'backend':<32}{'seconds':>9}{'speed-up':>10}{'rank corr':>11}")
+    ref = np.argsort(np.argsort(scores["legacy seek per sample"]))
+    for name, elapsed in timings.items():
+        ranks = np.argsort(np.argsort(scores[name]))
+        corr = float(np.corrcoef(ref, ranks)[0, 1]) if len(windows) > 1 else 1.0
+        print(f"{name:<32}{elapsed:>9.2f}{baseline / elapsed:>9.1f}x{corr:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Profanity redaction benchmark: chained per-span volume filters vs. one
+asendcmd-driven gain automation.
+
+Generates a synthetic transcript with thousands of profanity spans spread
+over several long source recordings and a timeline of short slices taken
+from them, then mutes a tone of the timeline's length with:
+
+  * the legacy chain (one ``volume=enable='between(...)'`` filter per span
+    of every source, in source time; fed through -filter_script because the
+    inline chain exceeds the per-argument limit at a few thousand spans),
+  * ``build_redaction_filter`` (spans mapped onto the timeline and merged,
+    one volume filter, commands file).
+
+Both outputs are decoded and checked for silence inside every timeline span.
+
+Usage (from backend/):
+    python benchmarks/bench_redaction.py [--spans 3000] [--slices 8]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pipeline import censor  # noqa: E402
+
+SAMPLE_RATE = 44100
+
+
+def legacy_mute_filters(spans: List[Dict]) -> str:
+    """The pre-redaction-engine implementation, kept verbatim for comparison."""
+    parts = []
+    for s in spans:
+        start = float(s.get("start", 0.0))
+        end = float(s.get("end", start + 0.5))
+        parts.append(f"volume=enable='between(t,{start},{end})':volume=0")
+    if not parts:
+        return "anull"
+    return ",".join(parts)
+
+
+def mute(seconds: float, script: str, tmp: str) -> np.ndarray:
+    script_path = os.path.join(tmp, "filter.txt")
+    with open(script_path, "w") as f:
+        f.write(script)
+    return np.frombuffer(
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate={SAMPLE_RATE}:duration={seconds}",
+                "-filter_script:a", script_path, "-f", "s16le", "-ac", "1", "pipe:1",
+            ],
+            check=True,
+            capture_output=True,
+        ).stdout,
+        dtype="<i2",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--spans", type=int, default=3000)
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--source-seconds", type=float, default=3600.0)
+    parser.add_argument("--slices", type=int, default=8)
+    parser.add_argument("--slice-seconds", type=float, default=15.0)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    paths = [f"clip{i}.mp4" for i in range(args.sources)]
+    spans_by_source: Dict[str, List[Dict]] = {path: [] for path in paths}
+    for _ in range(args.spans):
+        word = rng.uniform(0, args.source_seconds - 0.5)
+        span = {"start": word, "end": word + rng.uniform(0.2, 0.5)}
+        spans_by_source[rng.choice(paths)].append(span)
+    clips = [
+        (
+            rng.choice(paths),
+            rng.uniform(0, args.source_seconds - args.slice_seconds),
+            args.slice_seconds,
+        )
+        for _ in range(args.slices)
+    ]
+    seconds = args.slices * args.slice_seconds
+
+    begin = time.perf_counter()
+    intervals = censor.profanity_on_timeline(clips, spans_by_source, pad=0.0)
+    mapping = time.perf_counter() - begin
+
+    timings = {}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        censor.cache_dir = lambda kind: tmp
+
+        # The legacy task chained every span of a source, in source time
+        begin = time.perf_counter()
+        chain = legacy_mute_filters([s for spans in spans_by_source.values() for s in spans])
+        results["legacy: chained volume"] = mute(seconds, chain, tmp)
+        timings["legacy: chained volume"] = (time.perf_counter() - begin, len(chain))
+
+        begin = time.perf_counter()
+        chain = censor.build_redaction_filter(intervals)
+        results["asendcmd: one volume"] = mute(seconds, chain, tmp)
+        timings["asendcmd: one volume"] = (time.perf_counter() - begin, len(chain))
+
+    print(
+        f"{args.spans} spans over {args.sources} x {args.source_seconds:g}s sources; "
+        f"{args.slices} x {args.slice_seconds:g}s slices -> {len(intervals)} timeline "
+        f"intervals ({mapping * 1000:.1f} ms to map)"
+    )
+    print(f"{'mixdown':<26}{'seconds':>9}{'speed-up':>10}{'filter chars':>14}{'peak in spans':>15}")
+    baseline = timings["legacy: chained volume"][0]
+    for name, (elapsed, chars) in timings.items():
+        samples = results[name]
+        # Skip one audio frame at each edge: both filters switch per frame;
+        # the legacy chain mutes source times, so it misses timeline spans
+        inside = [
+            samples[int(s * SAMPLE_RATE) + 1024 : int(e * SAMPLE_RATE) - 1024] for s, e in intervals
+        ]
+        peak = max((int(np.abs(x).max(initial=0)) for x in inside), default=0)
+        print(f"{name:<26}{elapsed:>9.2f}{baseline / elapsed:>9.1f}x{chars:>14}{peak:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Scene detection benchmark: full single-pass analysis vs. the "fast" profile.
+
+Generates synthetic 1080p30 clips with known cut positions (moving shapes
+over changing backgrounds plus sensor noise), then reports wall time and
+cut accuracy for each analysis profile, and for PySceneDetect's
+ContentDetector when it is installed.
+
+Usage (from backend/):
+    python benchmarks/bench_scene_detection.py [--clips 3] [--seconds 30]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pipeline import features as ft  # noqa: E402
+from pipeline.features import AnalysisProfile  # noqa: E402
+
+WIDTH, HEIGHT, FPS = 1920, 1080, 30
+
+
+def make_clip(path: str, seconds: int, seed: int) -> List[float]:
+    """Write a synthetic clip and return its ground-truth cut times."""
+    rng = np.random.default_rng(seed)
+    total = seconds * FPS
+    cuts = sorted(rng.choice(np.arange(FPS, total - FPS), size=max(1, seconds // 4), replace=False))
+    cuts = [c for i, c in enumerate(cuts) if i == 0 or c - cuts[i - 1] > FPS]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), FPS, (WIDTH, HEIGHT))
+    bounds = [0] + list(cuts) + [total]
+    for scene in range(len(bounds) - 1):
+        base = rng.integers(0, 255, size=3)
+        grad = np.linspace(0, 60, WIDTH, dtype=np.float32)[None, :, None]
+        background = np.clip(base[None, None, :] + grad, 0, 255).astype(np.uint8)
+        background = np.repeat(background, HEIGHT, axis=0)
+        vx, vy = rng.integers(-25, 25, size=2)
+        x, y = rng.integers(200, 1500), rng.integers(200, 800)
+        for _ in range(bounds[scene + 1] - bounds[scene]):
+            frame = background.copy()
+            x, y = (x + vx) % (WIDTH - 200), (y + vy) % (HEIGHT - 200)
+            cv2.circle(frame, (int(x) + 100, int(y) + 100), 90, (255, 255, 255), -1)
+            noise = rng.integers(-6, 6, size=(HEIGHT // 8, WIDTH // 8, 1), dtype=np.int16)
+            noise = cv2.resize(noise.astype(np.float32), (WIDTH, HEIGHT))[:, :, None]
+            frame = np.clip(frame.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+            writer.write(frame)
+    writer.release()
+    return [c / FPS for c in cuts]
+
+
+def score(truth: List[float], found: List[float], tolerance: float) -> Tuple[float, float, float]:
+    """Return (precision, recall, mean abs error of matched cuts)."""
+    matched, errors = 0, []
+    remaining = list(found)
+    for t in truth:
+        if not remaining:
+            break
+        nearest = min(remaining, key=lambda f: abs(f - t))
+        if abs(nearest - t) <= tolerance:
+            matched += 1
+            errors.append(abs(nearest - t))
+            remaining.remove(nearest)
+    precision = matched / len(found) if found else 1.0
+    recall = matched / len(truth) if truth else 1.0
+    return precision, recall, float(np.mean(errors)) if errors else 0.0
+
+
+def profile_cuts(path: str, profile: AnalysisProfile) -> List[float]:
+    features = ft.extract_clip_features(path, profile)
+    return [start for start, _ in (features.scenes or [])[1:]]
+
+
+def pyscenedetect_cuts(path: str) -> List[float]:
+    from scenedetect import SceneManager, open_video
+    from scenedetect.detectors import ContentDetector
+
+    video = open_video(path)
+    manager = SceneManager()
+    manager.add_detector(ContentDetector(threshold=30.0))
+    manager.auto_downscale = True
+    manager.detect_scenes(video)
+    return [s.get_seconds() for s, _ in manager.get_scene_list()[1:]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clips", type=int, default=3)
+    parser.add_argument("--seconds", type=int, default=30)
+    args = parser.parse_args()
+
+    ft.load_pcm = lambda *_: None  # video-only benchmark
+    detectors = {
+        "full (320px, every frame)": lambda p: profile_cuts(p, ft.FULL_PROFILE),
+        "fast (160px @ 10 fps + refine)": lambda p: profile_cuts(
+            p, AnalysisProfile("fast", width=160, sample_fps=10.0, refine=True)
+        ),
+        "fast, no refine": lambda p: profile_cuts(
+            p, AnalysisProfile("fast-norefine", width=160, sample_fps=10.0)
+        ),
+    }
+    try:
+        import scenedetect  # noqa: F401
+
+        detectors["PySceneDetect ContentDetector"] = pyscenedetect_cuts
+    except ImportError:
+        pass
+
+    results = {name: [] for name in detectors}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.clips):
+            path = os.path.join(tmp, f"clip_{i}.mp4")
+            truth = make_clip(path, args.seconds, seed=i)
+            for name, detect in detectors.items():
+                start = time.perf_counter()
+                found = detect(path)
+                elapsed = time.perf_counter() - start
+                results[name].append((elapsed, *score(truth, found, tolerance=0.2)))
+
+    print(f"{args.clips} clips x {args.seconds}s @ {WIDTH}x{HEIGHT}/{FPS}fps")
+    print(f"{'detector':<34}{'sec/clip':>10}{'x realtime':>12}{'precision':>11}{'recall':>8}{'err ms':>8}")
+    for name, rows in results.items():
+        arr = np.array(rows)
+        elapsed, precision, recall, err = arr.mean(axis=0)
+        print(
+            f"{name:<34}{elapsed:>10.2f}{args.seconds / elapsed:>12.1f}"
+            f"{precision:>11.2f}{recall:>8.2f}{err * 1000:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
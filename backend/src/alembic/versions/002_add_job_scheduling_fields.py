@@ -0,0 +1,30 @@
+"""Add admission scheduling fields to job table
+
+Revision ID: 002_job_scheduling
+Revises: 001_add_lockout
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '002_job_scheduling'
+down_revision: Union[str, None] = '001_add_lockout'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('job', sa.Column('lane', sa.String(), nullable=True))
+    op.add_column('job', sa.Column('input_seconds', sa.Float(), nullable=True))
+    op.add_column('job', sa.Column('variant_count', sa.Integer(), nullable=True))
+    op.add_column('job', sa.Column('estimated_seconds', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('job', 'estimated_seconds')
+    op.drop_column('job', 'variant_count')
+    op.drop_column('job', 'input_seconds')
+    op.drop_column('job', 'lane')
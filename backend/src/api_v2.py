@@ -1,15 +1,27 @@
 from fastapi import APIRouter, UploadFile, File, Form, Query, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from typing import List, Optional
-from storage import job_upload_dir, job_export_dir
-from models import Job, JobStatus, Render, User
+from storage import job_cancel_marker, job_upload_dir, job_export_dir
+from models import Job, JobStatus, Render, User, UserRole
 from db import get_session
 from sqlmodel import select
-from tasks import render_job
+from tasks import RENDER_VARIANTS, render_job
+from services.job_scheduler import (
+    AdmissionRejected,
+    admit,
+    estimate_job,
+    eta_seconds,
+    probe_input_seconds,
+    render_queue,
+    user_plan,
+)
 from services.storage_adapters import get_storage
 from auth import get_current_user
 from security import validate_video_file, MAX_FILE_SIZE, MAX_TOTAL_UPLOAD_SIZE, sanitize_filename, validate_job_id
 import os
+import shutil
+from datetime import datetime, timedelta
 from config import settings
 
 router = APIRouter(prefix="/api/v2")
@@ -101,19 +113,45 @@ async def create_job_v2(
         )
 
     user_id = current_user.user_id if current_user else None
+    # ffprobe blocks; keep it off the event loop
+    input_seconds = await run_in_threadpool(
+        probe_input_seconds,
+        [os.path.join(uploads_dir, name) for name in os.listdir(uploads_dir)],
+    )
 
     with get_session() as session:
+        plan = user_plan(session, user_id)
+        estimate = estimate_job(
+            session, input_seconds, target_duration, len(RENDER_VARIANTS), plan
+        )
         job = Job(
             job_id=jid,
             status=JobStatus.PENDING,
             target_duration=target_duration,
             user_id=user_id,
             style_id=style,
+            lane=estimate.lane,
+            input_seconds=estimate.input_seconds,
+            variant_count=estimate.variant_count,
+            estimated_seconds=estimate.estimated_seconds,
         )
         session.add(job)
         session.commit()
+        # Admitted against the jobs inserted before this one, so concurrent
+        # submissions cannot all pass the same check
+        try:
+            admit(session, user_id, plan, estimate, before_id=job.id)
+        except AdmissionRejected as exc:
+            session.delete(job)
+            session.commit()
+            shutil.rmtree(uploads_dir, ignore_errors=True)
+            return JSONResponse(
+                {"error": str(exc), "retry_after": exc.retry_after},
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(exc.retry_after)},
+            )
 
-    render_job.delay(jid, target_duration)
+    render_job.apply_async((jid, target_duration), queue=render_queue(estimate.lane))
 
     return {
         "job_id": jid,
@@ -166,8 +204,15 @@ def job_status_v2(job_id: str):
             "started_at": job.started_at.isoformat() if job.started_at else None,
             "finished_at": job.finished_at.isoformat() if job.finished_at else None,
             "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+            "lane": job.lane,
         }
 
+        # Predicted completion, from the job's estimate and the work queued ahead
+        eta = eta_seconds(session, job)
+        if eta is not None:
+            result["eta_seconds"] = eta
+            result["eta"] = (datetime.utcnow() + timedelta(seconds=eta)).isoformat()
+
         # Include progress if available
         if job.progress:
             try:
@@ -189,6 +234,32 @@ def job_status_v2(job_id: str):
         return result
 
 
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job_v2(job_id: str, current_user: Optional[User] = Depends(get_current_user)):
+    """Cancel a queued or running job; it fails as cancelled at its next ffmpeg step."""
+    validate_job_id(job_id)
+    with get_session() as session:
+        job = session.exec(select(Job).where(Job.job_id == job_id)).first()
+        if not job:
+            return JSONResponse({"error": "job not found"}, status_code=404)
+        # Jobs submitted without an account have no owner: only admins may
+        # cancel those
+        is_owner = bool(job.user_id) and current_user is not None and current_user.user_id == job.user_id
+        is_admin = current_user is not None and (
+            current_user.is_admin or current_user.role in (UserRole.ADMIN, UserRole.OWNER)
+        )
+        if not (is_owner or is_admin):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your job")
+        if job.status not in (JobStatus.PENDING, JobStatus.PROCESSING, JobStatus.RETRYING):
+            return JSONResponse({"error": f"job is {job.status}"}, status_code=409)
+
+    # The worker running the job polls for this marker and kills its ffmpeg
+    # processes (a queued job sees it when it starts)
+    with open(job_cancel_marker(job_id), "w"):
+        pass
+    return {"job_id": job_id, "status": "cancelling"}
+
+
 @router.get("/jobs/{job_id}/download")
 def job_download_v2(
     job_id: str, format: str = Query("landscape", enum=["landscape", "portrait"])
@@ -17,7 +17,18 @@ class Settings(BaseSettings):
     USE_POSTGRES: bool = False
     USE_OBJECT_STORAGE: bool = False
     USE_HIGHLIGHT_MODEL: bool = False
-    HIGHLIGHT_DETECTOR: str = "heuristic"
+    HIGHLIGHT_DETECTOR: str = "heuristic"  # heuristic, fast
+    # "fast" detector: cuts found on a decimated, downscaled stream, then refined
+    FAST_ANALYSIS_WIDTH: int = 160
+    FAST_ANALYSIS_FPS: float = 10.0
+    # Motion source: "timeline" (cached whole-clip features) or "window"
+    # (sequential decimated decode of just the scored window). Only motion:
+    # scene cuts and loudness still come from the whole-clip features
+    MOTION_BACKEND: str = "timeline"
+    # Highlight selection: max windows per source clip (0 = no cap) and the
+    # value multiplier applied per earlier pick from the same clip
+    HIGHLIGHT_MAX_PER_CLIP: int = 0
+    HIGHLIGHT_REPEAT_DECAY: float = 1.0  # 1.0 = off; e.g. 0.85 to spread picks across clips
 
     # Freemium
     FREEMIUM_MAX_DURATION: int = 60
@@ -25,6 +36,67 @@ class Settings(BaseSettings):
 
     # Rendering
     ENABLE_NVENC: bool = True
+    RENDER_MODE: str = "segments"  # segments (parallel per-slice encodes), concat
+    RENDER_MAX_WORKERS: int = 0  # concurrent segment encodes; 0 = auto
+    RENDER_SEGMENT_THREADS: int = 2  # x264 threads per segment output; fixed so output is reproducible
+    # Large jobs fan out to other workers through Celery chords (0 = never)
+    RENDER_SHARD_MIN_CLIPS: int = 8  # uploads at which clips are preprocessed/analysed per task
+    RENDER_SHARD_MIN_SEGMENTS: int = 24  # selected slices at which segments are encoded per task
+    NVENC_MAX_SESSIONS: int = 3
+
+    # Limits applied to every ffmpeg process (0 = unlimited / off)
+    FFMPEG_TIMEOUT_SECONDS: int = 3600  # wall clock per process
+    FFMPEG_STALL_SECONDS: int = 300  # kill when -progress output stops advancing
+    FFMPEG_MAX_MEMORY_MB: int = 0  # address space per process
+    FFMPEG_MAX_CPU_SECONDS: int = 0  # CPU time per process
+    FFMPEG_NICE: int = 0  # niceness added to ffmpeg, so API/IO work keeps priority
+
+    # Preprocessing target; conforming uploads are remuxed instead of re-encoded
+    NORMALIZE_WIDTH: int = 1920
+    NORMALIZE_FPS: int = 30
+    NORMALIZE_VIDEO_CODEC: str = "h264"
+    NORMALIZE_PIX_FMT: str = "yuv420p"
+    NORMALIZE_AUDIO_CODEC: str = "aac"
+    NORMALIZE_AUDIO_BITRATE: str = "192k"
+
+    # Analysis caches (content-addressed, LRU-evicted to these sizes)
+    FEATURE_CACHE_MAX_MB: int = 2048
+    AUDIO_CACHE_MAX_MB: int = 4096
+    TRANSCRIPT_CACHE_MAX_MB: int = 256  # per-window STT results
+
+    # Finished renders, keyed by source content + slices + render settings
+    RENDER_CACHE_ENABLED: bool = True
+    RENDER_CACHE_MAX_MB: int = 20480
+    RENDER_CACHE_MAX_AGE_HOURS: int = 168  # 0 = evict by size only
+
+    # Pre-rendered music beds, one per (generator params, duration bucket)
+    MUSIC_LIBRARY_ENABLED: bool = True
+    MUSIC_LIBRARY_BUCKETS: str = "15,30,45,60,90,120,180,300"  # seconds
+    MUSIC_LIBRARY_FADE_SECONDS: float = 1.0  # fade-out applied when trimming a bed
+    MUSIC_LIBRARY_MAX_MB: int = 1024
+
+    # Worker parallelism
+    WORKER_CONCURRENCY: int = 4  # Celery tasks running side by side per host
+    WORKER_PROFILE: str = "all"  # queues this worker consumes: render, io, batch or all
+    IO_WORKER_CONCURRENCY: int = 32  # threads of an io-profile worker
+    CELERY_VISIBILITY_TIMEOUT_SECONDS: int = 14400  # redelivery of unacked tasks; > longest render
+    ANALYSIS_MAX_WORKERS: int = 0  # per-task clip analysis threads; 0 = auto
+    PREPROCESS_MAX_WORKERS: int = 0  # concurrent normalize encodes; 0 = auto
+    PREPROCESS_THREADS_PER_CLIP: int = 2  # x264 threads per normalize encode; fixed so output is reproducible
+    # Host-wide CPU slots handed to ffmpeg encodes and clip decodes, shared by
+    # all worker processes through lock files in a host-local directory, which
+    # every worker container on the host must mount (see docker-compose.yml)
+    CPU_GOVERNOR_ENABLED: bool = True
+    CPU_GOVERNOR_SLOTS: int = 0  # 0 = available CPUs
+    CPU_GOVERNOR_DIR: str = ""  # "" = temp dir; only shared within one container
+
+    # Render admission: jobs are costed from their probed input, output and
+    # the recent processing rate, then routed into priority lanes
+    SCHEDULER_RENDER_CAPACITY: int = 0  # render jobs run at once fleet-wide; 0 = WORKER_CONCURRENCY
+    SCHEDULER_MAX_WAIT_SECONDS: int = 1800  # reject (429) when the predicted queue wait is longer
+    SCHEDULER_USER_CONCURRENCY: str = "free=1,pro=3,creator=5"  # active jobs per user, by plan
+    SCHEDULER_BULK_INPUT_SECONDS: int = 1800  # larger uploads drop one lane
+    SCHEDULER_DEFAULT_RATE: float = 0.5  # seconds per work unit until there is history
 
     # DB
     # ⚠️ SECURITY: Development defaults only. Override via environment variables in production!
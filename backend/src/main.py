@@ -1,4 +1,5 @@
 from fastapi import FastAPI, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse, JSONResponse
 from starlette.background import BackgroundTask
 from media_processing import process_zip_highlight
@@ -14,7 +15,15 @@ from sqlmodel import select, func
 import logging
 
 logger = logging.getLogger(__name__)
-from tasks import render_job
+from tasks import RENDER_VARIANTS, render_job
+from services.job_scheduler import (
+    AdmissionRejected,
+    admit,
+    estimate_job,
+    probe_input_seconds,
+    render_queue,
+    user_plan,
+)
 from api_v2 import router as v2_router
 from api_accounts_v2 import router as accounts_v2_router
 from api_styles_v2 import router as styles_v2_router
@@ -349,12 +358,40 @@ async def create_job(
         with open(dst, "wb") as f:
             f.write(await uf.read())
 
+    input_seconds = await run_in_threadpool(
+        probe_input_seconds,
+        [os.path.join(uploads_dir, name) for name in os.listdir(uploads_dir)],
+    )
+
     with get_session() as session:
-        job = Job(job_id=jid, status=JobStatus.PENDING, target_duration=target_duration)
+        plan = user_plan(session, None)
+        estimate = estimate_job(
+            session, input_seconds, target_duration, len(RENDER_VARIANTS), plan
+        )
+        job = Job(
+            job_id=jid,
+            status=JobStatus.PENDING,
+            target_duration=target_duration,
+            lane=estimate.lane,
+            input_seconds=estimate.input_seconds,
+            variant_count=estimate.variant_count,
+            estimated_seconds=estimate.estimated_seconds,
+        )
         session.add(job)
         session.commit()
-
-    render_job.delay(jid, target_duration)
+        try:
+            admit(session, None, plan, estimate, before_id=job.id)
+        except AdmissionRejected as exc:
+            session.delete(job)
+            session.commit()
+            shutil.rmtree(uploads_dir, ignore_errors=True)
+            return JSONResponse(
+                {"error": str(exc), "retry_after": exc.retry_after},
+                status_code=429,
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+
+    render_job.apply_async((jid, target_duration), queue=render_queue(estimate.lane))
 
     return {
         "job_id": jid,
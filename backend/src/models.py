@@ -30,6 +30,10 @@ class Job(SQLModel, table=True):
     user_id: Optional[str] = Field(default=None, index=True)  # Track job owner
     style_id: Optional[str] = Field(default=None, index=True)  # Style used for this job
     processing_time_seconds: Optional[float] = None  # How long processing took
+    lane: Optional[str] = None  # Admission lane (see services.job_scheduler)
+    input_seconds: Optional[float] = None  # Probed duration of the uploads
+    variant_count: Optional[int] = None
+    estimated_seconds: Optional[float] = None  # Predicted processing time at admission
 
 
 class Clip(SQLModel, table=True):
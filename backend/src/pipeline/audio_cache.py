@@ -0,0 +1,138 @@
+"""
+Shared PCM audio cache.
+
+Each clip's audio track is decoded once to mono float32 and stored as
+``<content-hash>_<rate>.npy`` in the audio cache directory; ffmpeg streams
+the samples into the file, so a long clip is never held in memory. Loudness,
+energy, onset and STT consumers open it with ``np.load(mmap_mode="r")`` and
+take zero-copy slices instead of spawning their own ffmpeg decode.
+"""
+
+import logging
+import os
+import struct
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+from config import settings
+from pipeline.utils.disk_cache import prune, touch, write_atomic
+from pipeline.utils.ffmpeg import FFmpegCancelledError, FFmpegExecutionError, run_ffmpeg
+from pipeline.utils.hashing import content_hash
+from storage import cache_dir
+
+logger = logging.getLogger(__name__)
+
+AUDIO_SAMPLE_RATE = 16000
+NPY_HEADER_BYTES = 128  # reserved for the header; keeps the samples 64-byte aligned
+
+
+def decode_pcm(video_path: str, out: BinaryIO, sample_rate: int = AUDIO_SAMPLE_RATE) -> bool:
+    """
+    Stream the first audio stream as mono float32 PCM into ``out`` (from its
+    current position). Returns False if the file has no decodable audio.
+    """
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        video_path,
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "-",
+    ]
+    try:
+        run_ffmpeg(cmd, stdout=out)
+    except FFmpegCancelledError:
+        raise
+    except (OSError, FFmpegExecutionError) as exc:
+        logger.debug("Audio decode failed for %s: %s", video_path, exc)
+        return False
+    return True
+
+
+class _NoAudio(Exception):
+    pass
+
+
+def _npy_header(count: int) -> bytes:
+    """Version 1.0 ``.npy`` header of ``count`` float32 samples, padded to NPY_HEADER_BYTES."""
+    text = repr({"descr": "<f4", "fortran_order": False, "shape": (count,)}).encode("latin1")
+    prefix = np.lib.format.magic(1, 0)
+    length = NPY_HEADER_BYTES - len(prefix) - 2
+    return prefix + struct.pack("<H", length) + text.ljust(length - 1) + b"\n"
+
+
+def _write_npy(f: BinaryIO, video_path: str, sample_rate: int) -> None:
+    # ffmpeg writes the samples straight to the file; the header, which
+    # needs their count, goes into the space reserved for it afterwards
+    f.write(bytes(NPY_HEADER_BYTES))
+    if not decode_pcm(video_path, f, sample_rate):
+        raise _NoAudio
+    count = (f.seek(0, os.SEEK_END) - NPY_HEADER_BYTES) // 4
+    f.seek(0)
+    f.write(_npy_header(count))
+
+
+def pcm_cache_path(video_path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> str:
+    return os.path.join(cache_dir("audio"), f"{content_hash(video_path)}_{sample_rate}.npy")
+
+
+def load_pcm(video_path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    Return the clip's mono PCM as a read-only memory map.
+
+    The first call for a given file content decodes it into the cache; every
+    later call (in any process on the host) maps the cached ``.npy`` without
+    decoding. Returns None when the file has no decodable audio.
+    """
+    try:
+        path = pcm_cache_path(video_path, sample_rate)
+    except OSError as exc:
+        logger.debug("Cannot hash %s for audio cache: %s", video_path, exc)
+        return None
+
+    if os.path.exists(path):
+        try:
+            samples = np.load(path, mmap_mode="r")
+            touch(path)
+            return samples if samples.size else None
+        except (OSError, ValueError) as exc:
+            logger.warning("Discarding unreadable audio cache %s: %s", path, exc)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    try:
+        write_atomic(path, lambda f: _write_npy(f, video_path, sample_rate))
+    except _NoAudio:
+        return None
+    except OSError as exc:
+        logger.warning("Could not write audio cache %s: %s", path, exc)
+        return None
+    samples = np.load(path, mmap_mode="r")
+    prune(os.path.dirname(path), settings.AUDIO_CACHE_MAX_MB * 1024 * 1024)
+    return samples if samples.size else None
+
+
+def pcm_slice(
+    video_path: str,
+    start: float = 0.0,
+    duration: Optional[float] = None,
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+) -> Optional[np.ndarray]:
+    """Zero-copy view of ``[start, start + duration)`` seconds of the clip's PCM."""
+    samples = load_pcm(video_path, sample_rate)
+    if samples is None:
+        return None
+    lo = int(max(0.0, start) * sample_rate)
+    hi = samples.shape[0] if duration is None else int((max(0.0, start) + duration) * sample_rate)
+    return samples[lo:hi]
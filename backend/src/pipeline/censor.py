@@ -1,4 +1,36 @@
-from typing import List, Dict
+"""
+Profanity redaction on the rendered timeline.
+
+Transcripts give word spans in source-clip time. ``profanity_on_timeline``
+maps them through the selected slices onto the rendered timeline and
+merges overlaps; ``build_redaction_filter`` turns the merged intervals into
+a single gain automation: one ``volume`` filter driven by an ``asendcmd``
+commands file. asendcmd keeps its intervals sorted and only looks at the
+ones around the current timestamp, so the cost per audio frame does not
+grow with the number of spans (a chain of ``volume=enable=...`` filters
+evaluates every link for every frame), and the command line stays short.
+
+The commands file is content-addressed in the ``redactions`` cache dir, so
+the same mutes produce the same filter string (and render cache key) in
+every job.
+"""
+
+import bisect
+import hashlib
+import os
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from pipeline.utils.disk_cache import write_atomic
+from storage import cache_dir
+
+Interval = Tuple[float, float]
+
+# Gain changes land on audio frame boundaries (1024 samples = 23 ms at
+# 44.1 kHz); widen spans by a frame so no part of a word slips through
+REDACTION_PAD_SECONDS = 0.025
+
+# Instance name of the volume filter the commands address
+REDACTION_FILTER = "volume@redact"
 
 
 def build_censor_filter_chain() -> str:
@@ -6,14 +38,68 @@ def build_censor_filter_chain() -> str:
     return "highpass=f=60, lowpass=f=12000"
 
 
-def build_profanity_mute_filters(spans: List[Dict]) -> str:
-    # Create aasetpts for audio mute around spans using volume enable expressions
-    # We'll sum multiple volume filters sequentially
-    parts = []
-    for s in spans:
-        start = float(s.get("start", 0.0))
-        end = float(s.get("end", start + 0.5))
-        parts.append(f"volume=enable='between(t,{start},{end})':volume=0")
-    if not parts:
+def _span_bounds(span: Dict) -> Interval:
+    start = float(span.get("start", 0.0))
+    return start, float(span.get("end", start + 0.5))
+
+
+def merge_spans(spans: Iterable[Interval], pad: float = 0.0) -> List[Interval]:
+    """Sorted, non-overlapping union of ``spans``, each widened by ``pad``."""
+    merged: List[List[float]] = []
+    for start, end in sorted((max(0.0, s - pad), e + pad) for s, e in spans):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+def profanity_on_timeline(
+    clips: Sequence[Tuple[str, float, float]],
+    spans_by_source: Mapping[str, Iterable[Dict]],
+    pad: float = REDACTION_PAD_SECONDS,
+) -> List[Interval]:
+    """
+    Map source-time word spans onto the timeline of ``clips`` (path, start, dur).
+
+    A span is muted wherever it overlaps a slice, clipped to the slice;
+    spans outside every slice are dropped. Returns merged timeline intervals.
+    """
+    merged_by_source = {
+        path: merge_spans((_span_bounds(s) for s in spans), pad)
+        for path, spans in spans_by_source.items()
+    }
+    ends_by_source = {path: [e for _, e in m] for path, m in merged_by_source.items()}
+
+    timeline: List[Interval] = []
+    offset = 0.0
+    for path, start, dur in clips:
+        spans = merged_by_source.get(path, [])
+        # Spans are disjoint and sorted: the first one ending after the
+        # slice's in point is the first that can overlap it
+        i = bisect.bisect_right(ends_by_source.get(path, []), start)
+        while i < len(spans) and spans[i][0] < start + dur:
+            s, e = spans[i]
+            timeline.append((offset + max(s, start) - start, offset + min(e, start + dur) - start))
+            i += 1
+        offset += dur
+    return merge_spans(timeline)
+
+
+def build_redaction_filter(intervals: Sequence[Interval]) -> str:
+    """Audio filter muting ``intervals`` (timeline seconds); "anull" if none."""
+    if not intervals:
         return "anull"
-    return ",".join(parts)
+    commands = "".join(
+        f"{start:.3f}-{end:.3f} [enter] {REDACTION_FILTER} volume 0, "
+        f"[leave] {REDACTION_FILTER} volume 1;\n"
+        for start, end in intervals
+    ).encode()
+    digest = hashlib.blake2b(commands, digest_size=16).hexdigest()
+    path = os.path.join(cache_dir("redactions"), f"{digest}.cmd")
+    if not os.path.exists(path):
+        write_atomic(path, lambda f: f.write(commands))
+    escaped = path.replace("\\", "\\\\").replace("'", "\\'").replace(":", "\\:")
+    return f"asendcmd=f='{escaped}',{REDACTION_FILTER}=1"
@@ -0,0 +1,131 @@
+"""
+Per-job stage checkpoints.
+
+When a pipeline stage completes, the job's ``stages.json`` (in its export
+dir) records a fingerprint of the stage inputs, the files it produced with
+their size and mtime, and its JSON-serialisable result. A retried task
+asks the manifest before running each stage: if the inputs fingerprint
+matches and every recorded file is still on disk unchanged, the stored
+result is reused and the stage is skipped.
+
+Stages chain through their inputs: a downstream stage includes the
+signatures of the upstream outputs it consumes, so re-running an upstream
+stage (new files, new mtimes) invalidates everything after it.
+
+The manifest also keeps the per-stage timings of the latest run. Stages
+may complete concurrently; writes are serialised.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from pipeline.utils.disk_cache import write_atomic
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "stages.json"
+MANIFEST_VERSION = 1
+
+
+def file_signature(path: Optional[str]) -> Optional[List[Any]]:
+    """``[path, size, mtime_ns]`` of a file, or None if it does not exist."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.abspath(path), st.st_size, st.st_mtime_ns]
+
+
+def fingerprint(inputs: Any) -> str:
+    encoded = json.dumps(inputs, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class StageManifest:
+    """Completed-stage records for one job, persisted next to its outputs."""
+
+    def __init__(self, export_dir: str) -> None:
+        self.path = os.path.join(export_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._timings: Dict[str, Any] = {}
+        self._stages: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable stage manifest %s: %s", self.path, exc)
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        self._timings = data.get("timings", {})
+        return data.get("stages", {})
+
+    def _save(self) -> None:
+        payload = json.dumps(
+            {"version": MANIFEST_VERSION, "stages": self._stages, "timings": self._timings},
+            indent=2,
+        )
+        write_atomic(self.path, lambda f: f.write(payload.encode()))
+
+    @property
+    def timings(self) -> Dict[str, Any]:
+        return dict(self._timings)
+
+    def get(self, stage: str, inputs: Any) -> Optional[Dict[str, Any]]:
+        """
+        Result of a completed ``stage`` run on the same ``inputs``.
+
+        Returns None if the stage never completed, ran on other inputs, or
+        any of its output files is missing or changed since.
+        """
+        entry = self._stages.get(stage)
+        if not entry or entry.get("inputs") != fingerprint(inputs):
+            return None
+        for recorded in entry.get("files", []):
+            if file_signature(recorded[0]) != recorded:
+                logger.info("Checkpoint for %s is stale: %s changed", stage, recorded[0])
+                return None
+        logger.info("Reusing completed stage %s", stage)
+        return entry.get("result", {})
+
+    def complete(
+        self,
+        stage: str,
+        inputs: Any,
+        result: Dict[str, Any],
+        files: Sequence[str] = (),
+    ) -> None:
+        """Record ``stage`` as done; ``files`` must all exist (they are re-validated on reuse)."""
+        signatures = [file_signature(path) for path in files]
+        if any(sig is None for sig in signatures):
+            logger.warning("Not checkpointing %s: an output file is missing", stage)
+            return
+        with self._lock:
+            self._stages[stage] = {
+                "inputs": fingerprint(inputs),
+                "files": signatures,
+                "result": result,
+            }
+            self._save_quietly()
+
+    def record_timings(self, timings: Dict[str, Any]) -> None:
+        """Store per-stage timings of the current run (JSON-serialisable)."""
+        with self._lock:
+            self._timings = timings
+            self._save_quietly()
+
+    def _save_quietly(self) -> None:
+        try:
+            self._save()
+        except OSError as exc:
+            logger.warning("Could not write stage manifest %s: %s", self.path, exc)
@@ -1,9 +1,17 @@
+import hashlib
 import logging
 import os
-from typing import List, Tuple
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
 
 from config import settings
+from pipeline import render_cache
 from pipeline.utils.ffmpeg import FFmpegExecutionError, run_ffmpeg
+from pipeline.utils.hashing import content_hash
+from pipeline.utils.probe import probe_media
+from pipeline.utils.workers import carry_context, cpu_share, cpu_slots, split_threads
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +19,67 @@ _nvenc_checked = False
 _nvenc_available = False
 
 
+@dataclass
+class Finishing:
+    """
+    Post-production folded into the render graph, so the delivered file
+    comes out of the same encode as the timeline instead of a second pass.
+    """
+
+    music_path: Optional[str] = None
+    mute_chain: str = ""  # censor.build_redaction_filter output; "anull" = nothing to mute
+    watermark: str = ""
+    music_volume: float = 0.2
+    # Mute chain still being computed (e.g. STT running alongside the video
+    # encodes): called, blocking, only when the audio is rendered.
+    # ``mute_key`` stands in for it in render cache keys, so it must identify
+    # everything the chain is derived from besides the clips themselves.
+    pending_mutes: Optional[Callable[[], str]] = None
+    mute_key: str = ""
+
+    def resolve_mutes(self) -> None:
+        """Wait for ``pending_mutes`` and adopt its chain."""
+        if self.pending_mutes is not None:
+            self.mute_chain = self.pending_mutes()
+            self.pending_mutes = None
+
+    @property
+    def has_music(self) -> bool:
+        return bool(self.music_path) and os.path.exists(self.music_path)
+
+    @property
+    def mutes(self) -> bool:
+        return bool(self.mute_chain) and self.mute_chain != "anull"
+
+    @property
+    def mixes_audio(self) -> bool:
+        return self.has_music or self.mutes
+
+    def video_suffix(self) -> str:
+        """Filters appended to every preset branch (after scale/crop)."""
+        if not self.watermark:
+            return ""
+        escaped = self.watermark.replace("'", "\\'").replace(":", "\\:")
+        return (
+            f",drawtext=text='{escaped}':fontcolor=white:fontsize=24:"
+            "x=w-tw-20:y=h-th-20:alpha=0.5"
+        )
+
+    def audio_graph(self, voice: str, music: str, out: str) -> List[str]:
+        """Mute ``voice`` and mix ``music`` (input label, used if has_music) into ``out``."""
+        chains = []
+        if self.mutes:
+            chains.append(f"{voice}{self.mute_chain}[aclean]")
+            voice = "[aclean]"
+        if not self.has_music:
+            return chains + [f"{voice}anull{out}"]
+        return chains + [
+            f"{voice}volume=1.0[avoice]",
+            f"{music}volume={self.music_volume}[amusic]",
+            f"[avoice][amusic]amix=inputs=2:duration=shortest{out}",
+        ]
+
+
 def write_ffconcat(concat_path: str, clips: List[Tuple[str, float, float]]):
     with open(concat_path, "w") as f:
         f.write("ffconcat version 1.0\n\n")
@@ -18,70 +87,439 @@ def write_ffconcat(concat_path: str, clips: List[Tuple[str, float, float]]):
             escaped = path.replace("'", "'\\''")
             f.write(f"file '{escaped}'\n")
             f.write(f"inpoint {start}\n")
+            # duration alone only offsets the next file; outpoint ends this one
+            f.write(f"outpoint {start + dur}\n")
             f.write(f"duration {dur}\n\n")
 
 
+def _write_file_list(list_path: str, paths: Sequence[str]) -> None:
+    """ffconcat list of whole files (no inpoint/duration: already cut)."""
+    with open(list_path, "w") as f:
+        f.write("ffconcat version 1.0\n\n")
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
 def _vf_for_preset(preset: str) -> str:
     if preset == "portrait":
         return "scale=-2:1920:flags=lanczos,crop=1080:1920:(in_w-1080)/2:0"
     if preset == "square":
-        return "scale=1080:-2:flags=lanczos,crop=1080:1080:(in_w-1080)/2:(in_h-1080)/2"
+        # Scale the short side to 1080 so the centre crop fits any aspect ratio
+        return (
+            "scale=1080:1080:force_original_aspect_ratio=increase:flags=lanczos,"
+            "crop=1080:1080:(in_w-1080)/2:(in_h-1080)/2"
+        )
     return "scale=1920:-2:flags=lanczos"
 
 
+def _video_codec_args(encoder: str) -> List[str]:
+    if encoder == "nvenc":
+        return ["-c:v", "h264_nvenc", "-b:v", "8M", "-maxrate", "8M", "-bufsize", "16M"]
+    return ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20"]
+
+
+def _split_graph(
+    presets: Sequence[str], source: str = "[0:v]", prefix: str = "", suffix: str = ""
+) -> str:
+    """One decoded stream ``split`` into a scale/crop branch per preset, ``[v0]``..."""
+    labels = "".join(f"[s{i}]" for i in range(len(presets)))
+    branches = [f"[s{i}]{_vf_for_preset(p)}{suffix}[v{i}]" for i, p in enumerate(presets)]
+    return ";".join([f"{source}{prefix}split={len(presets)}{labels}", *branches])
+
+
+def _render_concat_variants(
+    concat_path: str, outputs: Mapping[str, str], finishing: Optional[Finishing] = None
+) -> Dict[str, str]:
+    """Single-pass render of the concat timeline: decode once, encode every preset."""
+    finishing = finishing or Finishing()
+    finishing.resolve_mutes()
+    presets = list(outputs)
+    base = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_path]
+    graph = [_split_graph(presets, suffix=finishing.video_suffix())]
+    audio_maps = ["0:a?"] * len(presets)
+    if finishing.mixes_audio:
+        if finishing.has_music:
+            base += ["-i", finishing.music_path]
+        graph += finishing.audio_graph("[0:a]", "[1:a]", "[amix]")
+        labels = [f"[aout{i}]" for i in range(len(presets))]
+        graph.append(f"[amix]asplit={len(presets)}{''.join(labels)}")
+        audio_maps = labels
+    base += ["-filter_complex", ";".join(graph)]
+
+    def command(encoder: str, threads: int) -> List[str]:
+        cmd = [*base, "-filter_complex_threads", str(threads)]
+        for i, preset in enumerate(presets):
+            cmd += ["-map", f"[v{i}]", "-map", audio_maps[i], *_video_codec_args(encoder)]
+            cmd += ["-threads", str(max(1, threads // len(presets)))]
+            cmd += ["-c:a", "aac", "-b:a", "192k"]
+            if finishing.has_music:
+                cmd.append("-shortest")
+            cmd.append(outputs[preset])
+        return cmd
+
+    with cpu_slots(cpu_share()) as threads:
+        if _should_try_nvenc():
+            try:
+                run_ffmpeg(command("nvenc", threads))
+                return dict(outputs)
+            except FFmpegExecutionError as exc:
+                logger.info("NVENC failed, falling back to libx264: %s", exc)
+        run_ffmpeg(command("x264", threads))
+    return dict(outputs)
+
+
 def render_with_fallback(concat_path: str, output_path: str, preset: str = "landscape"):
-    vf = _vf_for_preset(preset)
-    base = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_path, "-vf", vf]
-
-    if _should_try_nvenc():
-        nvenc_cmd = base + [
-            "-c:v",
-            "h264_nvenc",
-            "-b:v",
-            "8M",
-            "-maxrate",
-            "8M",
-            "-bufsize",
-            "16M",
-            "-c:a",
-            "aac",
-            "-b:a",
-            "192k",
-            output_path,
+    return _render_concat_variants(concat_path, {preset: output_path})[preset]
+
+
+def _segment_path(
+    seg_dir: str,
+    idx: int,
+    clip: Tuple[str, float, float],
+    preset: str,
+    encoder: str,
+    suffix: str = "",
+) -> str:
+    # Keyed by everything that affects the encoded bytes, so a retried render
+    # reuses finished segments but never a stale one from another selection.
+    path, start, dur = clip
+    vf = _vf_for_preset(preset) + suffix
+    key = hashlib.sha1(f"{os.path.abspath(path)}|{start}|{dur}|{vf}|{encoder}".encode()).hexdigest()
+    return os.path.join(seg_dir, f"seg_{idx:03d}_{preset}_{key[:12]}.mp4")
+
+
+def encode_segment(
+    clip: Tuple[str, float, float],
+    outs: Mapping[str, str],
+    encoder: str,
+    suffix: str = "",
+) -> None:
+    """
+    Encode one slice for every preset in ``outs`` that is not on disk yet.
+
+    Each output gets a fixed ``RENDER_SEGMENT_THREADS`` encoder threads,
+    because x264's bitstream depends on its thread count: a segment is the
+    same bytes whichever host encodes it and however many CPU slots are free.
+    """
+    missing = [(preset, out) for preset, out in outs.items() if not os.path.exists(out)]
+    if not missing:
+        return
+    path, start, dur = clip
+    graph = _split_graph(
+        [preset for preset, _ in missing], prefix=f"fps={settings.NORMALIZE_FPS},", suffix=suffix
+    )
+    per_output = max(1, settings.RENDER_SEGMENT_THREADS)
+    want = per_output * len(missing)
+    with cpu_slots(want, minimum=want) as threads:
+        cmd = ["ffmpeg", "-y", "-ss", f"{start}", "-t", f"{dur}", "-i", path]
+        cmd += ["-filter_complex", graph, "-filter_complex_threads", str(threads)]
+        for i, (_, out) in enumerate(missing):
+            cmd += ["-map", f"[v{i}]", "-an", *_video_codec_args(encoder), "-pix_fmt", "yuv420p"]
+            cmd += ["-threads", str(per_output), "-f", "mp4", out + ".tmp"]
+        try:
+            run_ffmpeg(cmd)
+            for _, out in missing:
+                os.replace(out + ".tmp", out)
+        finally:
+            for _, out in missing:
+                if os.path.exists(out + ".tmp"):
+                    os.remove(out + ".tmp")
+
+
+def _encode_segments(
+    clips: Sequence[Tuple[str, float, float]],
+    seg_dir: str,
+    presets: Sequence[str],
+    encoder: str,
+    suffix: str = "",
+) -> Dict[str, List[str]]:
+    paths = {
+        preset: [
+            _segment_path(seg_dir, i, clip, preset, encoder, suffix) for i, clip in enumerate(clips)
+        ]
+        for preset in presets
+    }
+    workers, _ = split_threads(
+        len(clips), settings.RENDER_SEGMENT_THREADS * len(presets), settings.RENDER_MAX_WORKERS
+    )
+    if encoder == "nvenc":
+        # Every preset branch holds an NVENC session; consumer GPUs cap them
+        workers = max(1, min(workers, settings.NVENC_MAX_SESSIONS // len(presets)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-segment") as pool:
+        futures = [
+            pool.submit(
+                carry_context(encode_segment),
+                clip,
+                {p: paths[p][i] for p in presets},
+                encoder,
+                suffix,
+            )
+            for i, clip in enumerate(clips)
         ]
         try:
-            run_ffmpeg(nvenc_cmd)
-            return output_path
-        except FFmpegExecutionError as exc:
-            logger.info("NVENC failed, falling back to libx264: %s", exc)
-
-    x264_cmd = base + [
-        "-c:v",
-        "libx264",
-        "-preset",
-        "veryfast",
-        "-crf",
-        "20",
-        "-c:a",
-        "aac",
-        "-b:a",
-        "192k",
-        output_path,
+            for future in futures:
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+    return paths
+
+
+def _render_audio(
+    clips: Sequence[Tuple[str, float, float]],
+    out_path: str,
+    finishing: Optional[Finishing] = None,
+) -> bool:
+    """
+    Encode the timeline's audio in one pass; False if there is none.
+
+    Each slice is cut sample-accurately (``-ss``/``-t`` on its own input) and
+    padded/trimmed to the slice duration, clips without audio contribute
+    silence, and the pieces are joined with the concat filter. One AAC
+    encode avoids the priming gap per-segment audio would add at each cut.
+    ``finishing`` mutes and mixes music into the same graph.
+    """
+    finishing = finishing or Finishing()
+    finishing.resolve_mutes()
+    probes = {}
+    for path, _, _ in clips:
+        if path not in probes:
+            probes[path] = probe_media(path)
+    silent = all(info is not None and not info.has_audio for info in probes.values())
+    if silent and not finishing.has_music:
+        return False
+
+    inputs: List[str] = []
+    chains: List[str] = []
+    for i, (path, start, dur) in enumerate(clips):
+        info = probes[path]
+        if info is not None and not info.has_audio:
+            inputs += ["-f", "lavfi", "-t", f"{dur}", "-i", "anullsrc=r=48000:cl=stereo"]
+        else:
+            inputs += ["-ss", f"{start}", "-t", f"{dur}", "-i", path]
+        chains.append(
+            f"[{i}:a:0]aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo,"
+            f"apad=whole_dur={dur},atrim=0:{dur}[a{i}]"
+        )
+    joined = "".join(f"[a{i}]" for i in range(len(clips)))
+    chains.append(f"{joined}concat=n={len(clips)}:v=0:a=1[atimeline]")
+    if finishing.has_music:
+        inputs += ["-i", finishing.music_path]
+    chains += finishing.audio_graph("[atimeline]", f"[{len(clips)}:a:0]", "[aout]")
+    graph = ";".join(chains)
+    with cpu_slots(1):  # the audio graph and AAC encoder are single-threaded
+        run_ffmpeg(
+            [
+                "ffmpeg",
+                "-y",
+                *inputs,
+                "-filter_complex",
+                graph,
+                "-map",
+                "[aout]",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "192k",
+                out_path,
+            ]
+        )
+    return True
+
+
+def _segment_dir(outputs: Mapping[str, str]) -> str:
+    out_dir = os.path.dirname(next(iter(outputs.values()))) or "."
+    seg_dir = os.path.join(out_dir, "segments")
+    os.makedirs(seg_dir, exist_ok=True)
+    return seg_dir
+
+
+def render_segments(
+    clips: Sequence[Tuple[str, float, float]],
+    outputs: Mapping[str, str],
+    finishing: Optional[Finishing] = None,
+) -> Dict[str, str]:
+    """
+    Render the timeline for every preset in ``outputs`` (preset -> path) by
+    encoding each slice as its own segment.
+
+    Every slice is decoded once and ``split`` into a scale/crop/encode
+    branch per preset, starting on a keyframe and seeking only within its
+    own source, so nothing before a slice's in point leaks into the output
+    (the concat demuxer's ``inpoint`` emits everything back to the previous
+    keyframe). Slices are encoded in parallel, audio is encoded once for
+    all presets by ``_render_audio``, and each output is a stream-copy
+    concat of its segments muxed with that audio. Finished segments are
+    kept until the render succeeds, so a retry only re-encodes the ones
+    that failed. NVENC falls back to libx264 for the whole timeline, keeping
+    every segment's codec parameters identical. ``finishing`` adds the
+    watermark to every branch and the mute/music mix to the audio encode,
+    so the outputs are final files without another generation of encoding;
+    pending mutes are awaited only once the video segments are encoded.
+    """
+    finishing = finishing or Finishing()
+    suffix = finishing.video_suffix()
+    presets = list(outputs)
+    seg_dir = _segment_dir(outputs)
+
+    encoder = "nvenc" if _should_try_nvenc() else "x264"
+    try:
+        segments = _encode_segments(clips, seg_dir, presets, encoder, suffix)
+    except FFmpegExecutionError as exc:
+        if encoder != "nvenc":
+            raise
+        logger.info("NVENC failed, falling back to libx264: %s", exc)
+        segments = _encode_segments(clips, seg_dir, presets, "x264", suffix)
+
+    audio_path = os.path.join(seg_dir, "audio.m4a")
+    has_audio = _render_audio(clips, audio_path, finishing)
+    for preset in presets:
+        list_path = os.path.join(seg_dir, f"segments_{preset}.txt")
+        _write_file_list(list_path, segments[preset])
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        if has_audio:
+            cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-shortest"]
+        cmd += ["-c", "copy", "-movflags", "+faststart", outputs[preset]]
+        run_ffmpeg(cmd)
+
+    shutil.rmtree(seg_dir, ignore_errors=True)
+    return dict(outputs)
+
+
+def _cache_keys(
+    clips: Sequence[Tuple[str, float, float]], presets: Sequence[str], finishing: Finishing
+) -> Dict[str, str]:
+    """Render cache key per preset; presets that cannot be keyed are left out."""
+    encoder = "nvenc" if _should_try_nvenc() else "x264"
+    if finishing.pending_mutes is not None:
+        mute = finishing.mute_key
+    else:
+        mute = finishing.mute_chain if finishing.mutes else ""
+    shared = [
+        settings.RENDER_MODE.lower(),
+        f"fps={settings.NORMALIZE_FPS}",
+        " ".join(_video_codec_args(encoder)),
+        f"mute={mute}",
     ]
-    run_ffmpeg(x264_cmd)
-    return output_path
+    if settings.RENDER_MODE.lower() == "segments":
+        shared.append(f"threads={settings.RENDER_SEGMENT_THREADS}")
+    if finishing.has_music:
+        try:
+            shared.append(f"music={content_hash(finishing.music_path)}@{finishing.music_volume}")
+        except OSError:
+            return {}
+    keys = {}
+    for preset in presets:
+        vf = _vf_for_preset(preset) + finishing.video_suffix()
+        key = render_cache.render_key(clips, [*shared, vf])
+        if key:
+            keys[preset] = key
+    return keys
+
+
+def _uncached_outputs(
+    clips: Sequence[Tuple[str, float, float]], outputs: Mapping[str, str], finishing: Finishing
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Link cached outputs into place; returns the cache keys and the outputs left to render."""
+    keys: Dict[str, str] = {}
+    if clips and settings.RENDER_CACHE_ENABLED:
+        keys = _cache_keys(clips, list(outputs), finishing)
+    pending = {
+        preset: out
+        for preset, out in outputs.items()
+        if not (preset in keys and render_cache.fetch(keys[preset], out))
+    }
+    return keys, pending
+
+
+def segment_encodes(
+    clips: Sequence[Tuple[str, float, float]],
+    outputs: Mapping[str, str],
+    finishing: Optional[Finishing] = None,
+) -> List[Tuple[Tuple[str, float, float], Dict[str, str], str, str]]:
+    """
+    The segment encodes ``render_variants`` would run for ``outputs`` and
+    that are not on disk yet, as ``encode_segment`` arguments (clip,
+    preset -> segment path, encoder, video suffix). Running them anywhere
+    that sees the same storage, e.g. on other workers, leaves
+    ``render_variants`` only the audio and the stream-copy concats. Empty
+    when the outputs are cached or the render mode is not segments.
+    """
+    finishing = finishing or Finishing()
+    if not clips or settings.RENDER_MODE.lower() != "segments":
+        return []
+    _, pending = _uncached_outputs(clips, outputs, finishing)
+    if not pending:
+        return []
+    suffix = finishing.video_suffix()
+    encoder = "nvenc" if _should_try_nvenc() else "x264"
+    seg_dir = _segment_dir(pending)
+    encodes = []
+    for i, clip in enumerate(clips):
+        outs = {
+            preset: _segment_path(seg_dir, i, clip, preset, encoder, suffix) for preset in pending
+        }
+        outs = {preset: out for preset, out in outs.items() if not os.path.exists(out)}
+        if outs:
+            encodes.append((tuple(clip), outs, encoder, suffix))
+    return encodes
+
+
+def render_variants(
+    clips: Sequence[Tuple[str, float, float]],
+    concat_path: str,
+    outputs: Mapping[str, str],
+    finishing: Optional[Finishing] = None,
+) -> Dict[str, str]:
+    """
+    Render the selected slices (already written to ``concat_path``) once for
+    all presets in ``outputs`` (preset -> output path). Each extra preset
+    costs only its scale and encode; the timeline is decoded once. With
+    ``finishing`` the outputs are the delivered files: watermark, profanity
+    mute and music mix happen in the same encode.
+
+    Outputs already in the render cache are linked instead of rendered, and
+    new renders are added to it.
+    """
+    finishing = finishing or Finishing()
+    keys, pending = _uncached_outputs(clips, outputs, finishing)
+    if not pending:
+        return dict(outputs)
+
+    for out in pending.values():
+        # Unlink rather than let ffmpeg truncate: the old file may be a
+        # hard link to a cache entry
+        if os.path.lexists(out):
+            os.remove(out)
+    if clips and settings.RENDER_MODE.lower() == "segments":
+        render_segments(clips, pending, finishing)
+    else:
+        _render_concat_variants(concat_path, pending, finishing)
+    for preset, out in pending.items():
+        if preset in keys:
+            render_cache.store(keys[preset], out)
+    return dict(outputs)
+
+
+def render_timeline(
+    clips: Sequence[Tuple[str, float, float]],
+    concat_path: str,
+    output_path: str,
+    preset: str = "landscape",
+) -> str:
+    """Render the selected slices (already written to ``concat_path``) for ``preset``."""
+    return render_variants(clips, concat_path, {preset: output_path})[preset]
 
 
 def render_matrix(
     concat_path: str, out_dir: str, presets: List[str]
 ) -> List[Tuple[str, str]]:
     os.makedirs(out_dir, exist_ok=True)
-    outputs: List[Tuple[str, str]] = []
-    for p in presets:
-        out_path = os.path.join(out_dir, f"video_{p}.mp4")
-        render_with_fallback(concat_path, out_path, preset=p)
-        outputs.append((p, out_path))
-    return outputs
+    outputs = {p: os.path.join(out_dir, f"video_{p}.mp4") for p in presets}
+    _render_concat_variants(concat_path, outputs)
+    return list(outputs.items())
 
 
 def _should_try_nvenc() -> bool:
@@ -0,0 +1,148 @@
+"""
+Persistent, content-addressed store for per-clip analysis results.
+
+Entries are keyed by the file's content hash plus ``FEATURE_VERSION`` and
+hold the per-frame feature arrays, the scene list and probe metadata. A
+Celery retry, a re-submission with a different style or a weekly montage
+over already-scored renders loads the entry instead of decoding the clip.
+The store is bounded by ``settings.FEATURE_CACHE_MAX_MB`` with LRU eviction.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from pipeline.features import (
+    FEATURE_VERSION,
+    AnalysisProfile,
+    ClipFeatures,
+    current_profile,
+    extract_clip_features,
+)
+from pipeline.utils.disk_cache import prune, touch, write_atomic
+from pipeline.utils.hashing import content_hash
+from pipeline.utils.workers import cpu_share, cpu_slots
+from storage import cache_dir
+
+logger = logging.getLogger(__name__)
+
+_MEMO_SIZE = 32
+_memo: "OrderedDict[Tuple[str, int, int, str], ClipFeatures]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _entry_path(digest: str, profile: AnalysisProfile) -> str:
+    return os.path.join(
+        cache_dir("features"), f"{digest}_v{FEATURE_VERSION}_{profile.name}.npz"
+    )
+
+
+def load_features(digest: str, profile: AnalysisProfile) -> Optional[ClipFeatures]:
+    path = _entry_path(digest, profile)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            features = ClipFeatures(
+                fps=float(meta.pop("_fps")),
+                scene_cut=data["scene_cut"],
+                motion=data["motion"],
+                audio_power=data["audio_power"],
+                audio_peak=data["audio_peak"],
+                has_audio=bool(meta.pop("_has_audio")),
+                scenes=[(float(s), float(e)) for s, e in data["scenes"]],
+                meta=meta,
+            )
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Discarding unreadable feature cache %s: %s", path, exc)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    touch(path)
+    return features
+
+
+def save_features(digest: str, profile: AnalysisProfile, features: ClipFeatures) -> None:
+    path = _entry_path(digest, profile)
+    meta = dict(features.meta, _fps=features.fps, _has_audio=features.has_audio)
+    scenes = np.asarray(features.scenes or [], dtype=np.float64).reshape(-1, 2)
+    try:
+        write_atomic(
+            path,
+            lambda f: np.savez(
+                f,
+                scene_cut=features.scene_cut,
+                motion=features.motion,
+                audio_power=features.audio_power,
+                audio_peak=features.audio_peak,
+                scenes=scenes,
+                meta=np.array(json.dumps(meta)),
+            ),
+        )
+    except OSError as exc:
+        logger.warning("Could not write feature cache %s: %s", path, exc)
+        return
+    prune(os.path.dirname(path), settings.FEATURE_CACHE_MAX_MB * 1024 * 1024)
+
+
+def _memo_key(video_path: str, profile: AnalysisProfile) -> Tuple[str, int, int, str]:
+    path = os.path.abspath(video_path)
+    try:
+        st = os.stat(path)
+        return path, st.st_mtime_ns, st.st_size, profile.name
+    except OSError:
+        return path, 0, 0, profile.name
+
+
+def get_clip_features(
+    video_path: str, profile: Optional[AnalysisProfile] = None
+) -> ClipFeatures:
+    """
+    Return features for ``video_path`` under ``profile`` (default: the
+    profile selected by ``settings.HIGHLIGHT_DETECTOR``).
+
+    Lookup order: in-process memo, on-disk store (by content hash), then a
+    full extraction whose result is written back to the store.
+    """
+    profile = profile or current_profile()
+    key = _memo_key(video_path, profile)
+    with _memo_lock:
+        cached = _memo.get(key)
+        if cached is not None:
+            _memo.move_to_end(key)
+            return cached
+
+    try:
+        digest: Optional[str] = content_hash(video_path)
+    except OSError:
+        digest = None
+
+    features = load_features(digest, profile) if digest else None
+    if features is None:
+        with cpu_slots(cpu_share()) as threads:
+            features = extract_clip_features(video_path, profile, threads=threads)
+        if digest and features.frame_count:
+            save_features(digest, profile, features)
+    else:
+        logger.debug("Feature cache hit for %s", video_path)
+
+    with _memo_lock:
+        _memo[key] = features
+        _memo.move_to_end(key)
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return features
+
+
+def clear_feature_memo() -> None:
+    with _memo_lock:
+        _memo.clear()
@@ -0,0 +1,385 @@
+"""
+Single-pass feature extraction for highlight analysis.
+
+Every clip is decoded exactly once and reduced to per-frame time series
+(scene-cut score, motion, audio power and peak). Scene detection and all
+scorers in ``pipeline.highlight_detection`` read from these arrays instead of
+re-opening the video or spawning ffmpeg per scene.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import settings
+from pipeline.audio_cache import AUDIO_SAMPLE_RATE, load_pcm
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the meaning of any feature array changes.
+FEATURE_VERSION = 1
+
+# Frames are downscaled to this width before any per-pixel work (full profile).
+ANALYSIS_WIDTH = 320
+# Motion is measured between frames this far apart (matches the legacy 6 fps sampler).
+MOTION_SAMPLE_FPS = 6
+DEFAULT_FPS = 30.0
+
+# Same defaults as PySceneDetect's ContentDetector.
+SCENE_THRESHOLD = 30.0
+MIN_SCENE_LEN = 15
+
+
+@dataclass(frozen=True)
+class AnalysisProfile:
+    name: str
+    width: int  # analysis frame width in pixels
+    sample_fps: Optional[float] = None  # None analyses every decoded frame
+    refine: bool = False  # re-locate coarse cuts at full frame rate
+
+
+FULL_PROFILE = AnalysisProfile(name="full", width=ANALYSIS_WIDTH)
+
+
+def fast_profile() -> AnalysisProfile:
+    return AnalysisProfile(
+        name=f"fast{settings.FAST_ANALYSIS_WIDTH}x{settings.FAST_ANALYSIS_FPS:g}",
+        width=settings.FAST_ANALYSIS_WIDTH,
+        sample_fps=settings.FAST_ANALYSIS_FPS,
+        refine=True,
+    )
+
+
+def current_profile() -> AnalysisProfile:
+    """Profile selected by ``settings.HIGHLIGHT_DETECTOR`` ("fast" or the full default)."""
+    if settings.HIGHLIGHT_DETECTOR.lower() == "fast":
+        return fast_profile()
+    return FULL_PROFILE
+
+
+@dataclass(eq=False)
+class ClipFeatures:
+    fps: float
+    scene_cut: np.ndarray  # HSV content delta vs. previous frame
+    motion: np.ndarray  # mean abs grayscale delta vs. frame 1/MOTION_SAMPLE_FPS earlier (NaN if undefined)
+    audio_power: np.ndarray  # mean square of the samples under each frame
+    audio_peak: np.ndarray  # max abs sample under each frame
+    has_audio: bool = False
+    scenes: Optional[List[Tuple[float, float]]] = None  # default-threshold scene list
+    meta: Dict[str, Any] = field(default_factory=dict)  # probe metadata
+
+    @property
+    def frame_count(self) -> int:
+        return int(self.scene_cut.shape[0])
+
+    @property
+    def duration(self) -> float:
+        return self.frame_count / self.fps if self.fps else 0.0
+
+    def window(self, start: float, duration: float) -> slice:
+        """Frame slice covering ``[start, start + duration]`` seconds."""
+        lo = int(max(0.0, start) * self.fps)
+        hi = int(np.ceil(max(0.0, start + duration) * self.fps))
+        lo = min(lo, self.frame_count)
+        hi = min(max(hi, lo + 1), self.frame_count)
+        return slice(lo, hi)
+
+
+def empty_features(fps: float = DEFAULT_FPS) -> ClipFeatures:
+    return ClipFeatures(
+        fps=fps,
+        scene_cut=np.zeros(0, dtype=np.float32),
+        motion=np.zeros(0, dtype=np.float32),
+        audio_power=np.zeros(0, dtype=np.float64),
+        audio_peak=np.zeros(0, dtype=np.float32),
+    )
+
+
+def _analysis_size(width: int, height: int, target: int = ANALYSIS_WIDTH) -> Tuple[int, int]:
+    if width <= target or width <= 0:
+        return width, height
+    scale = target / float(width)
+    return target, max(2, int(round(height * scale)))
+
+
+def frame_audio_features(
+    samples: np.ndarray, sample_rate: int, fps: float, frame_count: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce PCM samples to per-frame (mean square, peak) arrays."""
+    power = np.zeros(frame_count, dtype=np.float64)
+    peak = np.zeros(frame_count, dtype=np.float32)
+    if frame_count == 0 or samples.size == 0:
+        return power, peak
+
+    bounds = np.round(np.arange(frame_count + 1) * (sample_rate / fps)).astype(np.int64)
+    bounds = np.minimum(bounds, samples.size)
+    samples = samples[: bounds[-1]]
+    counts = np.diff(bounds)
+
+    squares = np.concatenate(([0.0], np.cumsum(np.square(samples, dtype=np.float64))))
+    filled = counts > 0
+    power[filled] = (squares[bounds[1:]] - squares[bounds[:-1]])[filled] / counts[filled]
+
+    if filled.any():
+        starts = bounds[:-1][filled]
+        peak[filled] = np.maximum.reduceat(np.abs(samples), starts)
+    return power, peak
+
+
+def _hsv(frame: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    if size != (frame.shape[1], frame.shape[0]):
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(np.int16)
+
+
+def _refine_cut(
+    video_path: str, coarse_frame: int, step: int, size: Tuple[int, int]
+) -> int:
+    """
+    Locate the exact cut frame inside ``(coarse_frame - step, coarse_frame]``.
+
+    Only the ``step + 1`` source frames around a coarse boundary are decoded,
+    so refinement cost scales with the number of cuts, not clip length.
+    """
+    first = max(0, coarse_frame - step)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        prev = None
+        best_frame, best_delta = coarse_frame, -1.0
+        for offset in range(coarse_frame - first + 1):
+            ok, frame = cap.read()
+            if not ok:
+                break
+            hsv = _hsv(frame, size)
+            if prev is not None:
+                delta = float(np.abs(hsv - prev).mean())
+                if delta > best_delta:
+                    best_frame, best_delta = first + offset, delta
+            prev = hsv
+        return best_frame
+    finally:
+        cap.release()
+
+
+def window_motion(
+    video_path: str,
+    start: float,
+    duration: float,
+    sample_fps: float = MOTION_SAMPLE_FPS,
+    width: int = ANALYSIS_WIDTH,
+) -> np.ndarray:
+    """
+    Motion samples for one window without analysing the whole clip.
+
+    Seeks once to ``start``, then reads sequentially: every source frame is
+    ``grab()``-ed but only every Nth one (N = source fps / ``sample_fps``) is
+    retrieved, downscaled to ``width`` and diffed against the previous
+    sample. Only one reduced frame is held at a time, so cost per sample is
+    constant regardless of GOP length or source resolution.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        cap.release()
+        return np.zeros(0, dtype=np.float32)
+    try:
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if not np.isfinite(source_fps) or source_fps <= 0:
+            source_fps = DEFAULT_FPS
+        step = max(1, int(round(source_fps / max(sample_fps, 1e-3))))
+        first = int(round(max(0.0, start) * source_fps))
+        last = first + int(np.ceil(max(0.0, duration) * source_fps))
+        if first:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+        values: List[float] = []
+        prev = None
+        size = None
+        for offset in range(last - first + 1):
+            if not cap.grab():
+                break
+            if offset % step:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            if size is None:
+                size = _analysis_size(frame.shape[1], frame.shape[0], width)
+            if size != (frame.shape[1], frame.shape[0]):
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if prev is not None:
+                values.append(float(cv2.absdiff(gray, prev).mean()))
+            prev = gray
+        return np.asarray(values, dtype=np.float32)
+    finally:
+        cap.release()
+
+
+def extract_clip_features(
+    video_path: str, profile: Optional[AnalysisProfile] = None, threads: int = 0
+) -> ClipFeatures:
+    """
+    Decode ``video_path`` once and compute every per-frame feature series.
+
+    Video frames are read sequentially (no seeking), downscaled to the
+    profile's width and compared against the previous sampled frame for the
+    scene-cut score and against the frame 1/MOTION_SAMPLE_FPS seconds earlier
+    for motion. Profiles with ``sample_fps`` only retrieve every Nth frame
+    (the others are grabbed but never converted) and, if ``refine`` is set,
+    re-locate each detected cut at full frame rate. Audio comes from the
+    shared PCM cache (one ffmpeg decode per file content, memory-mapped
+    afterwards). ``threads`` > 0 caps the video decoder's threads.
+    """
+    profile = profile or current_profile()
+    if threads > 0:
+        cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, threads])
+    else:
+        cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.warning("Could not open %s for feature extraction", video_path)
+        cap.release()
+        return empty_features()
+
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    if not np.isfinite(source_fps) or source_fps <= 0:
+        source_fps = DEFAULT_FPS
+    step = 1
+    if profile.sample_fps:
+        step = max(1, int(round(source_fps / profile.sample_fps)))
+    fps = source_fps / step
+    meta = {
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0),
+        "fps": float(source_fps),
+        "profile": profile.name,
+    }
+    motion_lag = max(1, int(round(fps / MOTION_SAMPLE_FPS)))
+
+    scene_cut: List[float] = []
+    motion: List[float] = []
+    history: List[np.ndarray] = []
+    prev_hsv = None
+    size = None
+    source_frames = 0
+
+    while cap.grab():
+        source_frames += 1
+        if (source_frames - 1) % step:
+            continue
+        ok, frame = cap.retrieve()
+        if not ok:
+            break
+        if size is None:
+            size = _analysis_size(frame.shape[1], frame.shape[0], profile.width)
+        if size != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(np.int16)
+        if prev_hsv is None:
+            scene_cut.append(0.0)
+        else:
+            scene_cut.append(float(np.abs(hsv - prev_hsv).mean()))
+        prev_hsv = hsv
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if len(history) == motion_lag:
+            motion.append(float(cv2.absdiff(gray, history.pop(0)).mean()))
+        else:
+            motion.append(np.nan)
+        history.append(gray)
+
+    cap.release()
+
+    frame_count = len(scene_cut)
+    samples = load_pcm(video_path) if frame_count else None
+    has_audio = samples is not None and samples.size > 0
+    power, peak = frame_audio_features(
+        samples if has_audio else np.zeros(0, dtype=np.float32),
+        AUDIO_SAMPLE_RATE,
+        fps,
+        frame_count,
+    )
+
+    features = ClipFeatures(
+        fps=float(fps),
+        scene_cut=np.asarray(scene_cut, dtype=np.float32),
+        motion=np.asarray(motion, dtype=np.float32),
+        audio_power=power,
+        audio_peak=peak,
+        has_audio=has_audio,
+        meta=meta,
+    )
+    meta["frame_count"] = source_frames
+    meta["duration"] = source_frames / source_fps
+
+    # MIN_SCENE_LEN is expressed in source frames; scale it to the sampled timeline.
+    min_len = max(1, int(round(MIN_SCENE_LEN / step)))
+    cuts = _cut_indices(features.scene_cut, SCENE_THRESHOLD, min_len)
+    if step > 1 and profile.refine and size is not None:
+        cut_times = [
+            _refine_cut(video_path, idx * step, step, size) / source_fps for idx in cuts
+        ]
+    else:
+        cut_times = [idx / fps for idx in cuts]
+    features.scenes = _scenes_from_cut_times(cut_times, meta["duration"])
+    return features
+
+
+def _cut_indices(scene_cut: np.ndarray, threshold: float, min_scene_len: int) -> List[int]:
+    cuts: List[int] = []
+    last = 0
+    for idx in np.flatnonzero(scene_cut >= threshold):
+        if idx - last >= min_scene_len:
+            cuts.append(int(idx))
+            last = int(idx)
+    return cuts
+
+
+def _scenes_from_cut_times(
+    cut_times: List[float], duration: float
+) -> List[Tuple[float, float]]:
+    if not cut_times:
+        return []
+    bounds = [0.0] + sorted(cut_times) + [duration]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def scenes_from_features(
+    features: ClipFeatures,
+    threshold: float = SCENE_THRESHOLD,
+    min_scene_len: int = MIN_SCENE_LEN,
+) -> List[Tuple[float, float]]:
+    """
+    Split a clip into scenes wherever the scene-cut score crosses ``threshold``.
+
+    Mirrors ContentDetector semantics: a cut needs at least ``min_scene_len``
+    source frames since the previous one, and no cuts yields an empty list.
+    """
+    if (
+        features.scenes is not None
+        and threshold == SCENE_THRESHOLD
+        and min_scene_len == MIN_SCENE_LEN
+    ):
+        return list(features.scenes)
+
+    # Decimated profiles sample every ``step``th source frame; scale the
+    # minimum to the sampled timeline as extract_clip_features does
+    source_fps = features.meta.get("fps") or features.fps
+    step = max(1, int(round(source_fps / features.fps))) if features.fps else 1
+    min_len = max(1, int(round(min_scene_len / step)))
+    cuts = _cut_indices(features.scene_cut, threshold, min_len)
+    return _scenes_from_cut_times(
+        [idx / features.fps for idx in cuts], features.duration
+    )
+
+
+def power_to_db(power: float) -> float:
+    return float(10.0 * np.log10(max(power, 1e-10)))
+
+
+def amplitude_to_db(amplitude: float) -> float:
+    return float(20.0 * np.log10(max(amplitude, 1e-5)))
@@ -1,17 +1,16 @@
 import logging
-import re
-import math
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Protocol, Sequence, Tuple, Dict
+from typing import List, Optional, Protocol, Sequence, Tuple, Dict
 
-import cv2
 import numpy as np
-from scenedetect import VideoManager, SceneManager
-from scenedetect.detectors import ContentDetector
 
 from config import settings
-from pipeline.utils.ffmpeg import FFmpegExecutionError, run_ffmpeg
+from pipeline.feature_store import get_clip_features
+from pipeline.features import MOTION_SAMPLE_FPS, scenes_from_features, window_motion
+from pipeline.selection import EventIndex, select_highlights
+from pipeline.utils.workers import pool_size
+from pipeline.window_index import BLOCK_SECONDS, get_window_index
 
 logger = logging.getLogger(__name__)
 
@@ -50,55 +49,63 @@ class HeuristicHighlightDetector:
     def __init__(self, enable_model: bool = False) -> None:
         self._model = get_model() if enable_model and get_model else None
 
+    def _analyze_clip(self, vp: str) -> List[SceneSlice]:
+        events = EventIndex(self._model.detect_events(vp) if self._model else [])
+        candidates: List[SceneSlice] = []
+        for start, end in detect_scenes_seconds(vp):
+            duration = max(0.5, end - start)
+            sample = min(duration, 12.0)
+            mot = motion_score(vp, start, sample)
+            loud = estimate_loudness(vp, start, sample)
+            loud_score = max(0.0, 30.0 + loud)
+            score = (mot * self.motion_weight) + (loud_score * self.loudness_weight)
+            if events:
+                center = start + duration / 2.0
+                score += events.max_confidence(center, self.model_window) * self.model_weight
+            candidates.append(SceneSlice(vp, start, end, mot, loud, score))
+        return candidates
+
     def detect(
         self, video_paths: Sequence[str], target_duration: float
     ) -> List[SceneSlice]:
-        candidates: List[SceneSlice] = []
-        for vp in video_paths:
-            events = self._model.detect_events(vp) if self._model else []
-            for start, end in detect_scenes_seconds(vp):
-                duration = max(0.5, end - start)
-                sample = min(duration, 12.0)
-                mot = motion_score(vp, start, sample)
-                loud = estimate_loudness(vp, start, sample)
-                loud_score = max(0.0, 30.0 + loud)
-                score = (mot * self.motion_weight) + (loud_score * self.loudness_weight)
-                if events:
-                    center = start + duration / 2.0
-                    bonus = 0.0
-                    for ev in events:
-                        if abs(ev.get("time", center) - center) <= self.model_window:
-                            bonus = max(
-                                bonus, ev.get("confidence", 0.0) * self.model_weight
-                            )
-                    score += bonus
-                candidates.append(SceneSlice(vp, start, end, mot, loud, score))
+        # Clips are analyzed concurrently (cv2 decode and the ffmpeg audio
+        # decode both run outside the GIL). map() yields results in input
+        # order, so the candidate list -- and, through the stable sort below,
+        # the selection -- is identical to a sequential run.
+        workers = pool_size(len(video_paths), settings.ANALYSIS_MAX_WORKERS)
+        if workers > 1:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="highlight-analysis"
+            ) as pool:
+                per_clip = list(pool.map(self._analyze_clip, video_paths))
+        else:
+            per_clip = [self._analyze_clip(vp) for vp in video_paths]
+        candidates: List[SceneSlice] = [c for clip in per_clip for c in clip]
 
         if not candidates and video_paths:
             logger.debug("No highlight scenes detected, adding fallback slice")
             return [SceneSlice(video_paths[0], 0.0, target_duration, 0.0, -30.0, 0.0)]
 
-        candidates.sort(key=lambda c: c.score, reverse=True)
-        selected: List[SceneSlice] = []
-        total = 0.0
-        for slice_ in candidates:
-            if total >= target_duration:
-                break
-            take = min(slice_.duration, max(1.0, min(4.0, target_duration - total)))
-            selected.append(
-                SceneSlice(
-                    video_path=slice_.video_path,
-                    start=slice_.start,
-                    end=slice_.start + take,
-                    motion=slice_.motion,
-                    loudness=slice_.loudness,
-                    score=slice_.score,
-                )
+        picks = select_highlights(
+            [(c.video_path, c.start, c.duration, c.score) for c in candidates],
+            target_duration,
+            per_clip_cap=settings.HIGHLIGHT_MAX_PER_CLIP,
+            repeat_decay=settings.HIGHLIGHT_REPEAT_DECAY,
+        )
+        selected: List[SceneSlice] = [
+            SceneSlice(
+                video_path=candidates[i].video_path,
+                start=candidates[i].start,
+                end=candidates[i].start + take,
+                motion=candidates[i].motion,
+                loudness=candidates[i].loudness,
+                score=candidates[i].score,
             )
-            total += take
+            for i, take in picks
+        ]
 
         if not selected and candidates:
-            first = candidates[0]
+            first = max(candidates, key=lambda c: c.score)
             take = min(target_duration, first.duration)
             selected.append(
                 SceneSlice(
@@ -116,7 +123,9 @@ class HeuristicHighlightDetector:
 
 def get_highlight_detector() -> HighlightDetector:
     detector = settings.HIGHLIGHT_DETECTOR.lower()
-    if detector == "heuristic":
+    if detector in ("heuristic", "fast"):
+        # "fast" scores the same way; get_clip_features picks the
+        # decimated analysis profile from the same setting.
         return HeuristicHighlightDetector(enable_model=settings.USE_HIGHLIGHT_MODEL)
     logger.warning(
         "Unknown highlight detector '%s', falling back to heuristic", detector
@@ -126,29 +135,43 @@ def get_highlight_detector() -> HighlightDetector:
 
 def detect_scenes_seconds(video_path: str) -> List[Tuple[float, float]]:
     """
-    Detect scene boundaries in video using PySceneDetect.
+    Detect scene boundaries from the clip's per-frame scene-cut scores.
 
     Returns list of (start_seconds, end_seconds) tuples for each scene.
     Falls back to single 30s scene if no scenes detected.
     """
-    vm = VideoManager([video_path])
-    sm = SceneManager()
-    sm.add_detector(ContentDetector(threshold=30.0))
-    vm.set_downscale_factor()
-    vm.start()
-    sm.detect_scenes(frame_source=vm)
-    scene_list = sm.get_scene_list()
-    vm.release()
-    results = []
-    for s, e in scene_list:
-        results.append((s.get_seconds(), e.get_seconds()))
+    results = scenes_from_features(get_clip_features(video_path))
     if not results:
         results.append((0.0, 30.0))
     return results
 
 
+def _window_backend() -> bool:
+    """
+    Whether motion is measured by decoding each scored window. Only the motion
+    signals switch: scenes and loudness need the whole-clip feature pass
+    either way, so the detector decodes each clip in full regardless.
+    """
+    return settings.MOTION_BACKEND.lower() == "window"
+
+
+def _window_block_stats(values: np.ndarray) -> Tuple[float, float, int]:
+    """Block-mean statistics of the window backend's motion samples."""
+    if not values.size:
+        return 0.0, 0.0, 0
+    per_block = max(1, int(round(MOTION_SAMPLE_FPS * BLOCK_SECONDS)))
+    blocks = np.add.reduceat(values, np.arange(0, values.size, per_block))
+    counts = np.diff(np.append(np.arange(0, values.size, per_block), values.size))
+    means = blocks / counts
+    return float(means.mean()), float(means.var()), int(means.size)
+
+
 def motion_score(
-    video_path: str, start: float, duration: float, sample_fps: int = 6
+    video_path: str,
+    start: float,
+    duration: float,
+    sample_fps: int = MOTION_SAMPLE_FPS,
+    values: Optional[np.ndarray] = None,
 ) -> float:
     """
     Calculate motion intensity score for a video segment.
@@ -161,77 +184,33 @@ def motion_score(
         start: Start time in seconds
         duration: Duration to analyze in seconds
         sample_fps: How many frames per second to sample (default 6)
+        values: The window backend's motion samples of the window, if
+            already decoded (at ``sample_fps``)
 
     Returns:
-        Average motion score (0.0 if no frames processed)
+        Median motion score (0.0 if no frames processed)
     """
-    cap = cv2.VideoCapture(video_path)
-    cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000.0)
-    prev = None
-    motion_values = []
-    ms_step = 1000.0 / sample_fps
-
-    while True:
-        pos = cap.get(cv2.CAP_PROP_POS_MSEC)
-        if pos - start * 1000.0 > duration * 1000.0:
-            break
-        ret, frame = cap.read()
-        if not ret:
-            break
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        if prev is not None:
-            diff = cv2.absdiff(gray, prev)
-            motion_values.append(float(diff.mean()))
-        prev = gray
-        cap.set(cv2.CAP_PROP_POS_MSEC, pos + ms_step)
-
-    cap.release()
-
-    if not motion_values:
-        return 0.0
-
-    # Use median to reduce impact of outliers (more robust than mean)
-    return float(np.median(motion_values))
+    if _window_backend():
+        if values is None:
+            values = window_motion(video_path, start, duration, sample_fps)
+        return float(np.median(values)) if values.size else 0.0
+    index = get_window_index(video_path)
+    # Median over every frame in the window, answered from prefix histograms;
+    # sample_fps only applies to the window backend.
+    return index.motion_median(start, duration)
 
 
 def estimate_loudness(video_path: str, start: float, duration: float) -> float:
     """Return mean loudness (dB) for a clip window."""
-    cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-ss",
-        str(max(0.0, start)),
-        "-t",
-        str(max(0.1, duration)),
-        "-i",
-        video_path,
-        "-af",
-        "volumedetect",
-        "-f",
-        "null",
-        "-",
-    ]
-    try:
-        proc = run_ffmpeg(cmd)
-    except FFmpegExecutionError as exc:
-        logger.debug("volumedetect failed for %s: %s", video_path, exc)
-        return -30.0
-
-    stderr = proc.stderr or ""
-    match = re.search(r"mean_volume:\s*([\-\d\.]+) dB", stderr)
-    if not match:
-        return -30.0
-    try:
-        return float(match.group(1))
-    except ValueError:
+    volume = get_window_index(video_path).volume(start, duration)
+    if volume is None:
         return -30.0
+    return volume[0]
 
 
 def audio_energy_score(video_path: str, start: float, duration: float) -> float:
     """
-    Calculate audio energy score using FFmpeg volumedetect.
+    Calculate audio energy score from the clip's per-frame audio levels.
 
     Analyzes mean volume, dynamic range, and peak energy.
     Higher scores indicate more engaging audio (louder, more dynamic).
@@ -244,45 +223,22 @@ def audio_energy_score(video_path: str, start: float, duration: float) -> float:
     Returns:
         Normalized audio energy score (0-100)
     """
-    try:
-        cmd = [
-            "ffmpeg",
-            "-ss",
-            str(max(0.0, start)),
-            "-t",
-            str(max(0.1, duration)),
-            "-i",
-            video_path,
-            "-af",
-            "volumedetect",
-            "-f",
-            "null",
-            "-",
-        ]
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        stderr = proc.stderr or ""
-
-        # Extract volume metrics
-        mean_match = re.search(r"mean_volume:\s*([-\d\.]+)\s*dB", stderr)
-        peak_match = re.search(r"max_volume:\s*([-\d\.]+)\s*dB", stderr)
-
-        if mean_match and peak_match:
-            mean_db = float(mean_match.group(1))
-            peak_db = float(peak_match.group(1))
-
-            # Normalize to 0-100 scale
-            # Reference: -30 dB is quiet, -5 dB is loud
-            # Dynamic range bonus: more variation = more interesting
-            mean_score = max(0, min(100, 30 + mean_db))
-            dynamic_score = (peak_db - mean_db) / 3  # bonus for dynamic range
-            return float(mean_score + dynamic_score)
-    except Exception:
-        pass
+    volume = get_window_index(video_path).volume(start, duration)
+    if volume is None:
+        return 30.0  # Default moderate score
 
-    return 30.0  # Default moderate score
+    mean_db, peak_db = volume
+    # Normalize to 0-100 scale
+    # Reference: -30 dB is quiet, -5 dB is loud
+    # Dynamic range bonus: more variation = more interesting
+    mean_score = max(0, min(100, 30 + mean_db))
+    dynamic_score = (peak_db - mean_db) / 3  # bonus for dynamic range
+    return float(mean_score + dynamic_score)
 
 
-def temporal_consistency_score(video_path: str, start: float, duration: float) -> float:
+def temporal_consistency_score(
+    video_path: str, start: float, duration: float, values: Optional[np.ndarray] = None
+) -> float:
     """
     Calculate temporal consistency score for action continuity.
 
@@ -293,32 +249,25 @@ def temporal_consistency_score(video_path: str, start: float, duration: float) -
         video_path: Path to video file
         start: Start time in seconds
         duration: Duration to analyze in seconds
+        values: The window backend's motion samples of the window, if
+            already decoded
 
     Returns:
         Consistency score (0-100)
     """
     try:
-        # Sample motion at multiple points
-        sample_points = max(3, int(duration * 2))  # 2 samples per second
-        sample_duration = duration / sample_points
-
-        motion_scores = []
-        for i in range(sample_points):
-            offset = i * sample_duration
-            score = motion_score(
-                video_path, start + offset, sample_duration, sample_fps=3
-            )
-            motion_scores.append(score)
-
-        if not motion_scores:
+        if _window_backend():
+            if values is None:
+                values = window_motion(video_path, start, duration, MOTION_SAMPLE_FPS)
+            mean_motion, variance, count = _window_block_stats(values)
+        else:
+            # Half-second motion block means over the window, via prefix sums
+            mean_motion, variance, count = get_window_index(
+                video_path
+            ).motion_block_stats(start, duration)
+        if count == 0:
             return 50.0
 
-        # Variance: lower variance = more consistent
-        variance = float(np.var(motion_scores))
-
-        # Mean: prefer decent motion overall
-        mean_motion = float(np.mean(motion_scores))
-
         # Combine: consistency bonus for lower variance, baseline for mean motion
         consistency_bonus = max(0, 100 - variance * 10)  # Penalty for high variance
         motion_baseline = min(100, mean_motion / 5)  # Scale motion to 0-100
@@ -343,10 +292,14 @@ def fused_score(video_path: str, start: float, duration: float) -> Dict[str, flo
     Returns:
         Dictionary with individual scores and fused_score
     """
-    # Get individual scores
-    motion = motion_score(video_path, start, duration)
+    # Get individual scores; the window backend decodes the window once for both
+    # motion signals
+    values = None
+    if _window_backend():
+        values = window_motion(video_path, start, duration, MOTION_SAMPLE_FPS)
+    motion = motion_score(video_path, start, duration, values=values)
     audio = audio_energy_score(video_path, start, duration)
-    temporal = temporal_consistency_score(video_path, start, duration)
+    temporal = temporal_consistency_score(video_path, start, duration, values=values)
 
     # Learned weights (can be tuned based on empirical testing)
     weights = {
@@ -3,26 +3,25 @@ Music generation pipeline module
 Supports both simple FFmpeg generation and AI-powered generation via services.music_generation
 """
 
+from functools import partial
+from typing import Iterable, Tuple
+
+from pipeline import music_library
 from pipeline.utils.ffmpeg import run_ffmpeg
 
 try:
-    from services.music_generation import generate_music_bed as ai_generate_music_bed
+    from services.music_generation import (
+        MusicGenerator,
+        generate_music_bed as ai_generate_music_bed,
+        music_params,
+    )
 
     HAS_AI_MUSIC = True
 except ImportError:
     HAS_AI_MUSIC = False
 
 
-def generate_music_bed(
-    duration: float, output_path: str, freq: int = 220, style: str = None
-) -> str:
-    """Generate music bed - uses AI if available, falls back to FFmpeg sine wave"""
-    if HAS_AI_MUSIC and style:
-        try:
-            return ai_generate_music_bed(duration, output_path, style)
-        except Exception:
-            pass  # Fall back to simple generation
-
+def _generate_tone(duration: float, output_path: str, freq: int = 220) -> str:
     # Simple FFmpeg-based generation
     cmd = [
         "ffmpeg",
@@ -41,6 +40,41 @@ def generate_music_bed(
     return output_path
 
 
+def _ai_key(style: str) -> Tuple[str, ...]:
+    return ("ai", MusicGenerator.backend(), *music_params(style=style))
+
+
+def generate_music_bed(
+    duration: float, output_path: str, freq: int = 220, style: str = None
+) -> str:
+    """
+    Generate music bed - uses AI if available, falls back to FFmpeg sine wave.
+
+    ``.wav`` outputs are cut from the pre-rendered bed library.
+    """
+    if HAS_AI_MUSIC and style:
+        try:
+            render = partial(ai_generate_music_bed, style=style)
+            return music_library.fetch(_ai_key(style), duration, output_path, render)
+        except Exception:
+            pass  # Fall back to simple generation
+
+    render = partial(_generate_tone, freq=freq)
+    return music_library.fetch(("tone", freq), duration, output_path, render)
+
+
+def warm_music_library(styles: Iterable[str] = (), freqs: Iterable[int] = (220,)) -> int:
+    """Pre-render every bucket for the given styles and tones; returns beds rendered."""
+    rendered = 0
+    if HAS_AI_MUSIC:
+        for style in styles:
+            render = partial(ai_generate_music_bed, style=style)
+            rendered += music_library.warm(_ai_key(style), render)
+    for freq in freqs:
+        rendered += music_library.warm(("tone", freq), partial(_generate_tone, freq=freq))
+    return rendered
+
+
 def build_ducking_filter(main_label: str = "a0", music_label: str = "a1") -> str:
     # Sidechain compress: duck music under main audio
     # Requires inputs mapped as [0:a] and [1:a]
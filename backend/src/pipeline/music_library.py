@@ -0,0 +1,140 @@
+"""
+Pre-rendered music bed library.
+
+A bed depends only on its generator parameters (style, tempo, mood) and
+its length, and lengths come from a small range (target durations are
+capped by FREEMIUM_MAX_DURATION). The library keeps one bed per
+(parameters, duration bucket) in the ``music`` cache directory, rendered
+at the bucket's length and stored as 16-bit PCM WAV.
+
+A request is served from the smallest bucket that covers it: the PCM
+frames up to the requested length are copied verbatim and only the
+fade-out tail is rewritten, in-process. PCM keeps the cut sample-exact
+(compressed beds would need a re-encoded tail, and its encoder priming
+leaves a gap at the splice). ``warm`` renders beds ahead of time so jobs
+almost never pay for generation.
+"""
+
+import logging
+import os
+import re
+import threading
+import wave
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+from pipeline.utils.disk_cache import prune, touch
+from pipeline.utils.ffmpeg import run_ffmpeg
+from storage import cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when generators change so stale beds are not served
+MUSIC_LIBRARY_VERSION = "1"
+
+# render(duration, output_path) -> output_path; writes any ffmpeg-readable audio
+Renderer = Callable[[float, str], str]
+
+
+def buckets() -> List[int]:
+    return sorted(int(b) for b in settings.MUSIC_LIBRARY_BUCKETS.split(",") if b.strip())
+
+
+def bucket_for(duration: float) -> Optional[int]:
+    """Smallest bucket (seconds) covering ``duration``; None if it exceeds them all."""
+    for bucket in buckets():
+        if duration <= bucket:
+            return bucket
+    return None
+
+
+def bed_path(key: Sequence[str], bucket: int) -> str:
+    name = "_".join(re.sub(r"[^A-Za-z0-9.-]+", "-", str(part)) for part in key)
+    return os.path.join(cache_dir("music"), f"{name}_{bucket}s_v{MUSIC_LIBRARY_VERSION}.wav")
+
+
+def _tmp_path(path: str, suffix: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp{suffix}"
+
+
+def _render_wav(render: Renderer, duration: float, output_path: str) -> None:
+    """Run ``render`` and convert its output to 16-bit PCM WAV at ``output_path``."""
+    rendered = _tmp_path(output_path, ".mp3")
+    try:
+        render(duration, rendered)
+        run_ffmpeg(
+            ["ffmpeg", "-y", "-i", rendered, "-c:a", "pcm_s16le", "-f", "wav", output_path]
+        )
+    finally:
+        if os.path.exists(rendered):
+            os.remove(rendered)
+
+
+def ensure(key: Sequence[str], bucket: int, render: Renderer) -> str:
+    """Path of the bed for ``key`` at ``bucket`` seconds, rendering it if missing."""
+    path = bed_path(key, bucket)
+    if os.path.exists(path):
+        touch(path)
+        return path
+    logger.info("Rendering %ss music bed %s", bucket, os.path.basename(path))
+    tmp_path = _tmp_path(path, "")
+    try:
+        _render_wav(render, bucket, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    prune(os.path.dirname(path), settings.MUSIC_LIBRARY_MAX_MB * 1024 * 1024)
+    return path
+
+
+def warm(key: Sequence[str], render: Renderer) -> int:
+    """Render every missing bucket for ``key``; returns how many beds were rendered."""
+    rendered = 0
+    for bucket in buckets():
+        if os.path.exists(bed_path(key, bucket)):
+            continue
+        ensure(key, bucket, render)
+        rendered += 1
+    return rendered
+
+
+def trim_with_fade(bed: str, duration: float, output_path: str, fade: float) -> str:
+    """Copy the first ``duration`` seconds of a PCM WAV bed, fading out the last ``fade``."""
+    with wave.open(bed, "rb") as src:
+        params = src.getparams()
+        frames = min(params.nframes, int(round(duration * params.framerate)))
+        tail_frames = min(frames, int(round(fade * params.framerate)))
+        body = src.readframes(frames - tail_frames)
+        tail = np.frombuffer(src.readframes(tail_frames), dtype="<i2")
+
+    if tail_frames:
+        ramp = np.linspace(1.0, 0.0, tail_frames, endpoint=False)
+        tail = tail.reshape(tail_frames, params.nchannels) * ramp[:, None]
+        tail = np.round(tail).astype("<i2")
+    with wave.open(output_path, "wb") as dst:
+        dst.setnchannels(params.nchannels)
+        dst.setsampwidth(params.sampwidth)
+        dst.setframerate(params.framerate)
+        dst.writeframes(body)
+        dst.writeframes(tail.tobytes())
+    return output_path
+
+
+def fetch(key: Sequence[str], duration: float, output_path: str, render: Renderer) -> str:
+    """
+    Write a ``duration``-second bed for ``key`` to ``output_path`` (a .wav).
+
+    Served from the library when a bucket covers the duration; otherwise
+    (library disabled, too long, or not a WAV output) rendered directly.
+    """
+    bucket = bucket_for(duration) if settings.MUSIC_LIBRARY_ENABLED else None
+    if not output_path.lower().endswith(".wav"):
+        return render(duration, output_path)
+    if bucket is None:
+        _render_wav(render, duration, output_path)
+        return output_path
+    bed = ensure(key, bucket, render)
+    return trim_with_fade(bed, duration, output_path, settings.MUSIC_LIBRARY_FADE_SECONDS)
@@ -1,43 +1,164 @@
+import logging
 import os
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
+from config import settings
+from pipeline.utils.disk_cache import link_or_copy
 from pipeline.utils.ffmpeg import run_ffmpeg
+from pipeline.utils.probe import MediaInfo, probe_media
+from pipeline.utils.workers import carry_context, cpu_slots, split_threads
+
+logger = logging.getLogger(__name__)
 
 FFMPEG = "ffmpeg"
 
+# Normalization strategies, cheapest first
+SKIP = "skip"  # already conforming MP4: link/copy the file
+REMUX = "remux"  # conforming streams in another container: stream copy
+AUDIO = "audio"  # conforming video, other audio codec: copy video, encode audio
+TRANSCODE = "transcode"  # full re-encode
 
-def normalize_clip(input_path: str, output_path: str) -> str:
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    cmd = [
+# ffmpeg format_name values that mean an MP4-family container
+_MP4_FORMATS = {"mov", "mp4", "m4a", "3gp", "3g2", "mj2"}
+
+
+def _video_conforms(info: MediaInfo) -> bool:
+    return (
+        info.video_codec == settings.NORMALIZE_VIDEO_CODEC
+        and info.width == settings.NORMALIZE_WIDTH
+        and info.pix_fmt == settings.NORMALIZE_PIX_FMT
+        and info.rotation == 0
+        # Constant frame rate at the target: r_frame_rate and avg_frame_rate agree
+        and abs(info.fps - settings.NORMALIZE_FPS) < 0.01
+        and abs(info.avg_fps - settings.NORMALIZE_FPS) < 0.01
+    )
+
+
+def _audio_conforms(info: MediaInfo) -> bool:
+    return not info.has_audio or info.audio_codec == settings.NORMALIZE_AUDIO_CODEC
+
+
+def plan_normalization(info: Optional[MediaInfo], output_path: str) -> str:
+    """Pick the cheapest strategy that yields a clip in the normalized format."""
+    if info is None or not info.has_video or not _video_conforms(info):
+        return TRANSCODE
+    if not _audio_conforms(info):
+        return AUDIO
+    container = set(info.format_name.split(","))
+    if container & _MP4_FORMATS and output_path.lower().endswith(".mp4"):
+        return SKIP
+    return REMUX
+
+
+def _encode_audio_args() -> List[str]:
+    return ["-c:a", "aac", "-b:a", settings.NORMALIZE_AUDIO_BITRATE]
+
+
+def _thread_args(threads: int) -> List[str]:
+    if threads <= 0:
+        return []
+    return ["-threads", str(threads), "-filter_threads", str(threads)]
+
+
+def _normalize_command(
+    input_path: str, output_path: str, strategy: str, threads: int = 0
+) -> List[str]:
+    if strategy == TRANSCODE:
+        return [
+            FFMPEG,
+            "-y",
+            "-i",
+            input_path,
+            "-vf",
+            f"scale={settings.NORMALIZE_WIDTH}:-2:flags=lanczos,fps={settings.NORMALIZE_FPS},"
+            f"format={settings.NORMALIZE_PIX_FMT}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-crf",
+            "20",
+            *_encode_audio_args(),
+            *_thread_args(threads),
+            output_path,
+        ]
+    return [
         FFMPEG,
         "-y",
         "-i",
         input_path,
-        "-vf",
-        "scale=1920:-1:flags=lanczos,fps=30",
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
         "-c:v",
-        "libx264",
-        "-preset",
-        "veryfast",
-        "-crf",
-        "20",
-        "-c:a",
-        "aac",
-        "-b:a",
-        "192k",
+        "copy",
+        *(["-c:a", "copy"] if strategy == REMUX else _encode_audio_args()),
+        *_thread_args(threads if strategy == AUDIO else 0),
+        "-movflags",
+        "+faststart",
         output_path,
     ]
-    run_ffmpeg(cmd)
+
+
+def normalize_clip(input_path: str, output_path: str) -> str:
+    """
+    Normalize one clip. A transcode runs a fixed ``PREPROCESS_THREADS_PER_CLIP``
+    encoder threads, because x264's bitstream depends on its thread count: the
+    same upload normalizes to the same bytes (and cache keys) whichever worker
+    encodes it and however many CPU slots are free.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    strategy = plan_normalization(probe_media(input_path), output_path)
+    logger.info("Normalizing %s via %s", os.path.basename(input_path), strategy)
+    if strategy == SKIP:
+        link_or_copy(input_path, output_path)
+        return output_path
+    if strategy == REMUX:  # stream copy: I/O, not CPU
+        run_ffmpeg(_normalize_command(input_path, output_path, strategy))
+        return output_path
+    threads = max(1, settings.PREPROCESS_THREADS_PER_CLIP) if strategy == TRANSCODE else 1
+    with cpu_slots(threads, minimum=threads):
+        run_ffmpeg(_normalize_command(input_path, output_path, strategy, threads))
     return output_path
 
 
-def preprocess_clips(input_files: List[str], workdir: str) -> List[str]:
-    processed = []
+def preprocessed_paths(input_files: List[str], workdir: str) -> List[str]:
+    """Where ``preprocess_clips`` writes each normalized clip."""
     out_dir = os.path.join(workdir, "preprocessed")
     os.makedirs(out_dir, exist_ok=True)
-    for idx, f in enumerate(input_files):
-        base = os.path.splitext(os.path.basename(f))[0]
-        out_path = os.path.join(out_dir, f"{idx:03d}_{base}.mp4")
-        normalize_clip(f, out_path)
-        processed.append(out_path)
+    return [
+        os.path.join(out_dir, f"{idx:03d}_{os.path.splitext(os.path.basename(f))[0]}.mp4")
+        for idx, f in enumerate(input_files)
+    ]
+
+
+def preprocess_clips(input_files: List[str], workdir: str) -> List[str]:
+    processed = preprocessed_paths(input_files, workdir)
+    if not processed:
+        return processed
+
+    # Encode concurrently, as many clips at once as this task's CPU share
+    # fits at the encodes' fixed thread count.
+    workers, _ = split_threads(
+        len(processed), settings.PREPROCESS_THREADS_PER_CLIP, settings.PREPROCESS_MAX_WORKERS
+    )
+    if workers == 1:
+        for f, out_path in zip(input_files, processed):
+            normalize_clip(f, out_path)
+        return processed
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preprocess") as pool:
+        futures = [
+            pool.submit(carry_context(normalize_clip), f, out_path)
+            for f, out_path in zip(input_files, processed)
+        ]
+        try:
+            for future in futures:
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
     return processed
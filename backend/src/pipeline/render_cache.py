@@ -0,0 +1,93 @@
+"""
+Content-addressed render cache.
+
+A rendered output is identified by everything that determines its bytes:
+the content of every source clip, each slice's in point and duration, and
+the render settings (filter chain, encoder arguments, finishing inputs)
+supplied by the caller. Outputs are stored once per key in the ``renders``
+cache directory and hard-linked into each job's export dir, so a Celery
+retry, a duplicate submission or a weekly re-compile of the same timeline
+costs a link instead of an encode.
+
+Cache entries and the job files linked to them share an inode: writers
+must unlink an output path before rendering to it again (never truncate
+it in place), or they would corrupt the cached copy.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional, Sequence, Tuple
+
+from config import settings
+from pipeline.utils.disk_cache import link_or_copy, prune, touch
+from pipeline.utils.hashing import content_hash
+from storage import cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when the renderer changes in a way that alters output bytes
+RENDER_CACHE_VERSION = "1"
+
+
+def render_key(
+    clips: Sequence[Tuple[str, float, float]], parts: Sequence[str]
+) -> Optional[str]:
+    """
+    Cache key for rendering ``clips`` with the settings described by ``parts``.
+
+    Returns None if a source clip cannot be hashed (the render then simply
+    bypasses the cache).
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"v{RENDER_CACHE_VERSION}\n".encode())
+    try:
+        for path, start, dur in clips:
+            digest.update(f"{content_hash(path)}|{start}|{dur}\n".encode())
+    except OSError as exc:
+        logger.debug("Cannot hash render inputs: %s", exc)
+        return None
+    for part in parts:
+        digest.update(f"{part}\n".encode())
+    return digest.hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(cache_dir("renders"), f"{key}.mp4")
+
+
+def fetch(key: str, output_path: str) -> bool:
+    """Link the cached render for ``key`` to ``output_path``; False on a miss."""
+    try:
+        path = _entry_path(key)
+        if not os.path.exists(path):
+            return False
+        touch(path)
+        link_or_copy(path, output_path)
+    except OSError as exc:
+        logger.warning("Render cache lookup failed for %s: %s", key, exc)
+        return False
+    logger.info("Render cache hit %s -> %s", key[:12], output_path)
+    return True
+
+
+def store(key: str, output_path: str) -> None:
+    """Add a finished render to the cache (best effort), then enforce limits."""
+    path = tmp_path = ""
+    try:
+        path = _entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        link_or_copy(output_path, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logger.warning("Could not store render %s in cache: %s", output_path, exc)
+        return
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    prune(
+        os.path.dirname(path),
+        settings.RENDER_CACHE_MAX_MB * 1024 * 1024,
+        settings.RENDER_CACHE_MAX_AGE_HOURS * 3600,
+    )
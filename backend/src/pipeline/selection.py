@@ -0,0 +1,170 @@
+"""
+Budgeted highlight selection.
+
+Treats montage assembly as a knapsack: every candidate window is worth its
+score and costs the seconds it would take, and the summed score of the
+selected windows is maximised within the duration budget. The objective is
+made submodular by a diversity term -- repeat picks from the same source
+clip are worth ``repeat_decay ** n`` of their score -- and hard constraints
+are an optional per-clip cap and no overlapping windows within a clip.
+
+Selection is a lazy greedy on score over a heap (score is an intensity, so a
+longer window is not worth less per pick; score per second only breaks
+ties), and overlap and event lookups are bisections, so the whole pass is O(n log n) in the number
+of candidates and scales to the tens of thousands of windows a long VOD
+produces.
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Same clamps the greedy selectors used: every take is 1-4 seconds.
+MIN_TAKE = 1.0
+MAX_TAKE = 4.0
+
+# (clip key, start, duration, score)
+Candidate = Tuple[str, float, float, float]
+
+
+class EventIndex:
+    """Model events sorted by time for bisection lookups."""
+
+    def __init__(self, events: Iterable[Mapping[str, float]]) -> None:
+        timed: List[Tuple[float, float]] = []
+        # Events without a timestamp count as "near" every window, as before.
+        self._untimed = 0.0
+        for ev in events:
+            confidence = float(ev.get("confidence", 0.0))
+            if "time" in ev:
+                timed.append((float(ev["time"]), confidence))
+            else:
+                self._untimed = max(self._untimed, confidence)
+        timed.sort()
+        self.times = [t for t, _ in timed]
+        # Sparse table over confidences: O(1) range max after O(E log E) build.
+        self._table: List[List[float]] = [[c for _, c in timed]]
+        width = 1
+        while width * 2 <= len(timed):
+            prev = self._table[-1]
+            self._table.append(
+                [max(prev[i], prev[i + width]) for i in range(len(prev) - width)]
+            )
+            width *= 2
+
+    def __len__(self) -> int:
+        return len(self.times) + (1 if self._untimed else 0)
+
+    def max_confidence(self, center: float, window: float, inclusive: bool = True) -> float:
+        """Highest confidence among events within ``window`` seconds of ``center``."""
+        if inclusive:
+            lo = bisect_left(self.times, center - window)
+            hi = bisect_right(self.times, center + window)
+        else:
+            lo = bisect_right(self.times, center - window)
+            hi = bisect_left(self.times, center + window)
+        best = self._untimed
+        if hi > lo:
+            level = (hi - lo).bit_length() - 1
+            row = self._table[level]
+            best = max(best, row[lo], row[hi - (1 << level)])
+        return best
+
+    def nearest(self, t: float) -> Optional[float]:
+        """Time of the event closest to ``t`` (None without timed events)."""
+        i = bisect_left(self.times, t)
+        neighbours = self.times[max(0, i - 1) : i + 1]
+        return min(neighbours, key=lambda e: abs(e - t)) if neighbours else None
+
+
+class IntervalSet:
+    """
+    Disjoint ``[start, end)`` intervals kept sorted by start.
+
+    Because stored intervals never overlap, their ends are sorted as well, so
+    an overlap query only has to check the two neighbours found by bisection
+    -- the degenerate (and much cheaper) case of an interval tree.
+    """
+
+    def __init__(self) -> None:
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def overlaps(self, start: float, end: float) -> bool:
+        i = bisect_right(self._starts, start)
+        if i and self._ends[i - 1] > start:
+            return True
+        return i < len(self._starts) and self._starts[i] < end
+
+    def add(self, start: float, end: float) -> None:
+        i = bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+
+
+def _priority(score: float, take: float, picks: int, repeat_decay: float) -> Tuple[float, float]:
+    """Heap key: highest (decayed) score first, then score per second."""
+    value = score * (repeat_decay**picks) if score > 0 else score
+    return -value, -value / take
+
+
+def select_highlights(
+    candidates: Sequence[Candidate],
+    budget: float,
+    min_take: float = MIN_TAKE,
+    max_take: float = MAX_TAKE,
+    per_clip_cap: int = 0,
+    repeat_decay: float = 1.0,
+) -> List[Tuple[int, float]]:
+    """
+    Select candidate windows for a ``budget``-second montage.
+
+    Args:
+        candidates: ``(clip, start, duration, score)`` tuples
+        budget: Target montage length in seconds
+        min_take: Shortest take once the budget is nearly used up
+        max_take: Longest take from any single window
+        per_clip_cap: Maximum windows per clip (0 = unlimited)
+        repeat_decay: Value multiplier per earlier pick from the same clip
+
+    Returns:
+        ``(candidate index, seconds taken)`` in selection order. Ties are
+        broken by candidate index, so results are deterministic.
+    """
+    heap = []
+    for i, (_, _, duration, score) in enumerate(candidates):
+        take = min(duration, max_take)
+        if take > 0:
+            heap.append((*_priority(score, take, 0, repeat_decay), i, 0))
+    heapq.heapify(heap)
+
+    picks: Dict[str, int] = {}
+    taken: Dict[str, IntervalSet] = {}
+    selected: List[Tuple[int, float]] = []
+    total = 0.0
+    while heap and total < budget:
+        _, _, i, stamp = heapq.heappop(heap)
+        clip, start, duration, score = candidates[i]
+        count = picks.get(clip, 0)
+        if per_clip_cap and count >= per_clip_cap:
+            continue
+        if stamp != count:
+            # Priority was computed before later picks from this clip; re-queue
+            # it with its current (lower) value. Values only ever decrease, so
+            # an up-to-date entry at the top of the heap is the true best.
+            priority = _priority(score, min(duration, max_take), count, repeat_decay)
+            heapq.heappush(heap, (*priority, i, count))
+            continue
+
+        take = min(duration, max(min_take, min(max_take, budget - total)))
+        intervals = taken.setdefault(clip, IntervalSet())
+        if intervals.overlaps(start, start + take):
+            continue
+        intervals.add(start, start + take)
+        picks[clip] = count + 1
+        selected.append((i, take))
+        total += take
+    return selected
@@ -0,0 +1,208 @@
+"""
+Dependency-graph stage executor for the render tasks.
+
+A task declares its stages in order, each with the stages it ``needs``
+(it starts once they have all finished), a ``cost`` in CPU slots and a
+progress ``weight``. ``run`` starts every stage whose needs are met as
+soon as its cost fits in the remaining budget, so independent stages
+(music, transcription) overlap while dependent ones stay ordered.
+
+A stage may also consume another stage's result late, through
+``ctx.result(name)``: while it blocks there its slots are handed back to
+the budget, so the stage it waits for can be scheduled. Never wait on a
+stage that (transitively) needs the waiter.
+
+Progress is reported from the thread calling ``run`` only, after every
+start and finish (and whole percent of ``ctx.progress`` a running stage
+reports), as the done share of total weight plus the names of the running
+stages, so it is monotonic however the stages interleave. Stages run with
+the caller's context variables. Per-stage timings are kept in ``timings``.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pipeline.utils.workers import carry_context
+
+logger = logging.getLogger(__name__)
+
+# report(finished_fraction, running_stage_names)
+ProgressCallback = Callable[[float, List[str]], None]
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[["StageContext"], Any]
+    needs: Tuple[str, ...] = ()
+    cost: int = 1
+    weight: float = 1.0
+
+
+@dataclass
+class StageTiming:
+    started: float  # seconds after the graph started
+    seconds: float  # wall time, including ``waited``
+    waited: float = 0.0  # blocked in ``ctx.result`` on late dependencies
+
+
+class StageContext:
+    """Handle passed to a running stage."""
+
+    def __init__(self, graph: "StageGraph", stage: Stage) -> None:
+        self._graph = graph
+        self.stage = stage
+
+    def result(self, name: str) -> Any:
+        """Result of stage ``name``, waiting for it (with this stage's slots released)."""
+        return self._graph._await(self.stage, name)
+
+    def progress(self, fraction: float) -> None:
+        """Report this stage ``fraction`` done; safe from any thread."""
+        self._graph._advance(self.stage, fraction)
+
+
+class StageGraph:
+    def __init__(self, budget: int) -> None:
+        self.budget = max(1, budget)
+        self.timings: Dict[str, StageTiming] = {}
+        self._stages: Dict[str, Stage] = {}
+        self._futures: Dict[str, Future] = {}
+        self._cond = threading.Condition()
+        self._available = self.budget
+        self._running: List[str] = []
+        self._finished_weight = 0.0
+        self._partial: Dict[str, float] = {}  # running stage -> reported fraction
+        self._failure: Optional[BaseException] = None
+        self._waits: Dict[str, float] = {}
+        self._version = 0  # bumped on every start/finish, to report each once
+        self._t0 = 0.0
+
+    def add(
+        self,
+        name: str,
+        run: Callable[[StageContext], Any],
+        needs: Sequence[str] = (),
+        cost: int = 1,
+        weight: float = 1.0,
+    ) -> None:
+        """Declare a stage; ``needs`` must name stages added before it."""
+        unknown = [n for n in needs if n not in self._stages]
+        if name in self._stages or unknown:
+            raise ValueError(f"Invalid stage {name!r}: duplicate or unknown needs {unknown}")
+        cost = min(max(1, cost), self.budget)
+        self._stages[name] = Stage(name, run, tuple(needs), cost, weight)
+
+    def _await(self, stage: Stage, name: str) -> Any:
+        future = self._futures[name]
+        if future.done():
+            return future.result()
+        began = time.perf_counter()
+        with self._cond:
+            self._available += stage.cost
+            self._cond.notify_all()
+        try:
+            return future.result()
+        finally:
+            with self._cond:
+                # Taken back even if that overdraws the budget: the stage was
+                # admitted already, and new admissions wait until it is repaid
+                self._available -= stage.cost
+                self._waits[stage.name] = (
+                    self._waits.get(stage.name, 0.0) + time.perf_counter() - began
+                )
+
+    def _advance(self, stage: Stage, fraction: float) -> None:
+        with self._cond:
+            if stage.name not in self._running:
+                return
+            previous = self._partial.get(stage.name, 0.0)
+            fraction = min(1.0, max(previous, fraction))
+            self._partial[stage.name] = fraction
+            # Whole percents only: ffmpeg reports twice a second
+            if int(fraction * 100) > int(previous * 100):
+                self._version += 1
+                self._cond.notify_all()
+
+    def _done_weight(self) -> float:
+        return self._finished_weight + sum(
+            self._stages[name].weight * fraction for name, fraction in self._partial.items()
+        )
+
+    def _execute(self, stage: Stage) -> None:
+        began = time.perf_counter()
+        error: Optional[BaseException] = None
+        try:
+            self._futures[stage.name].set_result(stage.run(StageContext(self, stage)))
+        except BaseException as exc:  # noqa: B902 - re-raised by run()
+            error = exc
+            self._futures[stage.name].set_exception(exc)
+        elapsed = time.perf_counter() - began
+        with self._cond:
+            self.timings[stage.name] = StageTiming(
+                started=round(began - self._t0, 3),
+                seconds=round(elapsed, 3),
+                waited=round(self._waits.get(stage.name, 0.0), 3),
+            )
+            self._available += stage.cost
+            self._running.remove(stage.name)
+            self._partial.pop(stage.name, None)
+            self._finished_weight += stage.weight
+            if error is not None and self._failure is None:
+                self._failure = error
+            self._version += 1
+            self._cond.notify_all()
+        logger.info("Stage %s finished in %.2fs", stage.name, elapsed)
+
+    def _launch_ready(self, pending: List[Stage], pool: ThreadPoolExecutor) -> None:
+        for stage in list(pending):
+            if not all(self._futures[n].done() for n in stage.needs):
+                continue
+            if stage.cost > self._available:
+                continue
+            pending.remove(stage)
+            self._available -= stage.cost
+            self._running.append(stage.name)
+            self._version += 1
+            pool.submit(carry_context(self._execute), stage)
+
+    def run(self, report: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Run every stage; returns their results, or raises the first failure."""
+        self._futures = {name: Future() for name in self._stages}
+        self._t0 = time.perf_counter()
+        pending = list(self._stages.values())
+        total_weight = sum(s.weight for s in pending) or 1.0
+        reported = -1
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, len(pending)), thread_name_prefix="stage"
+        ) as pool:
+            while True:
+                with self._cond:
+                    if self._failure is None:
+                        self._launch_ready(pending, pool)
+                    else:
+                        # Stop scheduling; late waiters on these get CancelledError
+                        for stage in pending:
+                            self._futures[stage.name].cancel()
+                        pending.clear()
+                    finished = not self._running and not pending
+                    if self._version == reported and not finished:
+                        self._cond.wait()
+                        continue
+                    version = self._version
+                    fraction = self._done_weight() / total_weight
+                    running = list(self._running)
+                if report and version != reported:
+                    report(min(1.0, fraction), running)
+                reported = version
+                if finished:
+                    break
+
+        if self._failure is not None:
+            raise self._failure
+        return {name: future.result() for name, future in self._futures.items()}
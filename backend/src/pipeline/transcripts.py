@@ -0,0 +1,80 @@
+"""
+Speech transcription of the selected timeline windows.
+
+Only the selected slices reach the output, so STT runs on exactly those
+windows (``services.stt`` ``transcribe_window``) instead of whole uploads:
+its cost follows the output length. Each window's transcript is cached as
+JSON in the ``transcripts`` cache dir, keyed by the clip's content hash and
+the window, so retries, re-renders and other jobs selecting the same
+moment reuse it. Windows are transcribed concurrently.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+from config import settings
+from pipeline.utils.disk_cache import prune, touch, write_atomic
+from pipeline.utils.hashing import content_hash
+from pipeline.utils.workers import pool_size
+from services.stt.whisper_stub import transcribe_window
+from storage import cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when the STT engine or its output changes; also invalidates renders
+# whose mutes were derived from older transcripts (see tasks)
+TRANSCRIPT_CACHE_VERSION = "1"
+
+
+def _entry_path(video_path: str, start: float, duration: float) -> str:
+    name = f"{content_hash(video_path)}_{start:.3f}_{duration:.3f}_v{TRANSCRIPT_CACHE_VERSION}.json"
+    return os.path.join(cache_dir("transcripts"), name)
+
+
+def transcribe_window_cached(video_path: str, start: float, duration: float) -> Dict:
+    """Transcript of ``[start, start + duration)`` of the clip, word times in clip time."""
+    try:
+        path = _entry_path(video_path, start, duration)
+    except OSError as exc:
+        logger.debug("Cannot hash %s for transcript cache: %s", video_path, exc)
+        return transcribe_window(video_path, start, duration)
+
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            touch(path)
+            return result
+        except (OSError, ValueError) as exc:
+            logger.warning("Discarding unreadable transcript cache %s: %s", path, exc)
+
+    result = transcribe_window(video_path, start, duration)
+    try:
+        payload = json.dumps(result).encode()
+        write_atomic(path, lambda f: f.write(payload))
+    except OSError as exc:
+        logger.warning("Could not write transcript cache %s: %s", path, exc)
+        return result
+    prune(os.path.dirname(path), settings.TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)
+    return result
+
+
+def profanity_in_slices(clips: Sequence[Tuple[str, float, float]]) -> Dict[str, List[Dict]]:
+    """
+    Profanity spans (clip time) per source path, from the ``clips`` windows only.
+
+    Feed the result to ``censor.profanity_on_timeline`` with the same clips.
+    """
+    windows = list(dict.fromkeys((path, float(start), float(dur)) for path, start, dur in clips))
+    if not windows:
+        return {}
+    with ThreadPoolExecutor(max_workers=pool_size(len(windows)), thread_name_prefix="stt") as pool:
+        transcripts = list(pool.map(lambda w: transcribe_window_cached(*w), windows))
+
+    spans: Dict[str, List[Dict]] = {}
+    for (path, _, _), transcript in zip(windows, transcripts):
+        spans.setdefault(path, []).extend(transcript.get("profanity", []))
+    return spans
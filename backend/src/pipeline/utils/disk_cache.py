@@ -0,0 +1,79 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def touch(path: str) -> None:
+    """Mark a cache entry as recently used (mtime drives LRU eviction)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def write_atomic(path: str, writer: Callable[[object], None]) -> None:
+    """Write via ``writer(fileobj)`` to a temp file, then rename into place."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hard-link ``src`` to ``dst`` (replacing it), copying across filesystems."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def prune(directory: str, max_bytes: int, max_age: float = 0) -> int:
+    """
+    Evict least-recently-used entries until ``directory`` fits in ``max_bytes``.
+
+    With ``max_age`` > 0, entries unused for longer than that many seconds
+    are evicted first regardless of size. Returns the number of files removed.
+    """
+    entries: List[Tuple[float, int, str]] = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if name.endswith(".tmp"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age if max_age > 0 else 0.0
+    if total <= max_bytes and not any(mtime < cutoff for mtime, _, _ in entries):
+        return 0
+
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes and mtime >= cutoff:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    logger.info("Evicted %d entries from %s", removed, directory)
+    return removed
@@ -1,9 +1,35 @@
+"""
+Managed ffmpeg runner.
+
+Every process gets ``-progress`` on a private pipe: the reported output time
+feeds the progress callback of the enclosing ``ffmpeg_scope`` and a stall
+watchdog. Processes started inside ``ffmpeg_scope(job_id)`` can be stopped
+with ``cancel_job(job_id)`` from any thread of the same process (tasks
+call it when the job's cancel marker appears). Only the tail of stderr is
+kept, and CPU/memory limits from settings are applied to each process.
+
+Only failures that look transient (I/O and network errors, stalls) are
+retried; a bad input or filter graph fails the same way on every attempt.
+"""
+
+import contextvars
 import logging
+import os
 import shlex
 import subprocess
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Sequence, Optional
+from typing import BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from config import settings
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not on POSIX
+    resource = None  # type: ignore[assignment]
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +38,26 @@ MAX_RETRIES = 3
 RETRY_DELAY = 1.0  # seconds
 RETRY_BACKOFF = 2.0  # multiplier for exponential backoff
 
+# stderr lines kept per process (errors are at the end)
+STDERR_TAIL_LINES = 200
+
+# How often the runner checks cancellation, deadlines and stalls
+POLL_SECONDS = 0.25
+
+TRANSIENT_ERROR_KEYWORDS = (
+    "resource temporarily unavailable",
+    "server returned 5",
+    "timed out",
+    "i/o error",
+    "connection reset",
+    "connection refused",
+    "temporarily unavailable",
+)
+
+# progress(seconds): total output time written by the scope's processes;
+# may be called from several threads at once
+ProgressCallback = Callable[[float], None]
+
 
 @dataclass
 class FFmpegExecutionError(RuntimeError):
@@ -44,6 +90,276 @@ class FFmpegExecutionError(RuntimeError):
         
         return f"{user_message}\nCommand: {cmd}\nDetails: {self.stderr.strip()[:200]}"
 
+    @property
+    def transient(self) -> bool:
+        """Whether the same command may succeed when run again."""
+        stderr = (self.stderr or "").lower()
+        return any(keyword in stderr for keyword in TRANSIENT_ERROR_KEYWORDS)
+
+
+class FFmpegCancelledError(FFmpegExecutionError):
+    """The process was stopped by ``cancel_job``; never retried."""
+
+    def __str__(self) -> str:
+        return "Video processing was cancelled."
+
+    @property
+    def transient(self) -> bool:
+        return False
+
+
+class _Scope:
+    def __init__(
+        self,
+        job_id: Optional[str],
+        progress: Optional[ProgressCallback],
+        parent: Optional["_Scope"] = None,
+    ) -> None:
+        self.job_id = job_id
+        self._progress = progress
+        self._parent = parent if progress is None else None
+        self._written = 0.0
+        self._lock = threading.Lock()
+
+    def advance(self, seconds: float) -> None:
+        if self._parent is not None:
+            self._parent.advance(seconds)
+            return
+        if self._progress is None or seconds <= 0:
+            return
+        with self._lock:
+            self._written += seconds
+            written = self._written
+        try:
+            self._progress(written)
+        except Exception:  # a progress sink must never break the encode
+            logger.warning("ffmpeg progress callback failed", exc_info=True)
+
+
+_scope: contextvars.ContextVar[_Scope] = contextvars.ContextVar(
+    "ffmpeg_scope", default=_Scope(None, None)
+)
+
+_registry_lock = threading.Lock()
+_active_jobs: Dict[str, int] = {}  # job id -> open scopes
+_cancelled: Set[str] = set()
+_processes: Dict[str, Set[subprocess.Popen]] = {}
+
+
+@contextmanager
+def ffmpeg_scope(
+    job_id: Optional[str] = None, progress: Optional[ProgressCallback] = None
+) -> Iterator[None]:
+    """
+    Attribute the ffmpeg processes run inside the block to ``job_id`` (for
+    ``cancel_job``) and report their output time to ``progress``.
+
+    Scopes nest; unset arguments are inherited. Context variables do not
+    follow work into executor threads: submit with ``workers.carry_context``.
+    """
+    outer = _scope.get()
+    job_id = job_id or outer.job_id
+    token = _scope.set(_Scope(job_id, progress, outer))
+    if job_id:
+        with _registry_lock:
+            _active_jobs[job_id] = _active_jobs.get(job_id, 0) + 1
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+        if job_id:
+            with _registry_lock:
+                _active_jobs[job_id] -= 1
+                if not _active_jobs[job_id]:
+                    del _active_jobs[job_id]
+                    _cancelled.discard(job_id)
+
+
+def cancel_job(job_id: str) -> int:
+    """
+    Stop ``job_id``'s running ffmpeg processes in this process and fail its
+    later ones. Returns how many were signalled; a job not running here is
+    left alone.
+    """
+    with _registry_lock:
+        if job_id not in _active_jobs:
+            return 0
+        _cancelled.add(job_id)
+        processes = list(_processes.get(job_id, ()))
+    for proc in processes:
+        if proc.poll() is None:
+            # SIGKILL: on SIGTERM ffmpeg first flushes its encoders, which
+            # takes seconds, for output that is thrown away
+            proc.kill()
+    if processes:
+        logger.info("Cancelled %d ffmpeg process(es) of job %s", len(processes), job_id)
+    return len(processes)
+
+
+def _is_cancelled(job_id: Optional[str]) -> bool:
+    if not job_id:
+        return False
+    with _registry_lock:
+        return job_id in _cancelled
+
+
+def _apply_limits(pid: int) -> None:
+    """
+    Per-process limits, set right after spawning (prlimit) instead of in a
+    preexec_fn, which is not safe in a threaded worker.
+    """
+    try:
+        if resource is not None and hasattr(resource, "prlimit"):
+            if settings.FFMPEG_MAX_MEMORY_MB > 0:
+                limit = settings.FFMPEG_MAX_MEMORY_MB * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            if settings.FFMPEG_MAX_CPU_SECONDS > 0:
+                limit = settings.FFMPEG_MAX_CPU_SECONDS
+                resource.prlimit(pid, resource.RLIMIT_CPU, (limit, limit))
+        if settings.FFMPEG_NICE > 0:
+            os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + settings.FFMPEG_NICE)
+    except (OSError, ValueError) as exc:  # process already gone, or not permitted
+        logger.debug("Could not apply limits to ffmpeg pid %d: %s", pid, exc)
+
+
+def _with_progress(command: Sequence[str], fd: int) -> List[str]:
+    # Global options go right after the executable
+    return [command[0], "-nostats", "-progress", f"pipe:{fd}", *command[1:]]
+
+
+def _pump_lines(stream, sink: Callable[[str], None]) -> None:
+    try:
+        for line in stream:
+            sink(line)
+    finally:
+        stream.close()
+
+
+def _feed(stream, data: bytes) -> None:
+    try:
+        stream.buffer.write(data)  # the pipes are in text mode
+        stream.close()
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its return code says why
+
+
+def _read_progress(fd: int, scope: _Scope, advanced: List[float]) -> None:
+    """Parse ``-progress`` key=value blocks; ``advanced[0]`` = last advance time."""
+    last = 0.0
+    current = 0.0
+    with os.fdopen(fd, "r", errors="replace") as stream:
+        for line in stream:
+            key, _, value = line.strip().partition("=")
+            if key in ("out_time_us", "out_time_ms") and value.lstrip("-").isdigit():
+                # out_time_ms is in microseconds too (historical misnomer)
+                current = int(value) / 1_000_000
+            elif key == "progress":
+                if current > last:
+                    scope.advance(current - last)
+                    last = current
+                    advanced[0] = time.monotonic()
+
+
+def _stop(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.kill()  # see cancel_job
+    proc.wait()
+
+
+def _run_once(
+    command: Sequence[str],
+    capture: bool,
+    scope: _Scope,
+    input: Optional[bytes] = None,
+    output: Optional[BinaryIO] = None,
+) -> Tuple[subprocess.CompletedProcess, Optional[str]]:
+    """
+    Run ``command`` once under the scope's job. Returns the result and why
+    it was stopped early: None, "cancelled", "timeout" or "stalled".
+    """
+    capture = capture and output is None
+    read_fd, write_fd = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            _with_progress(command, write_fd),
+            stdin=subprocess.PIPE if input is not None else None,
+            stdout=output if output is not None else subprocess.PIPE if capture else None,
+            stderr=subprocess.PIPE,
+            pass_fds=(write_fd,),
+            text=True,
+            errors="replace",
+        )
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)  # the child holds its copy; EOF when it exits
+    _apply_limits(proc.pid)
+
+    job_id = scope.job_id
+    if job_id:
+        with _registry_lock:
+            _processes.setdefault(job_id, set()).add(proc)
+
+    stdout: List[str] = []
+    stderr: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+    advanced = [time.monotonic()]
+    readers = [
+        threading.Thread(target=_pump_lines, args=(proc.stderr, stderr.append), daemon=True),
+        threading.Thread(target=_read_progress, args=(read_fd, scope, advanced), daemon=True),
+    ]
+    if capture:
+        readers.append(
+            threading.Thread(target=_pump_lines, args=(proc.stdout, stdout.append), daemon=True)
+        )
+    if input is not None:
+        readers.append(threading.Thread(target=_feed, args=(proc.stdin, input), daemon=True))
+    for reader in readers:
+        reader.start()
+
+    started = time.monotonic()
+    stopped: Optional[str] = None
+    try:
+        while True:
+            try:
+                proc.wait(timeout=POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            now = time.monotonic()
+            if _is_cancelled(job_id):
+                stopped = "cancelled"
+            elif settings.FFMPEG_TIMEOUT_SECONDS and now - started > settings.FFMPEG_TIMEOUT_SECONDS:
+                stopped = "timeout"
+            elif settings.FFMPEG_STALL_SECONDS and now - advanced[0] > settings.FFMPEG_STALL_SECONDS:
+                stopped = "stalled"
+            if stopped:
+                _stop(proc)
+                break
+    finally:
+        if proc.poll() is None:  # interrupted (e.g. worker shutdown)
+            _stop(proc)
+        for reader in readers:
+            reader.join()
+        if job_id:
+            with _registry_lock:
+                _processes[job_id].discard(proc)
+                if not _processes[job_id]:
+                    del _processes[job_id]
+
+    if _is_cancelled(job_id):
+        stopped = "cancelled"
+    result = subprocess.CompletedProcess(
+        list(command), proc.returncode, "".join(stdout) if capture else None, "".join(stderr)
+    )
+    return result, stopped
+
+
+def _sleep_unless_cancelled(seconds: float, job_id: Optional[str]) -> None:
+    deadline = time.monotonic() + seconds
+    while not _is_cancelled(job_id) and time.monotonic() < deadline:
+        time.sleep(min(POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
 
 def run_ffmpeg(
     command: Sequence[str],
@@ -52,112 +368,85 @@ def run_ffmpeg(
     capture: bool = True,
     retries: int = MAX_RETRIES,
     retry_delay: float = RETRY_DELAY,
+    input: Optional[bytes] = None,
+    stdout: Optional[BinaryIO] = None,
 ) -> subprocess.CompletedProcess:
     """
     Run an ffmpeg command with structured logging, error handling, and retry logic.
-    
+
     Args:
         command: FFmpeg command as sequence of strings
         check: Raise exception on non-zero return code
-        capture: Capture stdout/stderr
-        retries: Number of retry attempts (default: 3)
+        capture: Capture stdout (stderr is always captured, last lines only)
+        retries: Retry attempts for transient failures (default: 3)
         retry_delay: Initial delay between retries in seconds (default: 1.0)
-        
+        input: Bytes written to the process's stdin
+        stdout: Binary file the process writes its stdout to, from the file's
+            current position (instead of capturing it); rewound for a retry
+
     Returns:
         subprocess.CompletedProcess
-        
+
     Raises:
-        FFmpegExecutionError: If command fails after all retries
+        FFmpegCancelledError: If the job was cancelled (regardless of ``check``)
+        FFmpegExecutionError: If command fails and cannot be retried
     """
     log_line = " ".join(shlex.quote(part) for part in command)
     logger.debug("Executing ffmpeg: %s", log_line)
-    
-    last_error = None
+    scope = _scope.get()
     delay = retry_delay
-    
+    start = 0
+    if stdout is not None:
+        stdout.flush()  # the process writes at the descriptor's offset
+        start = stdout.tell()
+
     for attempt in range(retries + 1):
-        try:
-            result = subprocess.run(
-                command,
-                capture_output=capture,
-                text=True,
-                check=False,
-                timeout=3600,  # 1 hour timeout for long operations
-            )
-            
-            if result.returncode == 0:
-                if attempt > 0:
-                    logger.info(f"FFmpeg succeeded on attempt {attempt + 1}")
-                return result
-            
-            # Non-zero return code
-            stderr = result.stderr or result.stdout or ""
-            
-            # Don't retry on certain errors (client errors, invalid input)
-            if any(keyword in stderr.lower() for keyword in [
-                "no such file",
-                "cannot find",
-                "invalid data",
-                "invalid argument",
-                "permission denied",
-            ]):
-                logger.warning(f"FFmpeg command failed (non-retryable): {log_line}")
-                if check:
-                    raise FFmpegExecutionError(
-                        command=list(command),
-                        returncode=result.returncode,
-                        stderr=stderr,
-                        attempt=attempt + 1,
-                    )
-                return result
-            
-            # Retryable error
-            if attempt < retries:
-                logger.warning(
-                    f"FFmpeg command failed (attempt {attempt + 1}/{retries + 1}), "
-                    f"retrying in {delay:.1f}s: {log_line}"
-                )
-                time.sleep(delay)
-                delay *= RETRY_BACKOFF  # Exponential backoff
-                continue
-            
-            # Final attempt failed
-            logger.error(f"FFmpeg command failed after {retries + 1} attempts: {log_line}")
-            if check:
-                raise FFmpegExecutionError(
-                    command=list(command),
-                    returncode=result.returncode,
-                    stderr=stderr,
-                    attempt=attempt + 1,
-                )
+        if _is_cancelled(scope.job_id):
+            raise FFmpegCancelledError(list(command), -1, "cancelled", attempt + 1)
+        if stdout is not None and attempt:
+            stdout.seek(start)
+            stdout.truncate()
+
+        result, stopped = _run_once(command, capture, scope, input, stdout)
+        if stopped == "cancelled":
+            raise FFmpegCancelledError(list(command), result.returncode, result.stderr, attempt + 1)
+        if result.returncode == 0 and stopped is None:
+            if attempt > 0:
+                logger.info(f"FFmpeg succeeded on attempt {attempt + 1}")
             return result
-            
-        except subprocess.TimeoutExpired as e:
-            logger.error(f"FFmpeg command timed out after 1 hour: {log_line}")
-            if attempt < retries:
-                logger.warning(f"Retrying after timeout (attempt {attempt + 1}/{retries + 1})")
-                time.sleep(delay)
-                delay *= RETRY_BACKOFF
-                continue
-            raise FFmpegExecutionError(
-                command=list(command),
-                returncode=-1,
-                stderr=f"Command timed out after 1 hour: {str(e)}",
-                attempt=attempt + 1,
+
+        if stopped == "timeout":
+            result.returncode = -1
+            result.stderr = f"Command timed out after {settings.FFMPEG_TIMEOUT_SECONDS}s\n{result.stderr}"
+        elif stopped == "stalled":
+            result.returncode = -1
+            result.stderr = (
+                f"Command stalled: no progress for {settings.FFMPEG_STALL_SECONDS}s\n{result.stderr}"
             )
-        except FFmpegExecutionError as e:
-            last_error = e
-            if attempt < retries and check:
-                logger.warning(f"Retrying after error (attempt {attempt + 1}/{retries + 1})")
-                time.sleep(delay)
-                delay *= RETRY_BACKOFF
-                continue
-            raise
-    
-    # Should not reach here, but handle it
-    if last_error:
-        raise last_error
-    
+        error = FFmpegExecutionError(
+            command=list(command),
+            returncode=result.returncode,
+            stderr=result.stderr or result.stdout or "",
+            attempt=attempt + 1,
+        )
+
+        # A stall may be a hung network read; a timeout would only run as
+        # long again, and errors without a transient cause are deterministic
+        retryable = stopped == "stalled" or (stopped is None and error.transient)
+        if attempt < retries and retryable:
+            logger.warning(
+                f"FFmpeg command failed (attempt {attempt + 1}/{retries + 1}), "
+                f"retrying in {delay:.1f}s: {log_line}"
+            )
+            _sleep_unless_cancelled(delay, scope.job_id)
+            delay *= RETRY_BACKOFF  # Exponential backoff
+            continue
+
+        logger.error(f"FFmpeg command failed on attempt {attempt + 1}: {log_line}")
+        if check:
+            raise error
+        return result
+
     raise FFmpegExecutionError(
         command=list(command),
         returncode=-1,
@@ -0,0 +1,42 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+_MEMO_SIZE = 1024
+_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def content_hash(path: str) -> str:
+    """
+    Return a hex digest of the file's bytes.
+
+    Digests are memoized per (path, mtime, size) so repeated lookups within a
+    worker do not re-read large clips; the least recently used of more than
+    ``_MEMO_SIZE`` entries are dropped.
+    """
+    abs_path = os.path.abspath(path)
+    st = os.stat(abs_path)
+    key = (abs_path, st.st_mtime_ns, st.st_size)
+    with _memo_lock:
+        cached = _memo.get(key)
+        if cached:
+            _memo.move_to_end(key)
+            return cached
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(abs_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+
+    with _memo_lock:
+        _memo[key] = value
+        _memo.move_to_end(key)
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return value
@@ -0,0 +1,106 @@
+import json
+import logging
+import subprocess
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+FFPROBE = "ffprobe"
+
+
+@dataclass
+class MediaInfo:
+    format_name: str
+    duration: float
+    video_codec: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    pix_fmt: Optional[str] = None
+    fps: float = 0.0  # r_frame_rate
+    avg_fps: float = 0.0  # avg_frame_rate; differs from fps for VFR sources
+    rotation: int = 0
+    audio_codec: Optional[str] = None
+    audio_channels: int = 0
+    audio_sample_rate: int = 0
+
+    @property
+    def has_video(self) -> bool:
+        return self.video_codec is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+
+def _rate(value: Optional[str]) -> float:
+    try:
+        rate = Fraction(value or "0")
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+    return float(rate)
+
+
+def _rotation(stream: dict) -> int:
+    for side_data in stream.get("side_data_list", []) or []:
+        if "rotation" in side_data:
+            return int(side_data["rotation"]) % 360
+    try:
+        return int(stream.get("tags", {}).get("rotate", 0)) % 360
+    except (TypeError, ValueError):
+        return 0
+
+
+def probe_media(path: str, timeout: float = 60.0) -> Optional[MediaInfo]:
+    """
+    Read container and first video/audio stream parameters with ffprobe.
+
+    Returns None if the file cannot be probed (missing ffprobe, unreadable
+    or corrupt input); callers fall back to their conservative path.
+    """
+    cmd = [
+        FFPROBE,
+        "-v",
+        "error",
+        "-show_entries",
+        "format=format_name,duration:stream=codec_type,codec_name,width,height,"
+        "pix_fmt,r_frame_rate,avg_frame_rate,channels,sample_rate:"
+        "stream_tags=rotate:stream_side_data=rotation",
+        "-of",
+        "json",
+        path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        logger.debug("ffprobe failed for %s: %s", path, exc)
+        return None
+    if proc.returncode != 0:
+        logger.debug("ffprobe failed for %s: %s", path, proc.stderr.strip()[:200])
+        return None
+    try:
+        data = json.loads(proc.stdout or "{}")
+    except ValueError:
+        return None
+
+    fmt = data.get("format", {})
+    info = MediaInfo(
+        format_name=fmt.get("format_name", ""),
+        duration=float(fmt.get("duration") or 0.0),
+    )
+    for stream in data.get("streams", []):
+        kind = stream.get("codec_type")
+        if kind == "video" and info.video_codec is None:
+            info.video_codec = stream.get("codec_name")
+            info.width = int(stream.get("width") or 0)
+            info.height = int(stream.get("height") or 0)
+            info.pix_fmt = stream.get("pix_fmt")
+            info.fps = _rate(stream.get("r_frame_rate"))
+            info.avg_fps = _rate(stream.get("avg_frame_rate"))
+            info.rotation = _rotation(stream)
+        elif kind == "audio" and info.audio_codec is None:
+            info.audio_codec = stream.get("codec_name")
+            info.audio_channels = int(stream.get("channels") or 0)
+            info.audio_sample_rate = int(stream.get("sample_rate") or 0)
+    return info
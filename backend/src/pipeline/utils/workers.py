@@ -0,0 +1,148 @@
+import contextvars
+import logging
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Tuple, TypeVar
+
+from config import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on POSIX
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# How often a caller waiting for CPU slots retries
+SLOT_POLL_SECONDS = 0.1
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (honours affinity masks / cpusets)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):
+        return max(1, os.cpu_count() or 1)
+
+
+def cpu_share() -> int:
+    """CPUs allotted to one Celery task: an equal share of the host."""
+    return max(1, available_cpus() // max(1, settings.WORKER_CONCURRENCY))
+
+
+def pool_size(tasks: int, limit: int = 0) -> int:
+    """
+    Size a per-task worker pool.
+
+    Defaults to the task's ``cpu_share()``, capped by ``limit`` when it is
+    set and never more than the number of items to process.
+    """
+    if tasks <= 1:
+        return 1
+    size = limit if limit > 0 else cpu_share()
+    return max(1, min(tasks, size))
+
+
+def split_threads(tasks: int, threads_per_task: int, limit: int = 0) -> Tuple[int, int]:
+    """
+    Split the task's CPU share between concurrent multi-threaded jobs
+    (e.g. ffmpeg encodes).
+
+    Returns ``(workers, threads)``: how many jobs to run at once and the
+    ``-threads`` value each gets, so ``workers * threads`` stays within
+    ``cpu_share()``.
+    """
+    share = cpu_share()
+    workers = pool_size(tasks, limit or max(1, share // max(1, threads_per_task)))
+    return workers, max(1, share // workers)
+
+
+def carry_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    ``fn`` bound to the calling thread's context variables (e.g. the
+    ``ffmpeg_scope`` of the job), for submitting to an executor, whose
+    threads do not inherit them.
+    """
+    context = contextvars.copy_context()
+    # A context can only be entered by one thread at a time
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def governor_slots() -> int:
+    """CPU slots shared by every worker process on the host."""
+    return settings.CPU_GOVERNOR_SLOTS or available_cpus()
+
+
+def _slot_dir() -> str:
+    """
+    Directory of the slot lock files. The temp dir default is private to a
+    container, so it only governs workers that all run in one; containers
+    sharing a host mount a common directory as ``CPU_GOVERNOR_DIR``.
+    """
+    path = settings.CPU_GOVERNOR_DIR or os.path.join(tempfile.gettempdir(), "cosmiv-cpu-slots")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _take_slots(directory: str, total: int, want: int) -> List[int]:
+    held: List[int] = []
+    first = random.randrange(total)  # spread callers over the slot files
+    for i in range(total):
+        path = os.path.join(directory, f"slot-{(first + i) % total}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        held.append(fd)
+        if len(held) == want:
+            break
+    return held
+
+
+def _release_slots(held: List[int]) -> None:
+    for fd in held:
+        os.close(fd)  # closing the descriptor drops its lock
+
+
+@contextmanager
+def cpu_slots(want: int, minimum: int = 1) -> Iterator[int]:
+    """
+    Hold ``want`` of the host's CPU slots, or as many as are free but at
+    least ``minimum`` (waiting for those). Yields the number held: the
+    thread count for the work done inside the block (ffmpeg ``-threads``,
+    decoder threads).
+
+    Slots are ``flock``ed files in a host-local directory, shared by every
+    worker process, so concurrent tasks' threads add up to the host's cores
+    instead of each task sizing itself to the whole machine. A process that
+    dies releases its slots with its file descriptors.
+    """
+    total = governor_slots()
+    want = max(1, min(want, total))
+    minimum = max(1, min(minimum, want))
+    if not settings.CPU_GOVERNOR_ENABLED or fcntl is None:
+        yield want
+        return
+
+    directory = _slot_dir()
+    began = time.monotonic()
+    while True:
+        held = _take_slots(directory, total, want)
+        if len(held) >= minimum:
+            break
+        _release_slots(held)
+        time.sleep(SLOT_POLL_SECONDS)
+    waited = time.monotonic() - began
+    if waited >= 1.0:
+        logger.debug("Waited %.1fs for %d/%d CPU slots", waited, len(held), want)
+    try:
+        yield len(held)
+    finally:
+        _release_slots(held)
@@ -0,0 +1,203 @@
+"""
+Constant-time window queries over per-clip feature timelines.
+
+A ``WindowIndex`` is built once per ``ClipFeatures`` from prefix sums,
+block prefix histograms and sparse tables. Afterwards any ``(start, duration)``
+statistic (mean, variance, approximate median, max, loudness) is answered
+without touching the video or iterating over the frames in the window.
+"""
+
+import threading
+import weakref
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from pipeline.feature_store import get_clip_features
+from pipeline.features import ClipFeatures, amplitude_to_db, power_to_db
+
+# Histogram resolution used for the approximate median.
+MEDIAN_BINS = 64
+# Frames per block of the prefix histograms; a query adds the bins of at
+# most two partial blocks to a difference of two block prefixes.
+HIST_BLOCK_FRAMES = 64
+# Granularity of the block series used for temporal-consistency variance.
+BLOCK_SECONDS = 0.5
+
+_indexes: "weakref.WeakKeyDictionary[ClipFeatures, WindowIndex]" = (
+    weakref.WeakKeyDictionary()
+)
+_indexes_lock = threading.Lock()
+
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    out = np.zeros(values.shape[0] + 1, dtype=np.float64)
+    np.cumsum(values, dtype=np.float64, out=out[1:])
+    return out
+
+
+def _sparse_table(values: np.ndarray) -> List[np.ndarray]:
+    table = [values]
+    width = 1
+    while width * 2 <= values.shape[0]:
+        prev = table[-1]
+        table.append(np.maximum(prev[:-width], prev[width:]))
+        width *= 2
+    return table
+
+
+def _range_max(table: List[np.ndarray], lo: int, hi: int) -> float:
+    level = (hi - lo).bit_length() - 1
+    row = table[level]
+    return float(max(row[lo], row[hi - (1 << level)]))
+
+
+class WindowIndex:
+    """O(1) window statistics over one clip's feature arrays."""
+
+    def __init__(
+        self,
+        features: ClipFeatures,
+        median_bins: int = MEDIAN_BINS,
+        block_seconds: float = BLOCK_SECONDS,
+    ) -> None:
+        self.fps = features.fps
+        self.frame_count = features.frame_count
+        self.has_audio = features.has_audio
+
+        motion = features.motion.astype(np.float64)
+        valid = ~np.isnan(motion)
+        clean = np.where(valid, motion, 0.0)
+        self._motion_sum = _prefix(clean)
+        self._motion_sq = _prefix(clean * clean)
+        self._motion_n = _prefix(valid.astype(np.float64))
+        self._motion_max = _sparse_table(np.where(valid, motion, 0.0))
+
+        # Motion bin of every frame (median_bins = no motion value), and
+        # prefix histograms of those bins up to every block boundary.
+        top = float(clean.max()) if valid.any() else 0.0
+        self._median_bins = median_bins
+        self._bin_width = top / median_bins if top > 0 else 1.0
+        bins = np.minimum((clean / self._bin_width).astype(np.int64), median_bins - 1)
+        self._bins = np.where(valid, bins, median_bins).astype(np.min_scalar_type(median_bins))
+        n_full = self.frame_count // HIST_BLOCK_FRAMES
+        codes = np.repeat(np.arange(n_full) * (median_bins + 1), HIST_BLOCK_FRAMES)
+        codes += self._bins[: n_full * HIST_BLOCK_FRAMES]
+        block_counts = np.bincount(codes, minlength=n_full * (median_bins + 1))
+        self._hist = np.zeros((n_full + 1, median_bins), dtype=np.uint32)
+        np.cumsum(
+            block_counts.reshape(n_full, median_bins + 1)[:, :median_bins],
+            axis=0,
+            out=self._hist[1:],
+        )
+
+        # Block means of motion, so per-window variance of sub-window
+        # motion is a difference of two prefix sums.
+        self._block_frames = max(1, int(round(self.fps * block_seconds)))
+        n_blocks = -(-self.frame_count // self._block_frames) if self.frame_count else 0
+        edges = np.arange(n_blocks) * self._block_frames
+        block_sum = np.add.reduceat(clean, edges) if n_blocks else np.zeros(0)
+        block_n = np.add.reduceat(valid.astype(np.float64), edges) if n_blocks else np.zeros(0)
+        block_ok = block_n > 0
+        block_mean = np.where(block_ok, block_sum / np.maximum(block_n, 1.0), 0.0)
+        self._block_sum = _prefix(block_mean)
+        self._block_sq = _prefix(block_mean * block_mean)
+        self._block_n = _prefix(block_ok.astype(np.float64))
+
+        self._power = _prefix(features.audio_power)
+        self._peak = _sparse_table(features.audio_peak.astype(np.float64))
+
+    def _span(self, start: float, duration: float) -> Tuple[int, int]:
+        # Same frame mapping as ClipFeatures.window; the index must not hold a
+        # reference to its features or the weak-keyed cache never releases them.
+        lo = int(max(0.0, start) * self.fps)
+        hi = int(np.ceil(max(0.0, start + duration) * self.fps))
+        lo = min(lo, self.frame_count)
+        hi = min(max(hi, lo + 1), self.frame_count)
+        return lo, hi
+
+    def motion_mean(self, start: float, duration: float) -> float:
+        lo, hi = self._span(start, duration)
+        count = self._motion_n[hi] - self._motion_n[lo]
+        if count <= 0:
+            return 0.0
+        return float((self._motion_sum[hi] - self._motion_sum[lo]) / count)
+
+    def motion_variance(self, start: float, duration: float) -> float:
+        lo, hi = self._span(start, duration)
+        count = self._motion_n[hi] - self._motion_n[lo]
+        if count <= 0:
+            return 0.0
+        mean = (self._motion_sum[hi] - self._motion_sum[lo]) / count
+        return float(max(0.0, (self._motion_sq[hi] - self._motion_sq[lo]) / count - mean * mean))
+
+    def motion_max(self, start: float, duration: float) -> float:
+        lo, hi = self._span(start, duration)
+        if hi <= lo:
+            return 0.0
+        return _range_max(self._motion_max, lo, hi)
+
+    def _bin_counts(self, lo: int, hi: int) -> np.ndarray:
+        """Motion histogram of frames ``[lo, hi)``."""
+        b_lo, b_hi = -(-lo // HIST_BLOCK_FRAMES), hi // HIST_BLOCK_FRAMES
+        if b_lo >= b_hi:  # no whole block inside the window
+            return np.bincount(self._bins[lo:hi], minlength=self._median_bins + 1)[:-1]
+        edges = np.concatenate(
+            (self._bins[lo : b_lo * HIST_BLOCK_FRAMES], self._bins[b_hi * HIST_BLOCK_FRAMES : hi])
+        )
+        counts = np.bincount(edges, minlength=self._median_bins + 1)[:-1]
+        return counts + (self._hist[b_hi].astype(np.int64) - self._hist[b_lo])
+
+    def motion_median(self, start: float, duration: float) -> float:
+        """Approximate median, interpolated inside the histogram bin that holds it."""
+        lo, hi = self._span(start, duration)
+        if hi <= lo:
+            return 0.0
+        counts = self._bin_counts(lo, hi)
+        total = int(counts.sum())
+        if total == 0:
+            return 0.0
+        cumulative = np.cumsum(counts)
+        half = total / 2.0
+        b = int(np.searchsorted(cumulative, half))
+        below = cumulative[b] - counts[b]
+        frac = (half - below) / counts[b] if counts[b] else 0.0
+        return float((b + frac) * self._bin_width)
+
+    def motion_block_stats(self, start: float, duration: float) -> Tuple[float, float, int]:
+        """(mean, variance, count) of the BLOCK_SECONDS motion means inside the window."""
+        lo, hi = self._span(start, duration)
+        b_lo = lo // self._block_frames
+        b_hi = max(b_lo + 1, -(-hi // self._block_frames))
+        b_hi = min(b_hi, self._block_n.shape[0] - 1)
+        count = self._block_n[b_hi] - self._block_n[b_lo]
+        if count <= 0:
+            return 0.0, 0.0, 0
+        mean = (self._block_sum[b_hi] - self._block_sum[b_lo]) / count
+        var = (self._block_sq[b_hi] - self._block_sq[b_lo]) / count - mean * mean
+        return float(mean), float(max(0.0, var)), int(count)
+
+    def volume(self, start: float, duration: float) -> Optional[Tuple[float, float]]:
+        """(mean_volume_db, max_volume_db) for the window, like ffmpeg volumedetect."""
+        if not self.has_audio:
+            return None
+        lo, hi = self._span(start, max(0.1, duration))
+        if hi <= lo:
+            return None
+        mean_power = (self._power[hi] - self._power[lo]) / (hi - lo)
+        return power_to_db(float(mean_power)), amplitude_to_db(_range_max(self._peak, lo, hi))
+
+
+def index_for(features: ClipFeatures) -> WindowIndex:
+    with _indexes_lock:
+        index = _indexes.get(features)
+    if index is None:
+        index = WindowIndex(features)
+        with _indexes_lock:
+            _indexes[features] = index
+    return index
+
+
+def get_window_index(video_path: str) -> WindowIndex:
+    """Return the window index for ``video_path``, building it once per feature set."""
+    return index_for(get_clip_features(video_path))
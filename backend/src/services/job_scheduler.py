@@ -0,0 +1,223 @@
+"""
+Cost-aware admission and lane routing for render jobs.
+
+A job's cost is predicted before it is enqueued from its probed input
+duration, its output (target duration x variant count) and the processing
+rate of recent successful jobs. Jobs are routed by plan and size into
+priority lanes, one Celery queue each, which workers poll in lane order.
+Admission enforces a per-user cap on active jobs (by plan) and rejects new
+jobs whose predicted queue wait exceeds ``SCHEDULER_MAX_WAIT_SECONDS``;
+rejections carry a retry-after. The job row is inserted before it is
+admitted and only the jobs ahead of it are counted, so of two concurrent
+submissions the later one sees the earlier. The same backlog arithmetic
+gives the ETA reported by the job status endpoint.
+"""
+
+import logging
+import math
+import statistics
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+from sqlmodel import Session, select
+
+from config import settings
+from models import Entitlement, Job, JobStatus
+from pipeline.utils.probe import probe_media
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first; workers poll the queues in this order
+LANES = ("priority", "standard", "bulk")
+PAID_PLANS = ("pro", "creator")
+
+ACTIVE_STATUSES = (JobStatus.PENDING, JobStatus.PROCESSING, JobStatus.RETRYING)
+
+# Work units of one job: seconds of input decoded and analysed, plus seconds
+# of output encoded (per variant), which cost this much more each
+OUTPUT_SECONDS_WEIGHT = 4.0
+JOB_OVERHEAD_SECONDS = 10.0
+HISTORY_JOBS = 50  # recent successful jobs the processing rate is learnt from
+MIN_HISTORY_JOBS = 5
+MIN_RETRY_AFTER_SECONDS = 15
+
+
+@dataclass
+class JobEstimate:
+    input_seconds: float
+    variant_count: int
+    estimated_seconds: float
+    lane: str
+
+
+class AdmissionRejected(Exception):
+    """The job cannot be accepted now; try again after ``retry_after`` seconds."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+def _utc(value: datetime) -> datetime:
+    """Aware UTC datetime; naive values (columns stored without a zone) are UTC."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def render_queue(lane: str) -> str:
+    """Celery queue of a lane."""
+    return f"render.{lane}"
+
+
+def user_plan(session: Session, user_id: Optional[str]) -> str:
+    if not user_id:
+        return "free"
+    ent = session.exec(select(Entitlement).where(Entitlement.user_id == user_id)).first()
+    if not ent or (ent.expires_at and _utc(ent.expires_at) < datetime.now(timezone.utc)):
+        return "free"
+    return ent.plan
+
+
+def probe_input_seconds(paths: Sequence[str]) -> float:
+    """Total duration of the uploaded clips; unreadable ones count as zero."""
+    total = 0.0
+    for path in paths:
+        info = probe_media(path)
+        if info is not None:
+            total += max(0.0, info.duration)
+    return total
+
+
+def work_units(input_seconds: float, target_duration: float, variant_count: int) -> float:
+    return input_seconds + OUTPUT_SECONDS_WEIGHT * target_duration * max(1, variant_count)
+
+
+def processing_rate(session: Session) -> float:
+    """Median processing seconds per work unit over recent successful jobs."""
+    jobs = session.exec(
+        select(Job)
+        .where(
+            Job.status == JobStatus.SUCCESS,
+            Job.processing_time_seconds != None,  # noqa: E711 - SQL IS NOT NULL
+            Job.input_seconds != None,  # noqa: E711
+        )
+        .order_by(Job.id.desc())
+        .limit(HISTORY_JOBS)
+    ).all()
+    rates = [
+        job.processing_time_seconds / units
+        for job in jobs
+        if (units := work_units(job.input_seconds, job.target_duration, job.variant_count or 1)) > 0
+    ]
+    if len(rates) < MIN_HISTORY_JOBS:
+        return settings.SCHEDULER_DEFAULT_RATE
+    return statistics.median(rates)
+
+
+def estimate_job(
+    session: Session,
+    input_seconds: float,
+    target_duration: float,
+    variant_count: int,
+    plan: str,
+) -> JobEstimate:
+    """Predicted processing time and lane of a job."""
+    seconds = JOB_OVERHEAD_SECONDS + processing_rate(session) * work_units(
+        input_seconds, target_duration, variant_count
+    )
+    lane = 0 if plan in PAID_PLANS else 1
+    if input_seconds > settings.SCHEDULER_BULK_INPUT_SECONDS:
+        lane += 1  # large uploads yield to small ones of the same tier
+    return JobEstimate(input_seconds, variant_count, round(seconds, 1), LANES[lane])
+
+
+def _remaining_seconds(job: Job, now: datetime) -> float:
+    estimate = job.estimated_seconds or JOB_OVERHEAD_SECONDS
+    if job.status == JobStatus.PENDING or not job.started_at:
+        return estimate
+    return max(0.0, estimate - (now - _utc(job.started_at)).total_seconds())
+
+
+def _capacity() -> int:
+    return max(1, settings.SCHEDULER_RENDER_CAPACITY or settings.WORKER_CONCURRENCY)
+
+
+def _lane_rank(lane: Optional[str]) -> int:
+    return LANES.index(lane) if lane in LANES else LANES.index("standard")
+
+
+def queue_wait_seconds(session: Session, lane: str, before_id: Optional[int] = None) -> float:
+    """
+    Predicted wait before a job in ``lane`` starts: the remaining work of the
+    running jobs and of the queued ones it cannot overtake (higher lanes, and
+    its own lane ahead of ``before_id``), spread over the render capacity.
+    """
+    now = datetime.now(timezone.utc)
+    rank = _lane_rank(lane)
+    ahead = 0.0
+    for job in session.exec(select(Job).where(Job.status.in_(ACTIVE_STATUSES))).all():
+        if job.status == JobStatus.PENDING:
+            job_rank = _lane_rank(job.lane)
+            if job_rank > rank or (job_rank == rank and before_id is not None and job.id >= before_id):
+                continue
+        ahead += _remaining_seconds(job, now)
+    return ahead / _capacity()
+
+
+def _user_limits() -> Dict[str, int]:
+    limits = {}
+    for item in settings.SCHEDULER_USER_CONCURRENCY.split(","):
+        plan, _, limit = item.partition("=")
+        if limit.strip():
+            limits[plan.strip()] = int(limit)
+    return limits
+
+
+def admit(
+    session: Session,
+    user_id: Optional[str],
+    plan: str,
+    estimate: JobEstimate,
+    before_id: Optional[int] = None,
+) -> None:
+    """
+    Raise ``AdmissionRejected`` if the job may not be enqueued now. With
+    ``before_id`` (the id of the job's committed row) only earlier jobs count.
+    """
+    now = datetime.now(timezone.utc)
+    if user_id:
+        limit = _user_limits().get(plan, 1)
+        query = select(Job).where(Job.user_id == user_id, Job.status.in_(ACTIVE_STATUSES))
+        if before_id is not None:
+            query = query.where(Job.id < before_id)
+        active: List[Job] = session.exec(query).all()
+        if len(active) >= limit:
+            # The user's soonest job to finish frees a slot
+            soonest = min(
+                queue_wait_seconds(session, job.lane or "standard", job.id) + _remaining_seconds(job, now)
+                if job.status == JobStatus.PENDING
+                else _remaining_seconds(job, now)
+                for job in active
+            )
+            raise AdmissionRejected(
+                f"{len(active)} jobs already running or queued (limit {limit} on the {plan} plan)",
+                max(MIN_RETRY_AFTER_SECONDS, math.ceil(soonest)),
+            )
+
+    wait = queue_wait_seconds(session, estimate.lane, before_id)
+    if wait > settings.SCHEDULER_MAX_WAIT_SECONDS:
+        logger.info("Rejecting %s-lane job: predicted wait %.0fs", estimate.lane, wait)
+        raise AdmissionRejected(
+            "Render queue is full",
+            max(MIN_RETRY_AFTER_SECONDS, math.ceil(wait - settings.SCHEDULER_MAX_WAIT_SECONDS)),
+        )
+
+
+def eta_seconds(session: Session, job: Job) -> Optional[float]:
+    """Predicted seconds until ``job`` finishes; None once it has."""
+    if job.status not in ACTIVE_STATUSES:
+        return None
+    remaining = _remaining_seconds(job, datetime.now(timezone.utc))
+    if job.status == JobStatus.PENDING:
+        remaining += queue_wait_seconds(session, job.lane or "standard", job.id)
+    return round(remaining, 1)
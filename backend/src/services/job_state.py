@@ -16,6 +16,7 @@ def update_job_state(
     error: Optional[str] = None,
     mark_started: bool = False,
     mark_finished: bool = False,
+    processing_time_seconds: Optional[float] = None,
 ) -> None:
     """Update persisted job metadata with defensive checks."""
     now = datetime.utcnow()
@@ -38,6 +39,8 @@ def update_job_state(
             job.started_at = now
         if mark_finished:
             job.finished_at = now
+        if processing_time_seconds is not None:
+            job.processing_time_seconds = processing_time_seconds
         job.updated_at = now
 
         session.add(job)
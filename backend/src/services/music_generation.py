@@ -4,11 +4,13 @@ Supports multiple backends: MusicGen (Meta), API services, or improved procedura
 """
 
 import os
-import subprocess
 import logging
-import tempfile
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
 from config import settings
+from pipeline.utils.ffmpeg import run_ffmpeg
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +23,11 @@ MUBERT_API_ENABLED = os.getenv("MUBERT_API_ENABLED", "false").lower() == "true"
 MUBERT_API_KEY = os.getenv("MUBERT_API_KEY", "")
 MUBERT_API_URL = os.getenv("MUBERT_API_URL", "https://api.mubert.com/v2")
 
+# Procedural fallback
+PROCEDURAL_SAMPLE_RATE = 44100
+PROCEDURAL_CHUNK_SECONDS = 8.0  # chord changes every chunk
+SINE_AMPLITUDE = 1 / 8  # level of ffmpeg's lavfi sine source the layers were built from
+
 
 class MusicGenerator:
     """Unified music generation interface"""
@@ -72,6 +79,17 @@ class MusicGenerator:
         logger.info("Using improved procedural music generation")
         return MusicGenerator._generate_procedural(duration, output_path, prompt)
 
+    @staticmethod
+    def backend() -> str:
+        """Name of the backend ``generate`` tries first."""
+        if MUSICGEN_ENABLED:
+            return "musicgen"
+        if SUNO_API_ENABLED and SUNO_API_KEY:
+            return "suno"
+        if MUBERT_API_ENABLED and MUBERT_API_KEY:
+            return "mubert"
+        return "procedural"
+
     @staticmethod
     def _build_prompt(
         style: Optional[str], tempo: Optional[str], mood: Optional[str]
@@ -153,7 +171,7 @@ class MusicGenerator:
         torchaudio.save(temp_wav, full_audio, 44100)
 
         # Convert to MP3
-        subprocess.run(
+        run_ffmpeg(
             [
                 "ffmpeg",
                 "-y",
@@ -168,9 +186,7 @@ class MusicGenerator:
                 "-ac",
                 "1",
                 output_path,
-            ],
-            check=True,
-            capture_output=True,
+            ]
         )
         os.remove(temp_wav)
 
@@ -262,14 +278,8 @@ class MusicGenerator:
         return output_path
 
     @staticmethod
-    def _generate_procedural(duration: float, output_path: str, prompt: str) -> str:
-        """
-        Improved procedural music generation using FFmpeg
-        Creates multi-layered, evolving music bed
-        """
-        logger.info(f"Generating procedural music: {prompt} ({duration}s)")
-
-        # Extract style hints from prompt
+    def _procedural_chords(prompt: str) -> List[int]:
+        """Chord roots (Hz) for the prompt's style hints."""
         is_energetic = (
             "energetic" in prompt.lower()
             or "gaming" in prompt.lower()
@@ -277,216 +287,142 @@ class MusicGenerator:
         )
         is_calm = "calm" in prompt.lower() or "slow" in prompt.lower()
 
-        # Determine base frequency and chord progression
         if is_energetic:
             # Minor pentatonic in A: A, C, D, E, G (frequencies)
-            base_freq = 220  # A3
-            chords = [220, 262, 294, 330, 392]  # A, C, D, E, G
-            tempo_divisor = 2  # Faster
-        elif is_calm:
-            base_freq = 165  # E3
-            chords = [165, 196, 220, 262, 294]  # E, G, A, C, D (more mellow)
-            tempo_divisor = 4  # Slower
-        else:
-            base_freq = 220
-            chords = [220, 262, 294, 330, 392]
-            tempo_divisor = 3
-
-        # Create complex filter chain for multi-layered music
-        # Layer 1: Base chord progression (changes every 8 seconds)
-        # Layer 2: Melodic line (sine wave with slow LFO)
-        # Layer 3: Bass line (octave down)
-        # Layer 4: Percussion-like element (short bursts)
-
-        filter_complex = []
-        inputs = []
-
-        # Generate each layer
-        chunk_duration = 8.0
-        num_chunks = int(duration / chunk_duration) + (
-            1 if duration % chunk_duration > 0 else 0
-        )
+            return [220, 262, 294, 330, 392]
+        if is_calm:
+            return [165, 196, 220, 262, 294]  # E, G, A, C, D (more mellow)
+        return [220, 262, 294, 330, 392]
 
-        temp_dir = tempfile.gettempdir()
-        temp_files = []
+    @staticmethod
+    def _synthesize_procedural(
+        duration: float, prompt: str, sample_rate: int = PROCEDURAL_SAMPLE_RATE
+    ) -> np.ndarray:
+        """
+        Render the procedural music bed as mono float32 PCM in [-1, 1].
 
-        for chunk_idx in range(num_chunks):
-            chunk_start = chunk_idx * chunk_duration
-            chunk_dur = min(chunk_duration, duration - chunk_start)
+        Three layers per 8-second chunk, cycling through the chord roots:
+        the root through a 800 Hz lowpass, a vibrato fifth above it, and
+        the octave-down bass through a 200 Hz lowpass. Layers are mixed at
+        equal weight, faded in/out over one second and scaled to 0.2.
+        Each distinct chunk is synthesized once and tiled.
+        """
+        chords = MusicGenerator._procedural_chords(prompt)
+        total = int(round(duration * sample_rate))
+        chunk_len = int(round(PROCEDURAL_CHUNK_SECONDS * sample_rate))
+        out = np.zeros(total, dtype=np.float32)
+        if total <= 0:
+            return out
+
+        rendered: Dict[Tuple[int, int], np.ndarray] = {}
+        for chunk_idx, start in enumerate(range(0, total, chunk_len)):
+            length = min(chunk_len, total - start)
+            chord_freq = chords[chunk_idx % len(chords)]
+            key = (chord_freq, length)
+            if key not in rendered:
+                rendered[key] = _procedural_chunk(chord_freq, length, sample_rate)
+            out[start : start + length] = rendered[key]
+
+        # 1 s linear fade in and out, then the bed level
+        t = np.arange(total, dtype=np.float64) / sample_rate
+        fade_out_end = max(0.0, duration - 1.0) + 1.0
+        gain = np.clip(t, 0.0, 1.0) * np.clip(fade_out_end - t, 0.0, 1.0) * 0.2
+        out *= gain.astype(np.float32)
+        return out
 
-            if chunk_dur <= 0:
-                break
+    @staticmethod
+    def _generate_procedural(duration: float, output_path: str, prompt: str) -> str:
+        """
+        Procedural music generation: multi-layered, evolving music bed.
 
-            # Select chord for this chunk (cycle through)
-            chord_freq = chords[chunk_idx % len(chords)]
+        Synthesized in-process with NumPy and piped to a single ffmpeg
+        encode, so no temporary files are shared between concurrent jobs.
+        """
+        logger.info(f"Generating procedural music: {prompt} ({duration}s)")
 
-            # Layer 1: Chord base
-            temp1 = os.path.join(temp_dir, f"aiditor_layer1_{chunk_idx}.wav")
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-y",
-                    "-f",
-                    "lavfi",
-                    "-i",
-                    f"sine=frequency={chord_freq}:duration={chunk_dur}:sample_rate=44100",
-                    "-af",
-                    "volume=0.12,lowpass=f=800",
-                    temp1,
-                ],
-                check=False,
-            )
-            temp_files.append(temp1)
-
-            # Layer 2: Melodic line (5th above with vibrato)
-            temp2 = os.path.join(temp_dir, f"aiditor_layer2_{chunk_idx}.wav")
-            melodic_freq = chord_freq * 1.5  # Perfect 5th
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-y",
-                    "-f",
-                    "lavfi",
-                    "-i",
-                    f"sine=frequency={melodic_freq}:duration={chunk_dur}:sample_rate=44100",
-                    "-af",
-                    "volume=0.08,vibrato=f=4.5:d=0.3",
-                    temp2,
-                ],
-                check=False,
-            )
-            temp_files.append(temp2)
-
-            # Layer 3: Bass (octave down)
-            temp3 = os.path.join(temp_dir, f"aiditor_layer3_{chunk_idx}.wav")
-            bass_freq = chord_freq / 2
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-y",
-                    "-f",
-                    "lavfi",
-                    "-i",
-                    f"sine=frequency={bass_freq}:duration={chunk_dur}:sample_rate=44100",
-                    "-af",
-                    "volume=0.15,lowpass=f=200",
-                    temp3,
-                ],
-                check=False,
-            )
-            temp_files.append(temp3)
-
-        # Concatenate all chunks for each layer
-        concat_files = {}
-        for layer in [1, 2, 3]:
-            concat_list = os.path.join(temp_dir, f"aiditor_concat_layer{layer}.txt")
-            with open(concat_list, "w") as f:
-                for chunk_idx in range(num_chunks):
-                    temp = os.path.join(
-                        temp_dir, f"aiditor_layer{layer}_{chunk_idx}.wav"
-                    )
-                    if os.path.exists(temp):
-                        # Normalize path for concat file
-                        normalized_path = (
-                            temp.replace("\\", "/") if os.name == "nt" else temp
-                        )
-                        f.write(f"file '{normalized_path}'\n")
-
-            concat_out = os.path.join(temp_dir, f"aiditor_layer{layer}_full.wav")
-            if os.path.exists(concat_list):
-                subprocess.run(
-                    [
-                        "ffmpeg",
-                        "-y",
-                        "-f",
-                        "concat",
-                        "-safe",
-                        "0",
-                        "-i",
-                        concat_list,
-                        "-acodec",
-                        "pcm_s16le",
-                        concat_out,
-                    ],
-                    check=False,
-                    capture_output=True,
-                )
-                if os.path.exists(concat_out):
-                    concat_files[layer] = concat_out
-
-        # Mix all layers together
-        filter_parts = []
-        input_count = 0
-
-        for layer, file_path in concat_files.items():
-            inputs.extend(["-i", file_path])
-            filter_parts.append(f"[{input_count}:a]volume=1.0[a{input_count}]")
-            input_count += 1
-
-        if len(filter_parts) > 1:
-            # Mix layers with volume balancing
-            mix_inputs = "".join([f"[a{i}]" for i in range(len(filter_parts))])
-            filter_complex_str = (
-                ";".join(filter_parts)
-                + f";{mix_inputs}amix=inputs={len(filter_parts)}:duration=longest:dropout_transition=0[out]"
-            )
-        else:
-            filter_complex_str = filter_parts[0] + "[out]"
+        pcm = MusicGenerator._synthesize_procedural(duration, prompt)
+        samples = (np.clip(pcm, -1.0, 1.0) * 32767.0).astype("<i2")
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "s16le",
+            "-ar",
+            str(PROCEDURAL_SAMPLE_RATE),
+            "-ac",
+            "1",
+            "-i",
+            "pipe:0",
+            "-acodec",
+            "libmp3lame",
+            "-b:a",
+            "128k",
+            "-t",
+            str(duration),
+            output_path,
+        ]
+        run_ffmpeg(cmd, input=samples.tobytes())
 
-        # Add fade in/out and normalize
-        filter_complex_str += (
-            ";[out]afade=t=in:st=0:d=1,afade=t=out:st={}:d=1,volume=0.2[final]".format(
-                max(0, duration - 1)
-            )
-        )
+        logger.info(f"Procedural music generation complete: {output_path}")
+        return output_path
 
-        # Final mix
-        cmd = (
-            [
-                "ffmpeg",
-                "-y",
-            ]
-            + inputs
-            + [
-                "-filter_complex",
-                filter_complex_str,
-                "-map",
-                "[final]",
-                "-ar",
-                "44100",
-                "-ac",
-                "1",
-                "-acodec",
-                "libmp3lame",
-                "-b:a",
-                "128k",
-                "-t",
-                str(duration),
-                output_path,
-            ]
-        )
 
-        subprocess.run(cmd, check=True, capture_output=True)
+def _lowpass_response(freq: float, cutoff: float, sample_rate: int, q: float = 0.707) -> complex:
+    """Complex response at ``freq`` of ffmpeg's default 2-pole ``lowpass`` biquad."""
+    w0 = 2 * np.pi * cutoff / sample_rate
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    b = np.array([(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2])
+    a = np.array([1 + alpha, -2 * cos_w0, 1 - alpha])
+    z = np.exp(-1j * 2 * np.pi * freq / sample_rate * np.arange(3))
+    return complex(np.dot(b, z) / np.dot(a, z))
 
-        # Cleanup temp files
-        cleanup_files = temp_files + list(concat_files.values())
-        for layer in [1, 2, 3]:
-            cleanup_files.append(
-                os.path.join(temp_dir, f"aiditor_concat_layer{layer}.txt")
-            )
 
-        for temp_file in cleanup_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            except:
-                pass
+def _filtered_sine(freq: float, t: np.ndarray, level: float, cutoff: float, sample_rate: int) -> np.ndarray:
+    """Steady-state output of ``sine`` -> ``volume=level`` -> ``lowpass=f=cutoff``."""
+    response = _lowpass_response(freq, cutoff, sample_rate)
+    return np.sin(2 * np.pi * freq * t + np.angle(response)) * (level * abs(response))
 
-        logger.info(f"Procedural music generation complete: {output_path}")
-        return output_path
+
+def _procedural_chunk(chord_freq: float, length: int, sample_rate: int) -> np.ndarray:
+    """One chunk of the three-layer mix (before fades), matching the old lavfi chain."""
+    n = np.arange(length, dtype=np.float64)
+    t = n / sample_rate
+
+    # Layer 1: chord root, volume=0.12 + lowpass=f=800
+    chord = _filtered_sine(chord_freq, t, 0.12, 800, sample_rate)
+
+    # Layer 2: fifth above with vibrato=f=4.5:d=0.3, i.e. a delay line of
+    # 5 ms read at a sinusoidally modulated offset (silent until it fills)
+    melodic_freq = chord_freq * 1.5
+    buf_size = int(round(sample_rate * 0.005))
+    period = int(round(sample_rate / 4.5))
+    wave = (np.sin(2 * np.pi * (n % period) / period + 1.5 * np.pi) + 1) / 2
+    delay = buf_size + 1 - 0.3 * (buf_size - 1) * wave
+    melodic = np.sin(2 * np.pi * melodic_freq * (t - delay / sample_rate)) * 0.08
+    melodic[n < delay] = 0.0
+
+    # Layer 3: octave-down bass, volume=0.15 + lowpass=f=200
+    bass = _filtered_sine(chord_freq / 2, t, 0.15, 200, sample_rate)
+
+    # lavfi sine sources have amplitude 1/8; amix of three inputs scales by 1/3
+    return ((chord + melodic + bass) * (SINE_AMPLITUDE / 3)).astype(np.float32)
 
 
 # Backward compatibility wrapper
+def music_params(freq: int = 220, style: Optional[str] = None) -> Tuple[str, str, str]:
+    """(style, tempo, mood) that ``generate_music_bed`` passes to the generator."""
+    # Map old freq parameter to style if needed
+    if not style:
+        if freq > 300:
+            style = "energetic"
+        elif freq < 180:
+            style = "calm"
+        else:
+            style = "gaming"
+    return style, "medium", "energetic" if "energetic" in style else "balanced"
+
+
 def generate_music_bed(
     duration: float, output_path: str, freq: int = 220, style: Optional[str] = None
 ) -> str:
@@ -499,19 +435,11 @@ def generate_music_bed(
         freq: Frequency hint (deprecated, use style instead)
         style: Music style (e.g., "electronic", "gaming", "cinematic")
     """
-    # Map old freq parameter to style if needed
-    if not style:
-        if freq > 300:
-            style = "energetic"
-        elif freq < 180:
-            style = "calm"
-        else:
-            style = "gaming"
-
+    style, tempo, mood = music_params(freq, style)
     return MusicGenerator.generate(
         duration=duration,
         output_path=output_path,
         style=style,
-        tempo="medium",
-        mood="energetic" if "energetic" in style else "balanced",
+        tempo=tempo,
+        mood=mood,
     )
@@ -1,16 +1,37 @@
-from typing import Dict, List
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from pipeline.audio_cache import AUDIO_SAMPLE_RATE, pcm_slice
 
 PROFANITY_WORDS = {"damn", "shit", "fuck"}
 
 
-def transcribe_audio(video_path: str) -> Dict:
-    # Stub: pretend we detected some words at times
+def transcribe_samples(
+    load_samples: Callable[[], Optional[np.ndarray]],
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    offset: float = 0.0,
+) -> Dict:
+    # Stub: pretend we detected some words at times. A real model calls
+    # ``load_samples()`` for the mono float32 PCM, which decodes (or hashes
+    # and maps) the clip only then; word times are shifted by ``offset``.
     words = [
-        {"word": "nice", "start": 1.0, "end": 1.3},
-        {"word": "shot", "start": 1.3, "end": 1.7},
-        {"word": "damn", "start": 2.0, "end": 2.4},
+        {"word": w, "start": start + offset, "end": end + offset}
+        for w, start, end in (("nice", 1.0, 1.3), ("shot", 1.3, 1.7), ("damn", 2.0, 2.4))
     ]
     profanity_spans: List[Dict] = [
         w for w in words if w["word"].lower() in PROFANITY_WORDS
     ]
     return {"words": words, "profanity": profanity_spans}
+
+
+def transcribe_audio(video_path: str) -> Dict:
+    # Zero-copy view of the shared PCM cache, loaded if the model needs it
+    return transcribe_samples(partial(pcm_slice, video_path, sample_rate=AUDIO_SAMPLE_RATE))
+
+
+def transcribe_window(video_path: str, start: float, duration: float) -> Dict:
+    # Only ``[start, start + duration)`` is transcribed; word times are in clip time
+    load_samples = partial(pcm_slice, video_path, start, duration, sample_rate=AUDIO_SAMPLE_RATE)
+    return transcribe_samples(load_samples, AUDIO_SAMPLE_RATE, offset=start)
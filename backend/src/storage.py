@@ -5,10 +5,12 @@ from uuid import uuid4
 STORAGE_ROOT = os.getenv("STORAGE_ROOT", "/app/storage")
 UPLOADS_DIR = os.path.join(STORAGE_ROOT, "uploads")
 EXPORTS_DIR = os.path.join(STORAGE_ROOT, "exports")
+CACHE_DIR = os.path.join(STORAGE_ROOT, "cache")
 
 # Cache for fallback directories
 _fallback_uploads_dir = None
 _fallback_exports_dir = None
+_fallback_cache_dir = None
 
 
 def _get_uploads_dir():
@@ -59,6 +61,23 @@ def _get_exports_dir():
         return _fallback_exports_dir
 
 
+def _get_cache_dir():
+    """Get derived-artifact cache directory, with fallback to temp if needed."""
+    global _fallback_cache_dir
+    if _fallback_cache_dir:
+        return _fallback_cache_dir
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        if not os.access(CACHE_DIR, os.W_OK):
+            raise PermissionError(CACHE_DIR)
+        return CACHE_DIR
+    except (PermissionError, OSError):
+        _fallback_cache_dir = os.path.join(tempfile.gettempdir(), "cosmiv_cache")
+        os.makedirs(_fallback_cache_dir, exist_ok=True)
+        return _fallback_cache_dir
+
+
 # Try to create directories at import time, but don't fail if we can't
 try:
     os.makedirs(UPLOADS_DIR, exist_ok=True)
@@ -122,3 +141,16 @@ def job_export_dir(job_id: str) -> str:
     
     os.makedirs(validated_path, exist_ok=True)
     return validated_path
+
+
+def job_cancel_marker(job_id: str) -> str:
+    """File whose existence asks the worker running the job to cancel it."""
+    return os.path.join(job_export_dir(job_id), "CANCELLED")
+
+
+def cache_dir(kind: str) -> str:
+    """Get or create a cache subdirectory (e.g. "audio", "features")."""
+    base_dir = _get_cache_dir()
+    path = _validate_path_within_base(os.path.join(base_dir, kind), base_dir)
+    os.makedirs(path, exist_ok=True)
+    return path
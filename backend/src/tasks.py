@@ -1,10 +1,14 @@
 import json
 import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
 from datetime import datetime
-from typing import List, Tuple, Dict, Any, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from celery import Celery
+from celery import Celery, chord
 from db import get_session
 from models import (
     Job,
@@ -17,26 +21,48 @@ from models import (
     SocialConnection,
     SocialPost,
 )
-from storage import job_upload_dir, job_export_dir
+from storage import job_cancel_marker, job_upload_dir, job_export_dir
 from sqlmodel import select
 
 from config import settings
-from pipeline.preprocess import preprocess_clips
+from pipeline.feature_store import get_clip_features
+from pipeline.preprocess import normalize_clip, preprocess_clips, preprocessed_paths
 from pipeline.highlight_detection import (
     detect_scenes_seconds,
     fused_score,
-    motion_score,
     SceneSlice,
     get_highlight_detector,
 )
-from pipeline.editing import write_ffconcat, render_with_fallback
+from pipeline.editing import (
+    Finishing,
+    encode_segment,
+    render_variants,
+    segment_encodes,
+    write_ffconcat,
+)
+from pipeline.selection import EventIndex, select_highlights
 from pipeline.music import generate_music_bed
-from pipeline.censor import build_profanity_mute_filters, build_censor_filter_chain
-from pipeline.utils.ffmpeg import FFmpegExecutionError, run_ffmpeg
+from pipeline.censor import (
+    REDACTION_PAD_SECONDS,
+    build_censor_filter_chain,
+    build_redaction_filter,
+    profanity_on_timeline,
+)
+from pipeline.checkpoints import StageManifest, file_signature
+from pipeline.stage_graph import StageContext, StageGraph
+from pipeline.transcripts import TRANSCRIPT_CACHE_VERSION, profanity_in_slices
+from pipeline.utils.ffmpeg import (
+    FFmpegCancelledError,
+    FFmpegExecutionError,
+    cancel_job,
+    ffmpeg_scope,
+)
+from pipeline.utils.workers import cpu_share
 from services.clip_discovery import mock_fetch_recent_clips, MOCK_PROVIDERS
+from services.job_scheduler import estimate_job, probe_input_seconds, render_queue
 from services.job_state import update_job_state
 from services.storage_adapters import get_storage
-from services.stt.whisper_stub import transcribe_audio
+from worker_profiles import SHARD_QUEUE, configure_celery
 
 try:
     from ml.highlights.model import get_model
@@ -75,6 +101,9 @@ celery_app = Celery(
     backend=CELERY_RESULT_BACKEND,
 )
 
+# Queues per workload class, and the pool/prefetch of this worker's profile
+configure_celery(celery_app, settings.WORKER_PROFILE)
+
 # Beat schedule: periodic tasks
 celery_app.conf.beat_schedule = {
     "sync-user-clips-every-30m": {
@@ -94,6 +123,10 @@ celery_app.conf.beat_schedule = {
         "task": "learn_frontend_patterns",
         "schedule": 86400.0,  # Every 24 hours (daily at 2 AM UTC)
     },
+    "warm-music-library-daily": {
+        "task": "warm_music_library",
+        "schedule": 86400.0,  # Every 24 hours; renders only missing beds
+    },
 }
 
 
@@ -105,25 +138,81 @@ class RetryableRenderError(Exception):
     """Raised for transient errors that should trigger a Celery retry."""
 
 
-TRANSIENT_ERROR_KEYWORDS = (
-    "resource temporarily unavailable",
-    "server returned 5",
-    "timed out",
-    "i/o error",
-    "connection reset",
-    "connection refused",
-    "temporarily unavailable",
-)
+class RenderSharded(Exception):
+    """A stage's work goes to shard tasks (``header``); the job resumes in their chord callback."""
+
+    def __init__(self, stage: str, header: list) -> None:
+        super().__init__(stage)
+        self.stage = stage
+        self.header = header
 
 
 def _classify_ffmpeg_error(exc: FFmpegExecutionError) -> Exception:
-    stderr = (exc.stderr or "").lower()
-    if any(keyword in stderr for keyword in TRANSIENT_ERROR_KEYWORDS):
+    if exc.transient:
         return RetryableRenderError(str(exc))
     return RenderPipelineError(str(exc))
 
 
+# How often a running job checks for its cancel marker
+CANCEL_POLL_SECONDS = 1.0
+
+
+@contextmanager
+def _job_scope(job_id: str) -> Iterator[None]:
+    """
+    ffmpeg scope of a render job, cancelled once the API drops the job's
+    cancel marker (tasks run in pool processes, beyond control commands).
+    """
+    marker = job_cancel_marker(job_id)
+    done = threading.Event()
+
+    def watch() -> None:
+        while not done.wait(CANCEL_POLL_SECONDS):
+            if os.path.exists(marker):
+                cancel_job(job_id)
+                return
+
+    with ffmpeg_scope(job_id):
+        if os.path.exists(marker):
+            cancel_job(job_id)
+        watcher = threading.Thread(target=watch, name=f"cancel-{job_id}", daemon=True)
+        watcher.start()
+        try:
+            yield
+        finally:
+            done.set()
+            watcher.join()
+
+
 VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".webm", ".avi", ".m4v")
+RENDER_VARIANTS = ("landscape", "portrait")
+
+
+# Render cache stand-in for a pending mute chain: the chain is derived from
+# the clips (already keyed), the STT engine and the redaction padding
+REDACTION_KEY = f"stt-v{TRANSCRIPT_CACHE_VERSION}:pad={REDACTION_PAD_SECONDS}"
+
+
+def _redaction_chain(clips: List[Tuple[str, float, float]]) -> str:
+    """Mute filter for profanity in the ``clips`` windows, on the rendered timeline."""
+    return build_redaction_filter(profanity_on_timeline(clips, profanity_in_slices(clips)))
+
+
+def _stage_graph() -> Tuple[StageGraph, int]:
+    """Stage executor sized to this task's CPU share, and the cost of a heavy stage."""
+    budget = cpu_share()
+    # Heavy stages leave a slot for the light ones (music, STT) beside them
+    return StageGraph(budget), max(1, budget - 1)
+
+
+def _record_stage_timings(job_id: str, manifest: StageManifest, graph: StageGraph) -> None:
+    timings = {name: asdict(timing) for name, timing in graph.timings.items()}
+    manifest.record_timings(timings)
+    logger.info(
+        "Stage timings: %s",
+        ", ".join(f"{name} {t['seconds']:.1f}s" for name, t in timings.items()),
+        extra={"job_id": job_id, "stage": "timings"},
+    )
 
 
 def _list_uploaded_clips(upload_dir: str) -> List[str]:
@@ -227,76 +316,41 @@ def sync_user_clips(user_id: str):
         )
 
 
-def _mux_with_music(
-    video_path: str, music_path: str, output_path: str, mute_chain: str
-) -> None:
-    filters = []
-    if mute_chain and mute_chain != "anull":
-        filters.append(f"[0:a]{mute_chain}[a_clean]")
-        voice_src = "[a_clean]"
-    else:
-        voice_src = "[0:a]"
-    filters.append(f"{voice_src}volume=1.0[a0]")
-    filters.append("[1:a]volume=0.2[a1]")
-    filters.append("[a0][a1]amix=inputs=2:duration=shortest[aout]")
-
-    filter_complex_parts = [";".join(filters)]
-    video_map = "0:v"
-    video_codec_args = ["-c:v", "copy"]
-
-    if settings.WATERMARK_TEXT:
-        escaped = settings.WATERMARK_TEXT.replace("'", "\\'").replace(":", "\\:")
-        filter_complex_parts.append(
-            f"[0:v]drawtext=text='{escaped}':fontcolor=white:fontsize=24:x=w-tw-20:y=h-th-20:alpha=0.5[vout]"
-        )
-        video_map = "[vout]"
-        video_codec_args = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20"]
-
-    filter_complex = ";".join(filter_complex_parts)
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i",
-        video_path,
-        "-i",
-        music_path,
-        "-filter_complex",
-        filter_complex,
-        "-map",
-        video_map,
-        "-map",
-        "[aout]",
-        *video_codec_args,
-        "-c:a",
-        "aac",
-        "-b:a",
-        "192k",
-        "-shortest",
-        output_path,
-    ]
-    run_ffmpeg(cmd)
-
-
 @celery_app.task(
     bind=True,
     name="render_job",
+    acks_late=True,
     autoretry_for=(RetryableRenderError,),
     retry_backoff=True,
     retry_backoff_max=600,
     retry_jitter=True,
     retry_kwargs={"max_retries": 3},
 )
-def render_job(self, job_id: str, target_duration: int):
+def render_job(
+    self,
+    job_id: str,
+    target_duration: int,
+    sharded: Sequence[str] = (),
+    started: Optional[float] = None,
+):
+    """
+    Render a job on this worker. A large job fans its per-clip preprocessing
+    and its segment encodes out to shard tasks on other workers (see
+    ``_dispatch_shards``); the job then resumes here, in the chord callback
+    (``sharded`` lists the stages already fanned out), from the checkpoints
+    and the shards' files in shared storage.
+    """
     export_dir = job_export_dir(job_id)
     upload_dir = job_upload_dir(job_id)
 
     logger.info("Render job %s started (attempt %s)", job_id, self.request.retries + 1)
+    started = started or time.time()
     max_attempts = (getattr(self, "max_retries", 3) or 3) + 1
     update_job_state(
         job_id,
         status=JobStatus.PROCESSING,
         stage="preparing",
-        progress=5,
+        progress=None if sharded else 5,
         mark_started=True,
     )
 
@@ -304,60 +358,113 @@ def render_job(self, job_id: str, target_duration: int):
     if not video_files:
         raise RenderPipelineError("No uploaded clips found for job")
 
-    try:
-        update_job_state(job_id, stage="preprocessing", progress=15)
-        preprocessed = preprocess_clips(video_files, export_dir)
-
-        update_job_state(job_id, stage="analysis", progress=35)
-        detector = get_highlight_detector()
-        slices: List[SceneSlice] = detector.detect(preprocessed, target_duration)
-        if not slices:
-            raise RenderPipelineError("Highlight detector returned no slices")
+    # Stages completed by an earlier attempt are reused, so a retry only
+    # pays for the stage that failed
+    manifest = StageManifest(export_dir)
+    graph, heavy = _stage_graph()
 
-        selected = [(s.video_path, s.start, s.duration) for s in slices]
-        total_duration = sum(s.duration for s in slices)
-
-        update_job_state(job_id, stage="rendering", progress=55)
-        concat_path = os.path.join(export_dir, "concat.txt")
-        write_ffconcat(concat_path, selected)
-
-        variants = ["landscape", "portrait"]
-        video_outputs = {}
-        for idx, variant in enumerate(variants):
-            update_job_state(
-                job_id, stage=f"rendering:{variant}", progress=60 + idx * 5
-            )
-            out_path = os.path.join(export_dir, f"video_{variant}.mp4")
+    def shard(stage: str, threshold: int, count: int, header: Callable[[], list]) -> None:
+        """Hand ``stage``'s work to shard tasks if the job is large enough."""
+        if stage in sharded or not 0 < threshold <= count:
+            return
+        shards = header()
+        if shards:
+            raise RenderSharded(stage, shards)
+
+    def preprocessing(ctx: StageContext) -> List[str]:
+        inputs = [file_signature(f) for f in video_files]
+        done = manifest.get("preprocessing", inputs)
+        if done is None:
+            clips = preprocessed_paths(video_files, export_dir)
+            if "preprocessing" in sharded and all(os.path.exists(c) for c in clips):
+                done = {"clips": clips}  # written by the prepare_clip shards
+            else:
+                shard(
+                    "preprocessing",
+                    settings.RENDER_SHARD_MIN_CLIPS,
+                    len(video_files),
+                    lambda: [prepare_clip.si(job_id, f, c) for f, c in zip(video_files, clips)],
+                )
+                done = {"clips": preprocess_clips(video_files, export_dir)}
+            manifest.complete("preprocessing", inputs, done, files=done["clips"])
+        return done["clips"]
+
+    def analysis(ctx: StageContext) -> List[Tuple[str, float, float]]:
+        preprocessed = ctx.result("preprocessing")
+        inputs = [[file_signature(p) for p in preprocessed], target_duration]
+        done = manifest.get("analysis", inputs)
+        if done is None:
+            detector = get_highlight_detector()
+            slices: List[SceneSlice] = detector.detect(preprocessed, target_duration)
+            if not slices:
+                raise RenderPipelineError("Highlight detector returned no slices")
+            done = {"slices": [(s.video_path, s.start, s.duration) for s in slices]}
+            manifest.complete("analysis", inputs, done)
+        return [tuple(s) for s in done["slices"]]
+
+    def music(ctx: StageContext) -> str:
+        total_duration = sum(dur for _, _, dur in ctx.result("analysis"))
+        music_path = os.path.join(export_dir, "music.wav")
+        inputs = [total_duration or target_duration]
+        if manifest.get("music", inputs) is None:
             try:
-                render_with_fallback(concat_path, out_path, preset=variant)
+                generate_music_bed(total_duration or target_duration, music_path, freq=220)
+            except FFmpegCancelledError:
+                raise
             except FFmpegExecutionError as exc:
                 raise _classify_ffmpeg_error(exc)
-            video_outputs[variant] = out_path
-
-        update_job_state(job_id, stage="music", progress=75)
-        music_path = os.path.join(export_dir, "music.mp3")
-        try:
-            generate_music_bed(total_duration or target_duration, music_path, freq=220)
-        except FFmpegExecutionError as exc:
-            raise _classify_ffmpeg_error(exc)
-
-        transcript = transcribe_audio(preprocessed[0])
-        mute_chain = build_profanity_mute_filters(transcript.get("profanity", []))
-
-        update_job_state(job_id, stage="mixdown", progress=85)
-        final_outputs = {}
-        for variant, video_path in video_outputs.items():
-            final_path = os.path.join(export_dir, f"final_{variant}.mp4")
+            manifest.complete("music", inputs, {}, files=[music_path])
+        return music_path
+
+    def transcription(ctx: StageContext) -> str:
+        return _redaction_chain(ctx.result("analysis"))
+
+    def rendering(ctx: StageContext) -> Dict[str, str]:
+        selected = ctx.result("analysis")
+        music_path = ctx.result("music")
+        variants = list(RENDER_VARIANTS)
+        inputs = [selected, variants, file_signature(music_path), REDACTION_KEY, settings.WATERMARK_TEXT]
+        done = manifest.get("rendering", inputs)
+        if done is None:
+            concat_path = os.path.join(export_dir, "concat.txt")
+            write_ffconcat(concat_path, selected)
+            # The transcription stage runs while the video encodes; only the
+            # audio encode waits for the mute chain
+            finishing = Finishing(
+                music_path,
+                watermark=settings.WATERMARK_TEXT,
+                pending_mutes=lambda: ctx.result("transcription"),
+                mute_key=REDACTION_KEY,
+            )
+            outputs = {v: os.path.join(export_dir, f"final_{v}.mp4") for v in variants}
+            shard(
+                "rendering",
+                settings.RENDER_SHARD_MIN_SEGMENTS,
+                len(selected),
+                lambda: [
+                    render_segment.si(job_id, *encode)
+                    for encode in segment_encodes(selected, outputs, finishing)
+                ],
+            )
+            timeline = sum(dur for _, _, dur in selected) or 1.0
             try:
-                _mux_with_music(video_path, music_path, final_path, mute_chain)
+                # One decode of the timeline feeds every variant's encode, with
+                # watermark, mute and music mixed into that same encode; the
+                # encoded output time is the stage's progress
+                with ffmpeg_scope(progress=lambda seconds: ctx.progress(seconds / timeline)):
+                    outputs = render_variants(selected, concat_path, outputs, finishing)
+            except FFmpegCancelledError:
+                raise
             except FFmpegExecutionError as exc:
                 raise _classify_ffmpeg_error(exc)
-            final_outputs[variant] = final_path
+            done = {"outputs": outputs}
+            manifest.complete("rendering", inputs, done, files=list(outputs.values()))
+        return done["outputs"]
 
-        update_job_state(job_id, stage="publishing", progress=92)
+    def publishing(ctx: StageContext) -> None:
         storage = get_storage()
         if settings.USE_OBJECT_STORAGE:
-            for variant, path in final_outputs.items():
+            for variant, path in ctx.result("rendering").items():
                 key = f"exports/{job_id}/final_{variant}.mp4"
                 try:
                     storage.upload(path, key)  # type: ignore[attr-defined]
@@ -366,14 +473,56 @@ def render_job(self, job_id: str, target_duration: int):
                         "Upload to object storage failed for %s: %s", path, exc
                     )
 
+    graph.add("preprocessing", preprocessing, cost=heavy, weight=3)
+    graph.add("analysis", analysis, needs=["preprocessing"], cost=heavy, weight=3)
+    graph.add("music", music, needs=["analysis"], weight=1)
+    graph.add("transcription", transcription, needs=["analysis"], weight=1)
+    graph.add("rendering", rendering, needs=["analysis", "music"], cost=heavy, weight=8)
+    graph.add("publishing", publishing, needs=["rendering"], weight=1)
+
+    def report(fraction: float, running: List[str]) -> None:
+        # Called from this thread only, so progress never goes backwards
+        update_job_state(
+            job_id, stage=",".join(running) or "publishing", progress=10 + int(82 * fraction)
+        )
+
+    try:
+        sharding: Optional[RenderSharded] = None
+        try:
+            with _job_scope(job_id):
+                graph.run(report)
+        except RenderSharded as exc:
+            sharding = exc
+        finally:
+            _record_stage_timings(job_id, manifest, graph)
+        if sharding is not None:
+            # Only once this run is over, so the callback never overlaps it
+            update_job_state(job_id, stage=f"{sharding.stage} (sharded)")
+            _dispatch_shards(
+                job_id, target_duration, [*sharded, sharding.stage], started, sharding.header
+            )
+            return
+
         update_job_state(
             job_id,
             status=JobStatus.SUCCESS,
             stage="completed",
             progress=100,
             mark_finished=True,
+            processing_time_seconds=time.time() - started,
         )
 
+    except FFmpegCancelledError as exc:
+        logger.warning("Render job %s cancelled", job_id)
+        update_job_state(
+            job_id,
+            status=JobStatus.FAILED,
+            stage="cancelled",
+            progress=100,
+            error=str(exc),
+            mark_finished=True,
+        )
+        raise
     except (RetryableRenderError, RenderPipelineError) as exc:
         update_job_state(
             job_id,
@@ -386,9 +535,87 @@ def render_job(self, job_id: str, target_duration: int):
         raise
 
 
+def _dispatch_shards(
+    job_id: str, target_duration: int, sharded: List[str], started: float, header: list
+) -> None:
+    """
+    Run ``header`` (shard task signatures) across the render workers, then
+    resume the job with ``render_job``. Shards exchange their files through
+    the job's export directory and the caches in shared storage; their
+    queue is polled before the lanes, so running jobs finish first.
+    """
+    callback = render_job.si(job_id, target_duration, sharded=sharded, started=started)
+    callback.set(queue=SHARD_QUEUE)
+    callback.link_error(render_shards_failed.s(job_id))
+    logger.info(
+        "Sharding %s across %d tasks", sharded[-1], len(header),
+        extra={"job_id": job_id, "stage": sharded[-1]},
+    )
+    chord([sig.set(queue=SHARD_QUEUE) for sig in header])(callback)
+
+
+@celery_app.task(
+    name="prepare_clip",
+    acks_late=True,
+    autoretry_for=(RetryableRenderError,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def prepare_clip(job_id: str, input_path: str, output_path: str) -> str:
+    """Shard of a large job's preprocessing: normalize one upload and extract its features."""
+    if not os.path.exists(output_path):
+        # Renamed into place once complete: the callback trusts existing files
+        partial = f"{os.path.splitext(output_path)[0]}.part.mp4"
+        with _job_scope(job_id):
+            try:
+                normalize_clip(input_path, partial)
+            except FFmpegExecutionError as exc:
+                raise _classify_ffmpeg_error(exc)
+        os.replace(partial, output_path)
+    get_clip_features(output_path)  # into the shared feature store, for the analysis stage
+    return output_path
+
+
+@celery_app.task(
+    name="render_segment",
+    acks_late=True,
+    autoretry_for=(RetryableRenderError,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+)
+def render_segment(
+    job_id: str, clip: List[Any], outputs: Dict[str, str], encoder: str, suffix: str
+) -> None:
+    """Shard of a large job's rendering: one segment for every variant (see ``segment_encodes``)."""
+    with _job_scope(job_id):
+        try:
+            encode_segment(tuple(clip), outputs, encoder, suffix)
+        except FFmpegExecutionError as exc:
+            raise _classify_ffmpeg_error(exc)
+
+
+@celery_app.task(name="render_shards_failed")
+def render_shards_failed(request, exc, traceback, job_id: str) -> None:
+    """Chord errback: a shard failed for good, so the job will not resume."""
+    cancelled = os.path.exists(job_cancel_marker(job_id))
+    logger.error("Shard of job %s failed: %s", job_id, exc, extra={"job_id": job_id, "stage": "shard"})
+    update_job_state(
+        job_id,
+        status=JobStatus.FAILED,
+        stage="cancelled" if cancelled else "failed",
+        progress=100,
+        error=str(exc),
+        mark_finished=True,
+    )
+
+
 # Enhanced render_job with comprehensive error handling
 @celery_app.task(
-    name="render_job_enhanced", bind=True, max_retries=3, default_retry_delay=60
+    name="render_job_enhanced",
+    bind=True,
+    acks_late=True,
+    max_retries=3,
+    default_retry_delay=60,
 )
 def render_job_enhanced(self, job_id: str, target_duration: int):
     """
@@ -412,9 +639,14 @@ def render_job_enhanced(self, job_id: str, target_duration: int):
         session.add(job)
         session.commit()
 
-    try:
-        # Stage 1: Preprocessing (0-20%)
-        update_progress(job_id, 5, "preprocessing", "Collecting uploaded clips...")
+    # Stages completed by an earlier attempt are reused, so a retry only
+    # pays for the stage that failed
+    manifest = StageManifest(export_dir)
+
+    graph, heavy = _stage_graph()
+    variants = ["landscape", "portrait"]
+
+    def preprocessing(ctx: StageContext) -> List[str]:
         video_files: List[str] = []
         for name in os.listdir(upload_dir):
             if name.lower().endswith((".mp4", ".mov", ".mkv", ".webm", ".avi", ".m4v")):
@@ -422,130 +654,99 @@ def render_job_enhanced(self, job_id: str, target_duration: int):
         if not video_files:
             raise NonRetryableException("No uploaded clips found for job")
 
-        update_progress(
-            job_id, 10, "preprocessing", f"Normalizing {len(video_files)} clips..."
-        )
+        inputs = [file_signature(f) for f in sorted(video_files)]
         try:
-            preprocessed = preprocess_clips(video_files, export_dir)
-            update_progress(job_id, 20, "preprocessing", "Preprocessing complete")
+            done = manifest.get("preprocessing", inputs)
+            if done is None:
+                done = {"clips": preprocess_clips(video_files, export_dir)}
+                manifest.complete("preprocessing", inputs, done, files=done["clips"])
+            return done["clips"]
+        except FFmpegCancelledError:
+            raise
         except Exception as e:
             add_error_detail(job_id, "CRITICAL", "preprocessing", str(e))
             raise RetryableException(f"Preprocessing failed: {str(e)}") from e
 
-        # Stage 2: Scene Detection (20-40%)
-        update_progress(job_id, 25, "scene_detection", "Analyzing scenes...")
-        candidates: List[Tuple[str, float, float, float]] = (
-            []
-        )  # (path, start, dur, score)
-        try:
-            if settings.USE_HIGHLIGHT_MODEL and get_model:
-                model = get_model()
-                for vp in preprocessed:
-                    events = model.detect_events(vp)
-                    # Boost scenes near detected events
-                    scenes = detect_scenes_seconds(vp)
-                    for s, e in scenes:
-                        dur = max(0.5, e - s)
-                        # Use fused_score for better detection
-                        fused = fused_score(vp, s, min(dur, 10.0))
-                        score = fused.get("total", motion_score(vp, s, min(dur, 10.0)))
-                        proximity_boost = 0.0
-                        for ev in events:
-                            if abs(ev["time"] - (s + dur / 2)) < 3.0:
-                                proximity_boost = max(
-                                    proximity_boost, ev["confidence"] * 10.0
-                                )
-                        score += proximity_boost
-                        candidates.append((vp, s, dur, score))
-            else:
+    def selection(ctx: StageContext) -> List[Tuple[str, float, float]]:
+        preprocessed = ctx.result("preprocessing")
+        inputs = [[file_signature(p) for p in preprocessed], target_duration]
+        done = manifest.get("selection", inputs)
+        if done is None:
+            detection_ok = True
+            # Scene detection
+            candidates: List[Tuple[str, float, float, float]] = (
+                []
+            )  # (path, start, dur, score)
+            try:
+                if settings.USE_HIGHLIGHT_MODEL and get_model:
+                    model = get_model()
+                    for vp in preprocessed:
+                        events = EventIndex(model.detect_events(vp))
+                        # Boost scenes near detected events
+                        scenes = detect_scenes_seconds(vp)
+                        for s, e in scenes:
+                            dur = max(0.5, e - s)
+                            # Use fused_score for better detection (O(1) window lookups)
+                            score = fused_score(vp, s, min(dur, 10.0))["fused_score"]
+                            score += (
+                                events.max_confidence(s + dur / 2, 3.0, inclusive=False) * 10.0
+                            )
+                            candidates.append((vp, s, dur, score))
+                else:
+                    for vp in preprocessed:
+                        scenes = detect_scenes_seconds(vp)
+                        for s, e in scenes:
+                            dur = max(0.5, e - s)
+                            # Use enhanced fused_score for better detection (O(1) window lookups)
+                            score = fused_score(vp, s, min(dur, 10.0))["fused_score"]
+                            candidates.append((vp, s, dur, score))
+                logger.info(
+                    f"Found {len(candidates)} candidate scenes",
+                    extra={"job_id": job_id, "stage": "scene_detection"},
+                )
+            except Exception as e:
+                add_error_detail(
+                    job_id, "WARNING", "scene_detection", f"Scene detection issue: {str(e)}"
+                )
+                logger.warning(
+                    f"Scene detection failed, using fallback: {str(e)}",
+                    extra={"job_id": job_id, "stage": "scene_detection"},
+                )
+                # Fallback to simple motion scoring
+                detection_ok = False
                 for vp in preprocessed:
-                    scenes = detect_scenes_seconds(vp)
-                    for s, e in scenes:
-                        dur = max(0.5, e - s)
-                        # Use enhanced fused_score for better detection
-                        fused = fused_score(vp, s, min(dur, 10.0))
-                        score = fused.get("total", motion_score(vp, s, min(dur, 10.0)))
-                        candidates.append((vp, s, dur, score))
-            update_progress(
-                job_id,
-                40,
-                "scene_detection",
-                f"Found {len(candidates)} candidate scenes",
-            )
-        except Exception as e:
-            add_error_detail(
-                job_id, "WARNING", "scene_detection", f"Scene detection issue: {str(e)}"
-            )
-            logger.warning(
-                f"Scene detection failed, using fallback: {str(e)}",
-                extra={"job_id": job_id, "stage": "scene_detection"},
-            )
-            # Fallback to simple motion scoring
-            for vp in preprocessed:
-                candidates.append((vp, 0.0, 10.0, 5.0))
-
-        # Stage 3: Selection (40-50%)
-        update_progress(job_id, 45, "selection", "Selecting best highlights...")
-        candidates.sort(key=lambda x: x[3], reverse=True)
-        selected: List[Tuple[str, float, float]] = []
-        total = 0.0
-        for vp, s, dur, score in candidates:
-            if total >= target_duration:
-                break
-            take = min(dur, max(1.0, min(4.0, target_duration - total)))
-            selected.append((vp, s, take))
-            total += take
-
-        if not selected:
-            # Fallback: take from first file
-            add_error_detail(
-                job_id, "WARNING", "selection", "No scenes selected, using fallback"
-            )
-            selected = [(preprocessed[0], 0.0, float(target_duration))]
-        update_progress(
-            job_id,
-            50,
-            "selection",
-            f"Selected {len(selected)} highlights ({total:.1f}s)",
-        )
+                    candidates.append((vp, 0.0, 10.0, 5.0))
 
-        # Stage 4: Rendering (50-80%)
-        update_progress(job_id, 55, "rendering", "Building video sequence...")
-        concat_path = os.path.join(export_dir, "concat.txt")
-        try:
-            write_ffconcat(concat_path, selected)
-        except Exception as e:
-            add_error_detail(
-                job_id,
-                "CRITICAL",
-                "rendering",
-                f"Failed to create concat file: {str(e)}",
+            picks = select_highlights(
+                candidates,
+                target_duration,
+                per_clip_cap=settings.HIGHLIGHT_MAX_PER_CLIP,
+                repeat_decay=settings.HIGHLIGHT_REPEAT_DECAY,
             )
-            raise RetryableException(f"Concat file creation failed: {str(e)}") from e
+            selected: List[Tuple[str, float, float]] = [
+                (candidates[i][0], candidates[i][1], take) for i, take in picks
+            ]
+            total = sum(take for _, take in picks)
 
-        variants = ["landscape", "portrait"]
-        video_outputs = {}
-        for v in variants:
-            update_progress(
-                job_id,
-                60 + (10 * variants.index(v)),
-                "rendering",
-                f"Rendering {v} format...",
-            )
-            out_path = os.path.join(export_dir, f"video_{v}.mp4")
-            try:
-                render_with_fallback(concat_path, out_path, preset=v)
-                video_outputs[v] = out_path
-            except Exception as e:
+            if not selected:
+                # Fallback: take from first file
                 add_error_detail(
-                    job_id, "CRITICAL", "rendering", f"Failed to render {v}: {str(e)}"
+                    job_id, "WARNING", "selection", "No scenes selected, using fallback"
                 )
-                raise RetryableException(f"Rendering {v} failed: {str(e)}") from e
-        update_progress(job_id, 80, "rendering", "Rendering complete")
+                selected = [(preprocessed[0], 0.0, float(target_duration))]
+            done = {"slices": selected, "total": total}
+            # Degraded results are not checkpointed: a retry tries them again
+            if detection_ok:
+                manifest.complete("selection", inputs, done)
+        logger.info(
+            f"Selected {len(done['slices'])} highlights ({done['total']:.1f}s)",
+            extra={"job_id": job_id, "stage": "selection"},
+        )
+        return [tuple(s) for s in done["slices"]]
 
-        # Stage 5: Post-processing (80-95%)
-        update_progress(job_id, 85, "postprocessing", "Generating AI music bed...")
-        music_path = os.path.join(export_dir, "music.mp3")
+    def soundtrack(ctx: StageContext) -> Optional[str]:
+        total = sum(dur for _, _, dur in ctx.result("selection"))
+        music_path = os.path.join(export_dir, "music.wav")
 
         # Get style from job if available
         job_style = None
@@ -554,28 +755,33 @@ def render_job_enhanced(self, job_id: str, target_duration: int):
             if job and job.style_id:
                 job_style = job.style_id
 
-        try:
-            generate_music_bed(
-                total or target_duration, music_path, style=job_style or "gaming"
-            )
-        except Exception as e:
-            add_error_detail(
-                job_id,
-                "WARNING",
-                "postprocessing",
-                f"Music generation failed: {str(e)}",
-            )
-            logger.warning(
-                f"Music generation failed, continuing without music: {str(e)}",
-                extra={"job_id": job_id, "stage": "postprocessing"},
-            )
-            music_path = None  # Continue without music
+        inputs = [total or target_duration, job_style]
+        done = manifest.get("soundtrack", inputs)
+        if done is None:
+            try:
+                generate_music_bed(
+                    total or target_duration, music_path, style=job_style or "gaming"
+                )
+            except Exception as e:
+                add_error_detail(
+                    job_id,
+                    "WARNING",
+                    "postprocessing",
+                    f"Music generation failed: {str(e)}",
+                )
+                logger.warning(
+                    f"Music generation failed, continuing without music: {str(e)}",
+                    extra={"job_id": job_id, "stage": "postprocessing"},
+                )
+                return None  # Continue without music
+            done = {"music": music_path}
+            manifest.complete("soundtrack", inputs, done, files=[music_path])
+        return done["music"]
 
-        # STT transcription for profanity mute spans (stub)
-        update_progress(job_id, 88, "postprocessing", "Detecting profanity...")
+    def profanity(ctx: StageContext) -> str:
+        # STT transcription of the selected windows for profanity mute spans
         try:
-            transcript = transcribe_audio(preprocessed[0])
-            mute_chain = build_profanity_mute_filters(transcript.get("profanity", []))
+            return _redaction_chain(ctx.result("selection"))
         except Exception as e:
             add_error_detail(
                 job_id,
@@ -583,96 +789,63 @@ def render_job_enhanced(self, job_id: str, target_duration: int):
                 "postprocessing",
                 f"Profanity detection failed: {str(e)}",
             )
-            mute_chain = ""  # Continue without muting
             logger.warning(
                 f"Profanity detection failed: {str(e)}",
                 extra={"job_id": job_id, "stage": "postprocessing"},
             )
-
-        # Mix music into each variant with mute + optional watermark
-        import subprocess
-
-        final_outputs = {}
-        for v, vid in video_outputs.items():
-            update_progress(
-                job_id,
-                90 + (3 * list(video_outputs.keys()).index(v)),
-                "postprocessing",
-                f"Finalizing {v} format...",
-            )
-            final_path = os.path.join(export_dir, f"final_{v}.mp4")
+            return ""  # Continue without muting
+
+    def rendering(ctx: StageContext) -> Dict[str, str]:
+        selected = ctx.result("selection")
+        music_path = ctx.result("soundtrack")
+        inputs = [selected, variants, file_signature(music_path), REDACTION_KEY, settings.WATERMARK_TEXT]
+        done = manifest.get("rendering", inputs)
+        if done is None:
+            concat_path = os.path.join(export_dir, "concat.txt")
             try:
-                # Base audio chain: mute profanities then amix music (if available)
-                if mute_chain:
-                    af_base = f"[0:a]{mute_chain}[aclean];[aclean]volume=1.0[a0]"
-                else:
-                    af_base = "[0:a]volume=1.0[a0]"
-
-                if music_path and os.path.exists(music_path):
-                    af = f"{af_base};[1:a]volume=0.2[a1];[a0][a1]amix=inputs=2:duration=shortest[aout]"
-                    music_input = ["-i", music_path]
-                else:
-                    af = f"{af_base}[aout]"
-                    music_input = []
-
-                vf_overlay = "null"
-                if settings.WATERMARK_TEXT:
-                    # Simple drawtext watermark bottom-right
-                    pos = "x=w-tw-20:y=h-th-20"
-                    vf_overlay = f"drawtext=text='{settings.WATERMARK_TEXT}':fontcolor=white:fontsize=24:{pos}:alpha=0.5"
-
-                cmd = (
-                    ["ffmpeg", "-y", "-i", vid]
-                    + music_input
-                    + [
-                        "-filter_complex",
-                        af
-                        + (
-                            ";[0:v]" + vf_overlay + "[vout]"
-                            if vf_overlay != "null"
-                            else ""
-                        ),
-                        "-map",
-                        "0:v" if vf_overlay == "null" else "[vout]",
-                        "-map",
-                        "[aout]",
-                        "-c:v",
-                        "copy" if vf_overlay == "null" else "libx264",
-                        "-preset",
-                        "veryfast",
-                        "-crf",
-                        "20",
-                        "-c:a",
-                        "aac",
-                        "-b:a",
-                        "192k",
-                        "-shortest",
-                        final_path,
-                    ]
-                )
-                subprocess.run(cmd, check=True, capture_output=True)
-                final_outputs[v] = final_path
-            except subprocess.CalledProcessError as e:
+                write_ffconcat(concat_path, selected)
+            except Exception as e:
                 add_error_detail(
                     job_id,
                     "CRITICAL",
-                    "postprocessing",
-                    f"FFmpeg failed for {v}: {str(e)}",
+                    "rendering",
+                    f"Failed to create concat file: {str(e)}",
                 )
-                raise RetryableException(f"FFmpeg failed for {v}: {str(e)}") from e
+                raise RetryableException(f"Concat file creation failed: {str(e)}") from e
+
+            # Profanity detection runs while the video encodes; only the
+            # audio encode waits for the mute chain
+            finishing = Finishing(
+                music_path,
+                watermark=settings.WATERMARK_TEXT,
+                pending_mutes=lambda: ctx.result("profanity"),
+                mute_key=REDACTION_KEY,
+            )
+            timeline = sum(dur for _, _, dur in selected) or 1.0
+            try:
+                # One decode of the timeline feeds every variant's encode, with
+                # watermark, mute and music mixed into that same encode; the
+                # encoded output time is the stage's progress
+                with ffmpeg_scope(progress=lambda seconds: ctx.progress(seconds / timeline)):
+                    outputs = render_variants(
+                        selected,
+                        concat_path,
+                        {v: os.path.join(export_dir, f"final_{v}.mp4") for v in variants},
+                        finishing,
+                    )
+            except FFmpegCancelledError:
+                raise
             except Exception as e:
                 add_error_detail(
-                    job_id,
-                    "CRITICAL",
-                    "postprocessing",
-                    f"Post-processing failed for {v}: {str(e)}",
+                    job_id, "CRITICAL", "rendering", f"Failed to render variants: {str(e)}"
                 )
-                raise RetryableException(
-                    f"Post-processing failed for {v}: {str(e)}"
-                ) from e
+                raise RetryableException(f"Rendering failed: {str(e)}") from e
+            done = {"outputs": outputs}
+            manifest.complete("rendering", inputs, done, files=list(outputs.values()))
+        return done["outputs"]
 
-        # Stage 6: Upload (95-100%)
-        update_progress(job_id, 95, "upload", "Uploading to storage...")
+    def upload(ctx: StageContext) -> Dict[str, str]:
+        final_outputs: Dict[str, str] = ctx.result("rendering")
         storage = get_storage()
         public_map = {}
         try:
@@ -701,6 +874,42 @@ def render_job_enhanced(self, job_id: str, target_duration: int):
             # Use local paths as fallback
             for v, path in final_outputs.items():
                 public_map[v] = path
+        return public_map
+
+    graph.add("preprocessing", preprocessing, cost=heavy, weight=3)
+    graph.add("selection", selection, needs=["preprocessing"], cost=heavy, weight=3)
+    graph.add("soundtrack", soundtrack, needs=["selection"], weight=1)
+    graph.add("profanity", profanity, needs=["selection"], weight=1)
+    graph.add("rendering", rendering, needs=["selection", "soundtrack"], cost=heavy, weight=8)
+    graph.add("upload", upload, needs=["rendering"], weight=1)
+
+    messages = {
+        "preprocessing": "Normalizing clips...",
+        "selection": "Selecting best highlights...",
+        "soundtrack": "Generating AI music bed...",
+        "profanity": "Detecting profanity...",
+        "rendering": f"Rendering {', '.join(variants)} formats...",
+        "upload": "Uploading to storage...",
+    }
+
+    def report(fraction: float, running: List[str]) -> None:
+        # Called from this thread only, so progress never goes backwards
+        update_progress(
+            job_id,
+            5 + int(90 * fraction),
+            ",".join(running) or "upload",
+            " ".join(messages[name] for name in running) or "Finishing up...",
+        )
+
+    try:
+        update_progress(job_id, 5, "preprocessing", "Collecting uploaded clips...")
+        try:
+            with _job_scope(job_id):
+                results = graph.run(report)
+        finally:
+            _record_stage_timings(job_id, manifest, graph)
+        final_outputs: Dict[str, str] = results["rendering"]
+        public_map: Dict[str, str] = results["upload"]
 
         update_progress(job_id, 100, "complete", "Job completed successfully!")
 
@@ -807,6 +1016,20 @@ def render_job_enhanced(self, job_id: str, target_duration: int):
         except Exception:
             pass
 
+    except FFmpegCancelledError as e:
+        logger.warning(
+            f"Job {job_id} cancelled", extra={"job_id": job_id, "stage": "cancelled"}
+        )
+        update_job_state(
+            job_id,
+            status=JobStatus.FAILED,
+            stage="cancelled",
+            progress=100,
+            error=str(e),
+            mark_finished=True,
+        )
+        raise
+
     except RetryableException as e:
         # Retryable error - attempt retry with exponential backoff
         logger.warning(
@@ -953,7 +1176,7 @@ def render_job_enhanced(self, job_id: str, target_duration: int):
             raise
 
 
-@celery_app.task(name="compile_weekly_montage")
+@celery_app.task(name="compile_weekly_montage", acks_late=True)
 def compile_weekly_montage():
     """
     Compile weekly automated montage from best clips of the week.
@@ -1064,11 +1287,26 @@ def compile_weekly_montage():
                 logger.warning(f"Failed to copy clip {clip_info['path']}: {str(e)}")
                 continue
 
-        # Create job
+        # Create job. It always takes the bulk lane and skips admission (a
+        # beat task has no caller to hand a retry-after to), but carries an
+        # estimate so the ETAs of the jobs queued behind it stay right
+        estimate = estimate_job(
+            session,
+            probe_input_seconds(
+                [os.path.join(upload_dir, name) for name in os.listdir(upload_dir)]
+            ),
+            target_duration,
+            len(RENDER_VARIANTS),
+            "free",
+        )
         job = Job(
             job_id=job_id,
             status=JobStatus.PENDING,
             target_duration=target_duration,
+            lane="bulk",
+            input_seconds=estimate.input_seconds,
+            variant_count=estimate.variant_count,
+            estimated_seconds=estimate.estimated_seconds,
         )
         session.add(job)
 
@@ -1083,7 +1321,7 @@ def compile_weekly_montage():
         extra={"job_id": job_id, "stage": "compile"},
     )
 
-    render_job.delay(job_id, target_duration)
+    render_job.apply_async((job_id, target_duration), queue=render_queue("bulk"))
 
     return {
         "status": "created",
@@ -1257,7 +1495,7 @@ def refresh_expiring_platform_tokens():
         )
 
 
-@celery_app.task(name="learn_frontend_patterns")
+@celery_app.task(name="learn_frontend_patterns", acks_late=True)
 def learn_frontend_patterns():
     """
     Automated daily task to learn front-end design patterns.
@@ -1290,3 +1528,23 @@ def learn_frontend_patterns():
     except Exception as e:
         logger.error(f"Failed to learn front-end patterns: {e}", exc_info=True)
         return {"status": "failed", "error": str(e)}
+
+
+@celery_app.task(name="warm_music_library", acks_late=True)
+def warm_music_library():
+    """
+    Pre-render music beds for the default style and every style preset,
+    so render jobs trim a ready bed instead of generating one.
+    Runs daily via Celery Beat; beds already in the library are skipped.
+    """
+    from pipeline.music import warm_music_library as warm
+    from pipeline.style.profiles import STYLE_PRESETS
+
+    styles = ["gaming", *STYLE_PRESETS]
+    try:
+        rendered = warm(styles)
+    except Exception as e:
+        logger.error(f"Failed to warm music library: {e}", exc_info=True)
+        return {"status": "failed", "error": str(e)}
+    logger.info(f"Music library warm: {rendered} beds rendered")
+    return {"status": "completed", "rendered": rendered}
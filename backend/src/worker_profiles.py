@@ -0,0 +1,101 @@
+"""
+Celery queue topology and worker profiles.
+
+Each workload class has its own queues: renders (one queue per admission
+lane), analysis, I/O (platform sync, social posting, token refresh) and
+maintenance. A worker consumes the queues of one profile, picked at startup
+with ``WORKER_PROFILE``, so short I/O tasks never wait behind renders and
+render processes never sit in HTTP waits:
+
+    WORKER_PROFILE=render celery -A tasks.celery_app worker
+    WORKER_PROFILE=io celery -A tasks.celery_app worker
+
+Long tasks are declared ``acks_late`` and their profiles prefetch one message
+per process, so a job is only taken by a process that is free to run it and
+is redelivered if its worker dies. I/O workers use a thread pool with a
+deeper prefetch.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from celery import Celery
+from kombu import Exchange, Queue
+
+from config import settings
+from services.job_scheduler import LANES, render_queue
+
+RENDER_QUEUES = tuple(render_queue(lane) for lane in LANES)
+# Shards of jobs already running, taken before any new job is started
+SHARD_QUEUE = render_queue("shard")
+ANALYSIS_QUEUE = "analysis"
+IO_QUEUE = "io"
+MAINTENANCE_QUEUE = "maintenance"
+LEGACY_QUEUE = "celery"  # Celery's default; drained for messages sent before the split
+
+TASK_ROUTES = {
+    "render_job": {"queue": render_queue("standard")},
+    "render_job_enhanced": {"queue": render_queue("standard")},
+    "prepare_clip": {"queue": SHARD_QUEUE},
+    "render_segment": {"queue": SHARD_QUEUE},
+    "render_shards_failed": {"queue": SHARD_QUEUE},
+    "learn_frontend_patterns": {"queue": ANALYSIS_QUEUE},
+    "sync_all_users_clips": {"queue": IO_QUEUE},
+    "sync_user_clips": {"queue": IO_QUEUE},
+    "post_to_social_async": {"queue": IO_QUEUE},
+    "refresh_expiring_platform_tokens": {"queue": IO_QUEUE},
+    "compile_weekly_montage": {"queue": MAINTENANCE_QUEUE},
+    "warm_music_library": {"queue": MAINTENANCE_QUEUE},
+}
+
+
+@dataclass(frozen=True)
+class WorkerProfile:
+    queues: Tuple[str, ...]  # polled in this order
+    pool: str
+    concurrency: int
+    prefetch_multiplier: int
+
+
+def worker_profiles() -> Dict[str, WorkerProfile]:
+    batch = (ANALYSIS_QUEUE, MAINTENANCE_QUEUE, LEGACY_QUEUE)
+    return {
+        "render": WorkerProfile(
+            (SHARD_QUEUE, *RENDER_QUEUES), "prefork", settings.WORKER_CONCURRENCY, 1
+        ),
+        "io": WorkerProfile((IO_QUEUE,), "threads", settings.IO_WORKER_CONCURRENCY, 4),
+        "batch": WorkerProfile(batch, "prefork", 1, 1),
+        # Single worker for development: quick I/O first, then renders
+        "all": WorkerProfile(
+            (IO_QUEUE, SHARD_QUEUE, *RENDER_QUEUES, *batch),
+            "prefork",
+            settings.WORKER_CONCURRENCY,
+            1,
+        ),
+    }
+
+
+def configure_celery(app: Celery, profile: str) -> WorkerProfile:
+    """Apply the queue topology and the named worker profile to ``app``."""
+    profiles = worker_profiles()
+    if profile not in profiles:
+        raise ValueError(
+            f"Unknown worker profile {profile!r}; expected one of {', '.join(profiles)}"
+        )
+    selected = profiles[profile]
+    app.conf.update(
+        task_routes=TASK_ROUTES,
+        task_default_queue=MAINTENANCE_QUEUE,
+        task_queues=[Queue(name, Exchange(name), routing_key=name) for name in selected.queues],
+        # Queues are polled in declared order; unacknowledged (acks_late)
+        # messages are redelivered only after the visibility timeout, which
+        # must outlast the longest render
+        broker_transport_options={
+            "queue_order_strategy": "priority",
+            "visibility_timeout": settings.CELERY_VISIBILITY_TIMEOUT_SECONDS,
+        },
+        worker_pool=selected.pool,
+        worker_concurrency=selected.concurrency,
+        worker_prefetch_multiplier=selected.prefetch_multiplier,
+    )
+    return selected
@@ -158,3 +158,66 @@ class TestAdminAPI:
         
         assert response.status_code in [401, 403]
 
+
+
+class TestLegacyJobsAPI:
+    """Test the unversioned job submission endpoint"""
+
+    @pytest.fixture
+    def submit(self, client, tmp_path, monkeypatch):
+        import db
+        import main
+        from sqlalchemy.pool import StaticPool
+        from sqlmodel import SQLModel, create_engine
+
+        # One connection for every thread, so the handler sees the test's tables
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        SQLModel.metadata.create_all(engine)
+        monkeypatch.setattr(db, "engine", engine)
+
+        queued = []
+        monkeypatch.setattr(main, "job_upload_dir", lambda jid: str(tmp_path))
+        monkeypatch.setattr(main, "probe_input_seconds", lambda paths: 120.0)
+        monkeypatch.setattr(
+            main.render_job, "apply_async", lambda args, queue: queued.append(queue)
+        )
+
+        def post():
+            return client.post(
+                "/jobs",
+                files={"files": ("clip.mp4", b"\x00" * 16, "video/mp4")},
+                data={"target_duration": "30"},
+            )
+
+        post.queued = queued
+        return post
+
+    def test_create_job_stores_an_estimate(self, submit):
+        """Test legacy jobs are estimated and routed like v2 ones"""
+        from db import get_session
+        from models import Job
+        from sqlmodel import select
+
+        response = submit()
+
+        assert response.status_code == 200
+        with get_session() as session:
+            job = session.exec(select(Job).where(Job.job_id == response.json()["job_id"])).one()
+        assert job.input_seconds == 120.0
+        assert job.estimated_seconds > 0
+        assert submit.queued == [f"render.{job.lane}"]
+
+    def test_create_job_is_rejected_when_the_queue_is_full(self, submit, monkeypatch):
+        """Test legacy jobs go through admission"""
+        from services import job_scheduler
+
+        monkeypatch.setattr(job_scheduler.settings, "SCHEDULER_MAX_WAIT_SECONDS", 0)
+        assert submit().status_code == 200
+
+        response = submit()
+
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+        assert len(submit.queued) == 1
@@ -0,0 +1,48 @@
+import pytest
+
+from pipeline import censor
+
+
+def test_merge_spans_unions_overlaps_and_pads():
+    spans = [(5.0, 6.0), (1.0, 2.0), (1.5, 3.0), (3.05, 4.0), (8.0, 8.0)]
+    assert censor.merge_spans(spans) == [(1.0, 3.0), (3.05, 4.0), (5.0, 6.0)]
+    padded = censor.merge_spans(spans, pad=0.05)
+    assert [v for span in padded for v in span] == pytest.approx(
+        [0.95, 4.05, 4.95, 6.05, 7.95, 8.05]
+    )
+
+
+def test_profanity_mapped_through_slices_onto_timeline():
+    clips = [("a.mp4", 10.0, 5.0), ("b.mp4", 0.0, 3.0), ("a.mp4", 2.0, 2.0)]
+    spans = {
+        "a.mp4": [
+            {"start": 11.0, "end": 11.5},
+            {"start": 14.8, "end": 16.0},  # runs past the slice: clipped
+            {"start": 3.5, "end": 3.8},
+            {"start": 30.0, "end": 31.0},  # never rendered
+        ],
+        "b.mp4": [{"start": 0.2, "end": 0.4}],
+    }
+    timeline = censor.profanity_on_timeline(clips, spans, pad=0.0)
+    assert [v for span in timeline for v in span] == pytest.approx(
+        [1.0, 1.5, 4.8, 5.0, 5.2, 5.4, 9.5, 9.8]
+    )
+
+
+def test_redaction_filter_is_one_volume_driven_by_content_addressed_commands(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(censor, "cache_dir", lambda kind: str(tmp_path))
+    assert censor.build_redaction_filter([]) == "anull"
+
+    intervals = [(i * 0.5, i * 0.5 + 0.2) for i in range(5000)]
+    chain = censor.build_redaction_filter(intervals)
+    assert chain.count("volume") == 1 and len(chain) < 200
+    assert chain == censor.build_redaction_filter(list(intervals))
+
+    (commands,) = tmp_path.iterdir()
+    lines = commands.read_text().splitlines()
+    assert len(lines) == 5000
+    assert lines[1] == (
+        "0.500-0.700 [enter] volume@redact volume 0, [leave] volume@redact volume 1;"
+    )
@@ -0,0 +1,32 @@
+import json
+import os
+
+from pipeline.checkpoints import MANIFEST_NAME, StageManifest
+
+
+def test_completed_stage_is_reused_across_instances(tmp_path):
+    out = tmp_path / "clip.mp4"
+    out.write_bytes(b"normalized")
+    StageManifest(str(tmp_path)).complete("preprocessing", ["in"], {"clips": [str(out)]}, [str(out)])
+
+    manifest = StageManifest(str(tmp_path))
+    assert manifest.get("preprocessing", ["in"]) == {"clips": [str(out)]}
+    assert manifest.get("preprocessing", ["other input"]) is None
+    assert manifest.get("analysis", ["in"]) is None
+
+
+def test_changed_or_missing_output_invalidates_stage(tmp_path):
+    out = tmp_path / "final.mp4"
+    out.write_bytes(b"render")
+    manifest = StageManifest(str(tmp_path))
+    manifest.complete("rendering", [1], {"outputs": {"landscape": str(out)}}, [str(out)])
+
+    out.write_bytes(b"partial")  # truncated by a crashed re-render
+    assert manifest.get("rendering", [1]) is None
+    os.remove(out)
+    assert manifest.get("rendering", [1]) is None
+
+    # Outputs that were never written are not recorded as complete
+    manifest.complete("music", [1], {}, [str(tmp_path / "missing.mp3")])
+    stages = json.loads((tmp_path / MANIFEST_NAME).read_text())["stages"]
+    assert "music" not in stages
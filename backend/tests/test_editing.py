@@ -0,0 +1,226 @@
+import os
+
+import pytest
+
+from pipeline import editing
+from pipeline.utils.ffmpeg import FFmpegExecutionError
+from pipeline.utils.probe import MediaInfo
+
+CLIPS = [("/src/a.mp4", 3.0, 4.0), ("/src/b.mp4", 12.5, 3.5), ("/src/a.mp4", 15.0, 2.0)]
+
+
+def _touch_outputs(cmd):
+    for arg in {cmd[-1], *(a for a in cmd if a.endswith(".tmp"))}:
+        with open(arg, "wb") as f:
+            f.write(b"x")
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """Record ffmpeg commands and create their output files."""
+    commands = []
+
+    def run(cmd, **_):
+        commands.append(cmd)
+        _touch_outputs(cmd)
+
+    monkeypatch.setattr(editing, "run_ffmpeg", run)
+    monkeypatch.setattr(editing, "_should_try_nvenc", lambda: False)
+    monkeypatch.setattr(
+        editing, "probe_media", lambda _: MediaInfo("mov,mp4", 20.0, "h264", audio_codec="aac")
+    )
+    monkeypatch.setattr(editing.settings, "RENDER_MAX_WORKERS", 2)
+    return commands
+
+
+def _segment_cmds(commands):
+    return [c for c in commands if "-an" in c]
+
+
+def _outputs(tmp_path, *presets):
+    return {p: str(tmp_path / f"video_{p}.mp4") for p in presets}
+
+
+def test_render_segments_encodes_each_slice_and_stream_copies(tmp_path, fake_ffmpeg):
+    outputs = _outputs(tmp_path, "landscape", "portrait", "square")
+    assert editing.render_segments(CLIPS, outputs) == outputs
+
+    segments = _segment_cmds(fake_ffmpeg)
+    assert sorted((c[c.index("-ss") + 1], c[c.index("-t") + 1]) for c in segments) == [
+        ("12.5", "3.5"),
+        ("15.0", "2.0"),
+        ("3.0", "4.0"),
+    ]
+    for cmd in segments:
+        # One decode per slice, split into a branch per preset
+        assert cmd.count("-i") == 1
+        assert "split=3" in cmd[cmd.index("-filter_complex") + 1]
+        assert cmd.count("-map") == 3
+    finals = [c for c in fake_ffmpeg if c[-1] in outputs.values()]
+    assert len(finals) == 3
+    assert all(c[c.index("-c") + 1] == "copy" for c in finals)
+    assert len([c for c in fake_ffmpeg if "[aout]" in c]) == 1  # audio encoded once
+    assert not os.path.exists(tmp_path / "segments")
+
+
+def test_render_segments_retry_reuses_finished_segments(tmp_path, fake_ffmpeg, monkeypatch):
+    out = str(tmp_path / "video.mp4")
+    recording_run = editing.run_ffmpeg
+
+    def flaky(cmd, **_):
+        if "-ss" in cmd and cmd[cmd.index("-ss") + 1] == "15.0":
+            raise FFmpegExecutionError(cmd, 1, "boom")
+        _touch_outputs(cmd)
+
+    monkeypatch.setattr(editing, "run_ffmpeg", flaky)
+    monkeypatch.setattr(editing.settings, "RENDER_MAX_WORKERS", 1)
+    with pytest.raises(FFmpegExecutionError):
+        editing.render_segments(CLIPS, {"landscape": out})
+    seg_dir = tmp_path / "segments"
+    assert len([n for n in os.listdir(seg_dir) if n.endswith(".mp4")]) == 2
+    assert not [n for n in os.listdir(seg_dir) if n.endswith(".tmp")]
+
+    monkeypatch.setattr(editing, "run_ffmpeg", recording_run)
+    editing.render_segments(CLIPS, {"landscape": out})
+    retried = _segment_cmds(fake_ffmpeg)
+    assert [c[c.index("-ss") + 1] for c in retried] == ["15.0"]
+
+
+def test_segment_encodes_run_elsewhere_leave_only_assembly(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(editing.settings, "RENDER_MODE", "segments")
+    monkeypatch.setattr(editing.settings, "RENDER_CACHE_ENABLED", False)
+    monkeypatch.setattr(editing.settings, "RENDER_SEGMENT_THREADS", 3)
+    outputs = _outputs(tmp_path, "landscape", "portrait")
+
+    encodes = editing.segment_encodes(CLIPS, outputs)
+    assert [clip for clip, _, _, _ in encodes] == CLIPS
+    for encode in encodes:  # e.g. shard tasks on other workers
+        editing.encode_segment(*encode)
+    # Encoder threads are fixed, whatever the CPU slots granted
+    assert all(
+        c[i + 1] == "3" for c in fake_ffmpeg for i, arg in enumerate(c) if arg == "-threads"
+    )
+    assert editing.segment_encodes(CLIPS, outputs) == []
+
+    fake_ffmpeg.clear()
+    editing.render_variants(CLIPS, str(tmp_path / "concat.txt"), outputs)
+    assert _segment_cmds(fake_ffmpeg) == []
+    assert len(fake_ffmpeg) == 3  # the audio, then one stream-copy concat per variant
+
+
+def test_render_segments_falls_back_to_x264_for_whole_timeline(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(editing, "_should_try_nvenc", lambda: True)
+    encoders = []
+
+    def run(cmd, **_):
+        if "-c:v" in cmd:
+            encoders.extend(arg for prev, arg in zip(cmd, cmd[1:]) if prev == "-c:v")
+            if "h264_nvenc" in cmd and "12.5" in cmd:
+                raise FFmpegExecutionError(cmd, 1, "nvenc session limit")
+        _touch_outputs(cmd)
+
+    monkeypatch.setattr(editing, "run_ffmpeg", run)
+    editing.render_segments(CLIPS, _outputs(tmp_path, "landscape", "portrait"))
+    # Fallback re-encodes the whole timeline: every slice, every preset
+    assert encoders.count("libx264") == len(CLIPS) * 2
+
+
+def test_render_audio_cuts_each_slice_and_fills_silence(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(
+        editing,
+        "probe_media",
+        lambda path: MediaInfo("mov,mp4", 20.0, "h264", audio_codec=None if "b.mp4" in path else "aac"),
+    )
+    assert editing._render_audio(CLIPS, str(tmp_path / "audio.m4a"))
+    cmd = fake_ffmpeg[-1]
+    assert cmd.count("-i") == 3
+    assert "anullsrc=r=48000:cl=stereo" in cmd
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "concat=n=3:v=0:a=1" in graph and "atrim=0:3.5" in graph
+
+    monkeypatch.setattr(editing, "probe_media", lambda _: MediaInfo("mov,mp4", 20.0, "h264"))
+    assert not editing._render_audio(CLIPS, str(tmp_path / "audio.m4a"))
+
+
+def test_write_ffconcat_sets_outpoint(tmp_path):
+    path = tmp_path / "concat.txt"
+    editing.write_ffconcat(str(path), [("/src/a.mp4", 3.0, 4.0)])
+    assert "inpoint 3.0\noutpoint 7.0\nduration 4.0" in path.read_text()
+
+
+def test_concat_mode_renders_all_variants_from_one_decode(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(editing.settings, "RENDER_MODE", "concat")
+    outputs = _outputs(tmp_path, "landscape", "portrait")
+    editing.render_variants(CLIPS, str(tmp_path / "concat.txt"), outputs)
+    assert len(fake_ffmpeg) == 1
+    cmd = fake_ffmpeg[0]
+    assert cmd.count("-i") == 1 and "concat" in cmd
+    assert [a for a in cmd if a.endswith(".mp4")] == list(outputs.values())
+
+
+def test_concat_mode_keeps_nvenc_fallback(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(editing, "_should_try_nvenc", lambda: True)
+    tried = []
+
+    def run(cmd, **_):
+        tried.append(cmd[cmd.index("-c:v") + 1])
+        if "h264_nvenc" in cmd:
+            raise FFmpegExecutionError(cmd, 1, "no nvenc device")
+
+    monkeypatch.setattr(editing, "run_ffmpeg", run)
+    editing.render_with_fallback(str(tmp_path / "concat.txt"), str(tmp_path / "v.mp4"))
+    assert tried == ["h264_nvenc", "libx264"]
+
+
+def test_finishing_fuses_watermark_mute_and_music(tmp_path, fake_ffmpeg):
+    music = tmp_path / "music.mp3"
+    music.write_bytes(b"x")
+    finishing = editing.Finishing(str(music), "volume=enable='between(t,1,2)':volume=0", "Cosmiv")
+    outputs = _outputs(tmp_path, "landscape", "portrait")
+    editing.render_variants(CLIPS, str(tmp_path / "concat.txt"), outputs, finishing)
+
+    for cmd in _segment_cmds(fake_ffmpeg):
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert graph.count("drawtext=text='Cosmiv'") == 2
+    audio = [c for c in fake_ffmpeg if "[aout]" in c]
+    assert len(audio) == 1
+    assert str(music) in audio[0]
+    graph = audio[0][audio[0].index("-filter_complex") + 1]
+    assert "[atimeline]volume=enable='between(t,1,2)':volume=0[aclean]" in graph
+    assert f"[{len(CLIPS)}:a:0]volume=0.2[amusic]" in graph
+    # Finals are stream copies: no second generation of video encoding
+    finals = [c for c in fake_ffmpeg if c[-1] in outputs.values()]
+    assert all(c[c.index("-c") + 1] == "copy" for c in finals)
+
+
+def test_concat_mode_finishing_is_one_command(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(editing.settings, "RENDER_MODE", "concat")
+    music = tmp_path / "music.mp3"
+    music.write_bytes(b"x")
+    outputs = _outputs(tmp_path, "landscape", "square")
+    editing.render_variants(
+        CLIPS, str(tmp_path / "concat.txt"), outputs, editing.Finishing(str(music), "anull", "")
+    )
+    assert len(fake_ffmpeg) == 1
+    cmd = fake_ffmpeg[0]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "drawtext" not in graph and "aclean" not in graph
+    assert "[amix]asplit=2[aout0][aout1]" in graph
+    assert "[aout0]" in cmd and "[aout1]" in cmd and cmd.count("-shortest") == 2
+
+
+def test_pending_mutes_are_awaited_after_the_video_segments(tmp_path, fake_ffmpeg):
+    encoded_before_resolve = []
+
+    def mutes():
+        encoded_before_resolve.append(len(_segment_cmds(fake_ffmpeg)))
+        return "asendcmd=f='redact.cmd',volume@redact=1"
+
+    finishing = editing.Finishing(pending_mutes=mutes, mute_key="stt-v1")
+    outputs = _outputs(tmp_path, "landscape")
+    editing.render_variants(CLIPS, str(tmp_path / "concat.txt"), outputs, finishing)
+
+    assert encoded_before_resolve == [len(CLIPS)]
+    audio = [c for c in fake_ffmpeg if "[aout]" in c][0]
+    graph = audio[audio.index("-filter_complex") + 1]
+    assert "[atimeline]asendcmd=f='redact.cmd',volume@redact=1[aclean]" in graph
@@ -0,0 +1,252 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from pipeline import feature_store as fs
+from pipeline import features as ft
+from pipeline import highlight_detection as hd
+from pipeline import window_index as wi
+
+
+def _features(scene_cut, motion=None, power=None, peak=None, fps=10.0):
+    n = len(scene_cut)
+    return ft.ClipFeatures(
+        fps=fps,
+        scene_cut=np.asarray(scene_cut, dtype=np.float32),
+        motion=np.asarray(motion if motion is not None else [np.nan] * n, dtype=np.float32),
+        audio_power=np.asarray(power if power is not None else [0.0] * n, dtype=np.float64),
+        audio_peak=np.asarray(peak if peak is not None else [0.0] * n, dtype=np.float32),
+        has_audio=power is not None,
+    )
+
+
+def test_scenes_from_features_respects_min_scene_len():
+    cut = [0.0] * 60
+    cut[20] = 45.0
+    cut[25] = 50.0  # too close to the previous cut
+    cut[40] = 31.0
+    scenes = ft.scenes_from_features(_features(cut), min_scene_len=15)
+    assert scenes == [(0.0, 2.0), (2.0, 4.0), (4.0, 6.0)]
+    assert ft.scenes_from_features(_features([0.0] * 60)) == []
+
+
+def test_scenes_from_features_scales_min_scene_len_to_decimated_fps():
+    # 10 fps samples of a 30 fps source: 15 source frames are 5 samples
+    cut = [0.0] * 60
+    cut[20] = 45.0
+    cut[26] = 50.0  # 18 source frames after the previous cut
+    features = _features(cut)
+    features.meta["fps"] = 30.0
+    assert ft.scenes_from_features(features, threshold=40.0) == [
+        (0.0, 2.0), (2.0, 2.6), (2.6, 6.0)
+    ]
+    assert ft.scenes_from_features(features, threshold=40.0, min_scene_len=30) == [
+        (0.0, 2.0), (2.0, 6.0)
+    ]
+
+
+def test_frame_audio_features_matches_volumedetect_math():
+    sr, fps = 1000, 10.0
+    samples = np.concatenate([np.full(500, 0.5), np.full(500, 0.1)]).astype(np.float32)
+    power, peak = ft.frame_audio_features(samples, sr, fps, 10)
+    assert power[:5] == pytest.approx([0.25] * 5)
+    assert power[5:] == pytest.approx([0.01] * 5)
+    assert peak[0] == pytest.approx(0.5)
+    assert peak[-1] == pytest.approx(0.1)
+
+
+def test_scorers_read_from_feature_arrays(monkeypatch):
+    n = 40
+    features = _features(
+        [0.0] * n,
+        motion=[np.nan] * 2 + [4.0] * (n - 2),
+        power=[0.01] * n,
+        peak=[0.5] * n,
+    )
+    calls = []
+
+    def fake_get(path):
+        calls.append(path)
+        return features
+
+    monkeypatch.setattr(hd, "get_clip_features", fake_get)
+    monkeypatch.setattr(wi, "get_clip_features", fake_get)
+    assert hd.motion_score("clip.mp4", 0.0, 2.0) == pytest.approx(4.0, rel=0.02)
+    assert hd.estimate_loudness("clip.mp4", 0.0, 2.0) == pytest.approx(-20.0)
+    assert hd.audio_energy_score("clip.mp4", 0.0, 2.0) == pytest.approx(10.0 + (-6.0206 + 20.0) / 3, rel=1e-3)
+    assert hd.detect_scenes_seconds("clip.mp4") == [(0.0, 30.0)]
+    assert set(calls) == {"clip.mp4"}
+
+
+def test_window_index_matches_brute_force():
+    rng = np.random.default_rng(7)
+    n = 3000
+    features = _features(
+        [0.0] * n,
+        motion=np.concatenate([[np.nan] * 5, rng.gamma(2.0, 5.0, n - 5)]),
+        power=rng.random(n) * 0.1,
+        peak=rng.random(n),
+        fps=30.0,
+    )
+    index = wi.index_for(features)
+    assert wi.index_for(features) is index
+    for start, duration in [(0.0, 4.0), (12.3, 2.5), (50.0, 40.0), (99.0, 5.0)]:
+        window = features.window(start, duration)
+        motion = features.motion[window]
+        motion = motion[~np.isnan(motion)]
+        assert index.motion_mean(start, duration) == pytest.approx(motion.mean(), rel=1e-6)
+        assert index.motion_variance(start, duration) == pytest.approx(motion.var(), rel=1e-4)
+        assert index.motion_max(start, duration) == pytest.approx(motion.max())
+        assert index.motion_median(start, duration) == pytest.approx(np.median(motion), rel=0.1)
+        mean_db, peak_db = index.volume(start, duration)
+        assert mean_db == pytest.approx(ft.power_to_db(features.audio_power[window].mean()))
+        assert peak_db == pytest.approx(ft.amplitude_to_db(features.audio_peak[window].max()))
+
+    # Block prefix histograms plus the partial blocks at either edge count
+    # every frame of the window exactly once
+    bins = np.minimum(np.nan_to_num(features.motion) / index._bin_width, wi.MEDIAN_BINS - 1)
+    bins = np.where(np.isnan(features.motion), wi.MEDIAN_BINS, bins.astype(int))
+    for lo, hi in [(0, 1), (3, 60), (0, 64), (63, 129), (64, 2999), (2950, 3000)]:
+        expected = np.bincount(bins[lo:hi], minlength=wi.MEDIAN_BINS + 1)[:-1]
+        assert np.array_equal(index._bin_counts(lo, hi), expected)
+
+
+def test_load_pcm_decodes_once_and_memory_maps(tmp_path, monkeypatch):
+    from pipeline import audio_cache
+
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"not really a video")
+    monkeypatch.setattr(audio_cache, "cache_dir", lambda kind: str(tmp_path))
+    decodes = []
+
+    def fake_decode(path, out, sample_rate):
+        decodes.append(path)
+        out.flush()  # ffmpeg writes through the descriptor
+        os.write(out.fileno(), (np.arange(32000, dtype="<f4") / 32000.0).tobytes())
+        return True
+
+    monkeypatch.setattr(audio_cache, "decode_pcm", fake_decode)
+    first = audio_cache.load_pcm(str(clip))
+    second = audio_cache.pcm_slice(str(clip), 1.0, 0.5)
+    assert len(decodes) == 1
+    assert isinstance(first, np.memmap)
+    assert second.shape == (8000,)
+    assert second[0] == pytest.approx(0.5)
+
+
+def test_stub_transcription_does_not_decode_the_clip(monkeypatch):
+    from services.stt import whisper_stub
+
+    loads = []
+    monkeypatch.setattr(whisper_stub, "pcm_slice", lambda *a, **k: loads.append(a))
+    result = whisper_stub.transcribe_audio("clip.mp4")
+    assert [w["word"] for w in result["profanity"]] == ["damn"]
+    assert loads == []  # PCM is only loaded for a model that reads it
+
+def _synthetic_clip(tmp_path, cut_frame=45, frames=90):
+    path = str(tmp_path / "synthetic.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (640, 360))
+    if not writer.isOpened():
+        pytest.skip("mp4v encoder unavailable")
+    for i in range(frames):
+        frame = np.full((360, 640, 3), (0, 0, 200) if i < cut_frame else (200, 100, 0), np.uint8)
+        frame[100:150, (i * 8) % 600 : (i * 8) % 600 + 40] = 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_extract_clip_features_single_pass(tmp_path, monkeypatch):
+    path = _synthetic_clip(tmp_path)
+    monkeypatch.setattr(ft, "load_pcm", lambda *_: None)
+    monkeypatch.setattr(fs, "cache_dir", lambda kind: str(tmp_path / kind))
+    (tmp_path / "features").mkdir()
+    fs.clear_feature_memo()
+    features = fs.get_clip_features(path)
+    assert features.frame_count == 90
+    assert fs.get_clip_features(path) is features
+    assert ft.scenes_from_features(features) == [(0.0, 1.5), (1.5, 3.0)]
+    assert np.nanmax(features.motion) > 0
+    assert not features.has_audio
+
+    # A repeat job (fresh worker) loads the stored entry instead of decoding.
+    fs.clear_feature_memo()
+    monkeypatch.setattr(fs, "extract_clip_features", lambda *_: pytest.fail("re-decoded"))
+    cached = fs.get_clip_features(path)
+    assert cached.frame_count == 90
+    assert cached.scenes == features.scenes
+    assert cached.meta["width"] == 640
+    np.testing.assert_array_equal(cached.motion, features.motion)
+
+
+def test_fast_profile_refines_cuts_to_source_frame(tmp_path, monkeypatch):
+    # Cut at frame 47 falls between two 10 fps samples (every 3rd frame).
+    path = _synthetic_clip(tmp_path, cut_frame=47)
+    monkeypatch.setattr(ft, "load_pcm", lambda *_: None)
+    profile = ft.AnalysisProfile("fast-test", width=160, sample_fps=10.0, refine=True)
+    features = ft.extract_clip_features(path, profile)
+    assert features.fps == pytest.approx(10.0)
+    assert features.scenes[0] == (0.0, pytest.approx(47 / 30))
+
+    coarse = ft.extract_clip_features(path, ft.AnalysisProfile("coarse", width=160, sample_fps=10.0))
+    assert coarse.scenes[0][1] == pytest.approx(1.6)  # first sample after the cut
+
+
+def test_window_motion_backend_decodes_only_the_window(tmp_path, monkeypatch):
+    path = _synthetic_clip(tmp_path)
+    values = ft.window_motion(path, 0.5, 1.0, sample_fps=6)
+    # Frames 15..45 inclusive at every 5th frame -> 7 samples -> 6 diffs.
+    assert values.shape == (6,)
+    assert float(values.min()) > 0
+
+    monkeypatch.setattr(hd.settings, "MOTION_BACKEND", "window")
+    monkeypatch.setattr(hd, "get_window_index", lambda _: pytest.fail("used timeline"))
+    assert hd.motion_score(path, 0.5, 1.0) == pytest.approx(float(np.median(values)))
+
+    # The fused score decodes the window once for both motion signals
+    decodes = []
+    monkeypatch.setattr(hd, "window_motion", lambda *args: decodes.append(args) or values)
+    monkeypatch.setattr(hd, "audio_energy_score", lambda *args: 30.0)
+    scores = hd.fused_score(path, 0.5, 1.0)
+    assert len(decodes) == 1
+    assert scores["motion"] == pytest.approx(min(100, 2 * float(np.median(values))))
+
+
+def test_window_backend_only_replaces_motion(monkeypatch):
+    # Scenes and loudness still come from the whole-clip features: the
+    # detector decodes each clip in full under either motion backend
+    cut = [0.0] * 60
+    cut[30] = 45.0
+    features = _features(cut, power=[0.01] * 60, peak=[0.5] * 60)
+    passes, windows = [], []
+
+    def fake_get(path):
+        passes.append(path)
+        return features
+
+    monkeypatch.setattr(hd, "get_clip_features", fake_get)
+    monkeypatch.setattr(wi, "get_clip_features", fake_get)
+    monkeypatch.setattr(hd.settings, "MOTION_BACKEND", "window")
+    monkeypatch.setattr(
+        hd, "window_motion", lambda *args: windows.append(args) or np.full(5, 7.0, np.float32)
+    )
+    slices = hd.HeuristicHighlightDetector()._analyze_clip("clip.mp4")
+
+    assert [(s.start, s.end) for s in slices] == [(0.0, 3.0), (3.0, 6.0)]
+    assert [s.motion for s in slices] == [7.0, 7.0]
+    assert [s.loudness for s in slices] == [pytest.approx(-20.0)] * 2
+    assert len(windows) == 2
+    assert set(passes) == {"clip.mp4"}
+
+
+def test_feature_store_evicts_least_recently_used(tmp_path):
+    from pipeline.utils.disk_cache import prune
+
+    for i, name in enumerate(["old", "mid", "new"]):
+        entry = tmp_path / f"{name}.npz"
+        entry.write_bytes(b"x" * 100)
+        os.utime(entry, (1000 + i, 1000 + i))
+    assert prune(str(tmp_path), 250) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["mid.npz", "new.npz"]
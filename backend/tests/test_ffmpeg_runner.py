@@ -0,0 +1,109 @@
+import stat
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from pipeline.utils import ffmpeg
+from pipeline.utils.ffmpeg import (
+    FFmpegCancelledError,
+    FFmpegExecutionError,
+    cancel_job,
+    ffmpeg_scope,
+    run_ffmpeg,
+)
+
+# Stands in for ffmpeg: honours the injected "-progress pipe:N", then acts
+# out the scenario named by its last argument
+FAKE_FFMPEG = """\
+    import os, sys, time
+    args = sys.argv[1:]
+    progress = os.fdopen(int(args[args.index("-progress") + 1].split(":")[1]), "w")
+    scenario = args[-1]
+    with open(os.environ["FAKE_FFMPEG_CALLS"], "a") as calls:
+        calls.write(scenario + "\\n")
+
+    def report(seconds):
+        progress.write(f"out_time_us={int(seconds * 1e6)}\\nprogress=continue\\n")
+        progress.flush()
+
+    if scenario == "encode":
+        for i in range(1000):
+            sys.stderr.write(f"frame {i}\\n")
+        for seconds in (1, 2, 3):
+            report(seconds)
+    elif scenario == "pipe":
+        sys.stdout.buffer.write(sys.stdin.buffer.read()[::-1])
+    elif scenario == "hang":
+        report(1)
+        time.sleep(60)
+    else:
+        sys.stderr.write(scenario + "\\n")
+        sys.exit(1)
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!{sys.executable}\n" + textwrap.dedent(FAKE_FFMPEG))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    calls = tmp_path / "calls.txt"
+    calls.write_text("")
+    monkeypatch.setenv("FAKE_FFMPEG_CALLS", str(calls))
+    return str(script), lambda: calls.read_text().splitlines()
+
+
+def test_progress_is_streamed_and_stderr_tail_is_bounded(fake_ffmpeg):
+    exe, _ = fake_ffmpeg
+    seen = []
+    with ffmpeg_scope(progress=seen.append):
+        result = run_ffmpeg([exe, "encode"])
+
+    assert seen == [1.0, 2.0, 3.0]
+    lines = result.stderr.splitlines()
+    assert len(lines) == ffmpeg.STDERR_TAIL_LINES
+    assert lines[-1] == "frame 999"
+
+
+def test_input_is_piped_in_and_stdout_written_to_a_file(fake_ffmpeg, tmp_path):
+    exe, _ = fake_ffmpeg
+    data = bytes(range(256)) * 1000
+    with open(tmp_path / "out.bin", "w+b") as out:
+        out.write(b"header")
+        run_ffmpeg([exe, "pipe"], input=data, stdout=out)
+    assert (tmp_path / "out.bin").read_bytes() == b"header" + data[::-1]
+
+def test_only_transient_failures_are_retried(fake_ffmpeg):
+    exe, calls = fake_ffmpeg
+    with pytest.raises(FFmpegExecutionError) as bad_input:
+        run_ffmpeg([exe, "Invalid data found when processing input"], retry_delay=0)
+    assert not bad_input.value.transient
+    assert len(calls()) == 1
+
+    with pytest.raises(FFmpegExecutionError) as network:
+        run_ffmpeg([exe, "Connection reset by peer"], retries=2, retry_delay=0)
+    assert network.value.transient
+    assert len(calls()) == 1 + 3
+
+
+def test_cancel_stops_the_jobs_processes_and_later_commands(fake_ffmpeg):
+    exe, calls = fake_ffmpeg
+    started = threading.Event()
+    with ffmpeg_scope("job-1", progress=lambda seconds: started.set()):
+        threading.Thread(target=lambda: started.wait(5) and cancel_job("job-1")).start()
+        began = time.monotonic()
+        with pytest.raises(FFmpegCancelledError):
+            run_ffmpeg([exe, "hang"])
+        assert time.monotonic() - began < 10
+
+        with pytest.raises(FFmpegCancelledError):
+            run_ffmpeg([exe, "encode"])
+    assert calls() == ["hang"]
+
+    # The cancellation ends with the job's scope
+    assert cancel_job("job-1") == 0
+    with ffmpeg_scope("job-1"):
+        run_ffmpeg([exe, "encode"])
@@ -35,3 +35,18 @@ def test_get_highlight_detector_defaults_to_heuristic(monkeypatch):
     monkeypatch.setattr(hd.settings, "HIGHLIGHT_DETECTOR", "unknown")
     detector = hd.get_highlight_detector()
     assert isinstance(detector, hd.HeuristicHighlightDetector)
+
+
+def test_parallel_analysis_matches_sequential(monkeypatch):
+    paths = [f"clip_{i}.mp4" for i in range(6)]
+    monkeypatch.setattr(
+        hd, "motion_score", lambda vp, start, duration, **_: float(paths.index(vp) % 3) + start
+    )
+    detector = hd.HeuristicHighlightDetector()
+
+    monkeypatch.setattr(hd.settings, "ANALYSIS_MAX_WORKERS", 1)
+    sequential = detector.detect(paths, target_duration=20)
+    monkeypatch.setattr(hd.settings, "ANALYSIS_MAX_WORKERS", 4)
+    monkeypatch.setattr(hd, "pool_size", lambda tasks, limit=0: min(tasks, limit))
+    parallel = detector.detect(paths, target_duration=20)
+    assert parallel == sequential
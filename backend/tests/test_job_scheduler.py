@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import db
+from models import Entitlement, Job, JobStatus
+from services import job_scheduler
+from services.job_scheduler import AdmissionRejected, admit, estimate_job, eta_seconds
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(job_scheduler.settings, "SCHEDULER_RENDER_CAPACITY", 1)
+    monkeypatch.setattr(job_scheduler.settings, "SCHEDULER_MAX_WAIT_SECONDS", 600)
+    monkeypatch.setattr(job_scheduler.settings, "SCHEDULER_USER_CONCURRENCY", "free=1,pro=3")
+    monkeypatch.setattr(job_scheduler.settings, "SCHEDULER_BULK_INPUT_SECONDS", 1800)
+    monkeypatch.setattr(job_scheduler.settings, "SCHEDULER_DEFAULT_RATE", 0.5)
+    with db.get_session() as session:
+        yield session
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def add_job(session, job_id, status=JobStatus.PENDING, **fields):
+    now = utcnow()
+    job = Job(
+        job_id=job_id, status=status, target_duration=60, created_at=now, updated_at=now, **fields
+    )
+    session.add(job)
+    session.commit()
+    return job
+
+
+def test_lane_follows_plan_and_upload_size(session):
+    session.add(Entitlement(user_id="u-pro", plan="pro"))
+    session.add(Entitlement(user_id="u-lapsed", plan="pro", expires_at=utcnow() - timedelta(days=1)))
+    session.commit()
+
+    assert job_scheduler.user_plan(session, "u-pro") == "pro"
+    assert job_scheduler.user_plan(session, "u-lapsed") == "free"
+    assert estimate_job(session, 120, 60, 2, "pro").lane == "priority"
+    assert estimate_job(session, 120, 60, 2, "free").lane == "standard"
+    assert estimate_job(session, 3600, 60, 2, "free").lane == "bulk"
+    assert estimate_job(session, 3600, 60, 2, "pro").lane == "standard"
+
+
+def test_estimate_learns_the_rate_from_finished_jobs(session):
+    units = job_scheduler.work_units(100, 60, 2)  # 100 + 4 * 60 * 2
+    assert estimate_job(session, 100, 60, 2, "free").estimated_seconds == 10 + 0.5 * units
+
+    for i, rate in enumerate([1.0, 2.0, 2.0, 3.0, 50.0]):  # the median ignores the outlier
+        add_job(
+            session, f"done-{i}", JobStatus.SUCCESS,
+            input_seconds=100, variant_count=2, processing_time_seconds=rate * units,
+        )
+    assert estimate_job(session, 100, 60, 2, "free").estimated_seconds == 10 + 2.0 * units
+
+
+def test_user_over_their_plan_cap_is_told_when_to_retry(session):
+    add_job(
+        session, "running", JobStatus.PROCESSING, user_id="u-free", lane="standard",
+        estimated_seconds=100, started_at=utcnow() - timedelta(seconds=40),
+    )
+    estimate = estimate_job(session, 10, 30, 2, "free")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit(session, "u-free", "free", estimate)
+    assert 55 <= rejected.value.retry_after <= 60  # when the running job should finish
+
+    admit(session, "u-other", "free", estimate)  # other users are unaffected
+
+
+def test_concurrent_submissions_are_admitted_in_insertion_order(session):
+    # Both rows are committed before either is admitted: only the jobs
+    # inserted ahead of each one count against it
+    estimate = estimate_job(session, 10, 30, 2, "free")
+    first = add_job(session, "first", user_id="u-free", lane="standard")
+    second = add_job(session, "second", user_id="u-free", lane="standard")
+
+    with pytest.raises(AdmissionRejected):
+        admit(session, "u-free", "free", estimate, before_id=second.id)
+    admit(session, "u-free", "free", estimate, before_id=first.id)
+
+
+def test_backlog_beyond_the_wait_limit_is_rejected_per_lane(session):
+    add_job(session, "big-1", lane="standard", estimated_seconds=400)
+    add_job(session, "big-2", lane="standard", estimated_seconds=400)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit(session, None, "free", estimate_job(session, 10, 30, 2, "free"))
+    assert rejected.value.retry_after == 200  # 800s queued ahead, 600s allowed
+
+    # Nothing in the priority lane is ahead of a paid job
+    admit(session, None, "pro", estimate_job(session, 10, 30, 2, "pro"))
+
+
+def test_eta_counts_running_work_and_jobs_queued_ahead(session):
+    add_job(
+        session, "running", JobStatus.PROCESSING, lane="standard",
+        estimated_seconds=100, started_at=utcnow() - timedelta(seconds=30),
+    )
+    first = add_job(session, "first", lane="standard", estimated_seconds=50)
+    second = add_job(session, "second", lane="standard", estimated_seconds=20)
+    urgent = add_job(session, "urgent", lane="priority", estimated_seconds=10)
+    done = add_job(session, "done", JobStatus.SUCCESS, estimated_seconds=10)
+
+    assert eta_seconds(session, urgent) == pytest.approx(70 + 10, abs=1)
+    assert eta_seconds(session, first) == pytest.approx(70 + 10 + 50, abs=1)
+    assert eta_seconds(session, second) == pytest.approx(70 + 10 + 50 + 20, abs=1)
+    assert eta_seconds(session, done) is None
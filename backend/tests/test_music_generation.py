@@ -0,0 +1,36 @@
+import numpy as np
+
+from services import music_generation
+from services.music_generation import MusicGenerator, PROCEDURAL_SAMPLE_RATE
+
+
+def _dominant_freq(samples, sample_rate=PROCEDURAL_SAMPLE_RATE):
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.fft.rfftfreq(len(samples), 1 / sample_rate)[int(np.argmax(spectrum))]
+
+
+def test_procedural_synthesis_cycles_chords_with_fades():
+    sr = PROCEDURAL_SAMPLE_RATE
+    pcm = MusicGenerator._synthesize_procedural(20.0, "gaming", sr)
+    assert pcm.dtype == np.float32 and len(pcm) == 20 * sr
+    # Bass (octave below the chord root) dominates; the root changes every 8 s
+    assert abs(_dominant_freq(pcm[2 * sr : 6 * sr]) - 110) < 1
+    assert abs(_dominant_freq(pcm[10 * sr : 14 * sr]) - 131) < 1
+    assert pcm[0] == 0 and abs(pcm[-1]) < 1e-4
+    assert np.abs(pcm[: sr // 10]).max() < np.abs(pcm[5 * sr : 6 * sr]).max() * 0.2
+
+
+def test_procedural_generation_is_one_encode_without_temp_files(tmp_path, monkeypatch):
+    calls = []
+
+    def run(cmd, input=None, **_):
+        calls.append((cmd, input))
+
+    monkeypatch.setattr(music_generation, "run_ffmpeg", run)
+    out = str(tmp_path / "music.mp3")
+    assert MusicGenerator._generate_procedural(3.0, out, "calm") == out
+    assert len(calls) == 1
+    cmd, pcm = calls[0]
+    assert cmd[-1] == out and "pipe:0" in cmd
+    assert len(pcm) == 3 * PROCEDURAL_SAMPLE_RATE * 2  # s16 mono
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,71 @@
+import shutil
+import wave
+
+import numpy as np
+import pytest
+
+from pipeline import music_library
+
+RATE = 1000
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Isolated bed library with a fake generator that writes constant-level PCM."""
+    renders = []
+
+    def render(duration, output_path):
+        renders.append(duration)
+        with wave.open(output_path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(RATE)
+            f.writeframes(np.full(int(duration * RATE), 1000, dtype="<i2").tobytes())
+        return output_path
+
+    # The fake render is already PCM WAV: conversion is a copy
+    monkeypatch.setattr(music_library, "run_ffmpeg", lambda cmd: shutil.copy(cmd[3], cmd[-1]))
+    monkeypatch.setattr(music_library, "cache_dir", lambda kind: str(tmp_path / "music"))
+    monkeypatch.setattr(music_library.settings, "MUSIC_LIBRARY_ENABLED", True)
+    monkeypatch.setattr(music_library.settings, "MUSIC_LIBRARY_BUCKETS", "10,30")
+    monkeypatch.setattr(music_library.settings, "MUSIC_LIBRARY_FADE_SECONDS", 1.0)
+    (tmp_path / "music").mkdir()
+    return render, renders
+
+
+def read_samples(path):
+    with wave.open(str(path), "rb") as f:
+        return np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+
+
+def test_beds_rendered_once_per_bucket_and_trimmed(library, tmp_path):
+    render, renders = library
+    key = ("tone", 220)
+
+    for duration in (4.0, 7.5, 10.0):
+        out = tmp_path / f"music_{duration}.wav"
+        music_library.fetch(key, duration, str(out), render)
+        samples = read_samples(out)
+        assert len(samples) == int(duration * RATE)
+        body = samples[: -RATE]
+        assert (body == 1000).all()  # copied verbatim
+        assert samples[-RATE] == 1000 and samples[-1] < 5  # faded tail
+        assert np.all(np.diff(samples[-RATE:]) <= 0)
+
+    assert renders == [10]  # one bed served all three requests
+
+
+def test_durations_beyond_buckets_render_directly(library, tmp_path):
+    render, renders = library
+    out = tmp_path / "music.wav"
+    music_library.fetch(("tone", 220), 45.0, str(out), render)
+    assert renders == [45.0]
+    assert len(read_samples(out)) == 45 * RATE
+    assert not list((tmp_path / "music").iterdir())
+
+
+def test_warm_renders_missing_buckets_only(library):
+    render, renders = library
+    assert music_library.warm(("ai", "procedural", "chill"), render) == 2
+    assert music_library.warm(("ai", "procedural", "chill"), render) == 0
+    assert renders == [10, 30]
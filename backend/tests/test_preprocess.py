@@ -0,0 +1,104 @@
+import pytest
+
+from pipeline import preprocess as pp
+from pipeline.utils.probe import MediaInfo
+
+
+def _info(**overrides):
+    base = dict(
+        format_name="mov,mp4,m4a,3gp,3g2,mj2",
+        duration=12.0,
+        video_codec="h264",
+        width=1920,
+        height=1080,
+        pix_fmt="yuv420p",
+        fps=30.0,
+        avg_fps=30.0,
+        audio_codec="aac",
+        audio_channels=2,
+        audio_sample_rate=48000,
+    )
+    base.update(overrides)
+    return MediaInfo(**base)
+
+
+@pytest.mark.parametrize(
+    "info, expected",
+    [
+        (_info(), pp.SKIP),
+        (_info(audio_codec=None), pp.SKIP),
+        (_info(format_name="matroska,webm"), pp.REMUX),
+        (_info(audio_codec="opus"), pp.AUDIO),
+        (_info(width=1280, height=720), pp.TRANSCODE),
+        (_info(fps=60.0, avg_fps=60.0), pp.TRANSCODE),
+        (_info(avg_fps=29.1), pp.TRANSCODE),  # variable frame rate
+        (_info(video_codec="hevc"), pp.TRANSCODE),
+        (_info(pix_fmt="yuv420p10le"), pp.TRANSCODE),
+        (_info(rotation=90), pp.TRANSCODE),
+        (None, pp.TRANSCODE),  # probe failed
+    ],
+)
+def test_plan_normalization(info, expected):
+    assert pp.plan_normalization(info, "/out/000_clip.mp4") == expected
+
+
+def test_normalize_clip_uses_cheapest_command(tmp_path, monkeypatch):
+    src = tmp_path / "in.mkv"
+    src.write_bytes(b"data")
+    commands = []
+    monkeypatch.setattr(pp, "run_ffmpeg", lambda cmd: commands.append(cmd))
+
+    monkeypatch.setattr(pp, "probe_media", lambda _: _info(audio_codec="mp3"))
+    pp.normalize_clip(str(src), str(tmp_path / "out" / "a.mp4"))
+    cmd = commands[-1]
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+
+    monkeypatch.setattr(pp, "probe_media", lambda _: _info(width=3840, height=2160))
+    monkeypatch.setattr(pp.settings, "PREPROCESS_THREADS_PER_CLIP", 3)
+    pp.normalize_clip(str(src), str(tmp_path / "out" / "b.mp4"))
+    cmd = commands[-1]
+    assert cmd[cmd.index("-c:v") + 1] == "libx264"
+    # Fixed encoder threads: the bytes must not depend on the free CPU slots
+    assert cmd[cmd.index("-threads") + 1] == "3"
+
+    monkeypatch.setattr(pp, "probe_media", lambda _: _info())
+    out = tmp_path / "out" / "c.mp4"
+    pp.normalize_clip(str(src), str(out))
+    assert len(commands) == 2  # conforming MP4 never reaches ffmpeg
+    assert out.read_bytes() == b"data"
+
+
+def test_preprocess_clips_runs_concurrently_in_order(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    from pipeline.utils import workers
+
+    monkeypatch.setattr(workers, "available_cpus", lambda: 16)
+    monkeypatch.setattr(pp.settings, "WORKER_CONCURRENCY", 2)
+    monkeypatch.setattr(pp.settings, "PREPROCESS_THREADS_PER_CLIP", 2)
+    assert workers.split_threads(10, 2) == (4, 2)
+    assert workers.split_threads(3, 2) == (3, 2)
+    assert workers.split_threads(1, 2) == (1, 8)
+
+    inputs = [str(tmp_path / f"clip{i}.mov") for i in range(6)]
+    calls = []
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_normalize(src, dst):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05 if src.endswith("0.mov") else 0.01)
+        with lock:
+            active[0] -= 1
+            calls.append((src, dst))
+        return dst
+
+    monkeypatch.setattr(pp, "normalize_clip", fake_normalize)
+    out = pp.preprocess_clips(inputs, str(tmp_path))
+    assert [p.rsplit("/", 1)[1] for p in out] == [f"{i:03d}_clip{i}.mp4" for i in range(6)]
+    assert 1 < peak[0] <= 4
+    assert len(calls) == 6
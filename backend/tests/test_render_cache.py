@@ -0,0 +1,105 @@
+import os
+import time
+
+import pytest
+
+from pipeline import editing, render_cache
+from pipeline.utils.disk_cache import prune
+
+
+@pytest.fixture
+def cached_render(tmp_path, monkeypatch):
+    """Concat-mode renderer with a fake ffmpeg and an isolated render cache."""
+    commands = []
+
+    def run(cmd, **_):
+        commands.append(cmd)
+        for prev, arg in zip(cmd, cmd[1:]):
+            if arg.endswith(".mp4") and prev != "-i":
+                with open(arg, "wb") as f:
+                    f.write(f"render {len(commands)}".encode())
+
+    monkeypatch.setattr(editing, "run_ffmpeg", run)
+    monkeypatch.setattr(editing, "_should_try_nvenc", lambda: False)
+    monkeypatch.setattr(editing.settings, "RENDER_MODE", "concat")
+    monkeypatch.setattr(editing.settings, "RENDER_CACHE_ENABLED", True)
+    monkeypatch.setattr(render_cache, "cache_dir", lambda kind: str(tmp_path / "cache"))
+    os.makedirs(tmp_path / "cache")
+
+    src = tmp_path / "clip.mp4"
+    src.write_bytes(b"source clip")
+    clips = [(str(src), 1.0, 2.0), (str(src), 5.0, 1.5)]
+
+    def render(job, presets=("landscape", "portrait"), finishing=None):
+        job_dir = tmp_path / job
+        job_dir.mkdir(exist_ok=True)
+        outputs = {p: str(job_dir / f"final_{p}.mp4") for p in presets}
+        editing.render_variants(clips, str(job_dir / "concat.txt"), outputs, finishing)
+        return outputs
+
+    return render, commands, src
+
+
+def test_identical_render_is_linked_from_cache(cached_render):
+    render, commands, _ = cached_render
+    first = render("job1")
+    assert len(commands) == 1
+
+    second = render("job2")
+    assert len(commands) == 1  # no encode
+    for preset, path in second.items():
+        assert os.path.samefile(path, first[preset])
+
+
+def test_cache_key_covers_content_and_settings(cached_render):
+    render, commands, src = cached_render
+    render("job1")
+    render("job2", finishing=editing.Finishing(watermark="Cosmiv"))
+    assert len(commands) == 2
+
+    # A partial hit renders only the missing preset
+    render("job3", presets=("landscape", "square"))
+    assert len(commands) == 3
+    assert "split=1" in commands[-1][commands[-1].index("-filter_complex") + 1]
+
+    src.write_bytes(b"different source")
+    render("job4")
+    assert len(commands) == 4
+
+
+def test_rerender_does_not_truncate_cached_copy(cached_render, tmp_path, monkeypatch):
+    render, commands, _ = cached_render
+    first = render("job1")
+    before = open(first["landscape"], "rb").read()
+    monkeypatch.setattr(editing.settings, "RENDER_CACHE_ENABLED", False)
+    render("job1")  # same job dir: outputs are hard links to cache entries
+    assert len(commands) == 2
+    cache = tmp_path / "cache"
+    assert {(cache / name).read_bytes() for name in os.listdir(cache)} == {before}
+
+
+def test_prune_evicts_entries_past_max_age(tmp_path):
+    old, fresh = tmp_path / "old.mp4", tmp_path / "fresh.mp4"
+    old.write_bytes(b"o")
+    fresh.write_bytes(b"f")
+    stale = time.time() - 7200
+    os.utime(old, (stale, stale))
+    assert prune(str(tmp_path), max_bytes=1 << 20, max_age=3600) == 1
+    assert not old.exists() and fresh.exists()
+
+
+def test_content_hash_memo_keeps_only_recent_files(tmp_path, monkeypatch):
+    from pipeline.utils import hashing
+
+    monkeypatch.setattr(hashing, "_MEMO_SIZE", 2)
+    monkeypatch.setattr(hashing, "_memo", hashing.OrderedDict())
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+    first = hashing.content_hash(paths[0])
+    hashing.content_hash(paths[1])
+    assert hashing.content_hash(paths[0]) == first  # a is now the most recent
+    hashing.content_hash(paths[2])
+    assert [key[0] for key in hashing._memo] == [paths[0], paths[2]]
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from pipeline.selection import EventIndex, IntervalSet, select_highlights
+
+
+def test_event_index_matches_linear_scan():
+    rng = random.Random(3)
+    events = [{"time": rng.uniform(0, 600), "confidence": rng.random()} for _ in range(500)]
+    index = EventIndex(events)
+    for _ in range(200):
+        center = rng.uniform(-10, 610)
+        expected = max(
+            (ev["confidence"] for ev in events if abs(ev["time"] - center) <= 3.0),
+            default=0.0,
+        )
+        assert index.max_confidence(center, 3.0) == pytest.approx(expected)
+        nearest = min(events, key=lambda ev: abs(ev["time"] - center))["time"]
+        assert index.nearest(center) == pytest.approx(nearest)
+
+
+def test_event_index_strict_window_and_untimed_events():
+    index = EventIndex([{"time": 5.0, "confidence": 0.8}])
+    assert index.max_confidence(2.0, 3.0) == pytest.approx(0.8)
+    assert index.max_confidence(2.0, 3.0, inclusive=False) == 0.0
+    assert EventIndex([{"confidence": 0.4}]).max_confidence(100.0, 1.0) == pytest.approx(0.4)
+    assert EventIndex([]).nearest(1.0) is None
+
+
+def test_interval_set_overlap():
+    intervals = IntervalSet()
+    intervals.add(10.0, 14.0)
+    intervals.add(2.0, 4.0)
+    assert intervals.overlaps(3.5, 5.0)
+    assert intervals.overlaps(9.0, 10.5)
+    assert intervals.overlaps(11.0, 12.0)
+    assert not intervals.overlaps(4.0, 10.0)
+    assert not intervals.overlaps(14.0, 20.0)
+
+
+def test_selection_respects_budget_cap_and_overlap():
+    candidates = [
+        ("a.mp4", 0.0, 6.0, 90.0),
+        ("a.mp4", 2.0, 6.0, 85.0),  # overlaps the first window
+        ("a.mp4", 10.0, 4.0, 80.0),
+        ("b.mp4", 0.0, 4.0, 50.0),
+        ("c.mp4", 0.0, 2.0, 20.0),
+    ]
+    picks = select_highlights(candidates, budget=10.0, per_clip_cap=2)
+    chosen = [i for i, _ in picks]
+    assert chosen == [0, 2, 3]
+    assert sum(take for _, take in picks) == pytest.approx(10.0)
+
+
+def test_repeat_decay_spreads_selection_across_clips():
+    candidates = [("a.mp4", float(s), 4.0, 60.0) for s in range(0, 40, 4)]
+    candidates.append(("b.mp4", 0.0, 4.0, 50.0))
+    first_two = [i for i, _ in select_highlights(candidates, budget=8.0, repeat_decay=0.5)]
+    assert first_two == [0, len(candidates) - 1]
+    no_decay = [i for i, _ in select_highlights(candidates, budget=8.0)]
+    assert no_decay == [0, 1]
+
+
+def test_short_low_score_slices_do_not_beat_long_high_score_ones():
+    candidates = [
+        ("a", 0.0, 0.5, 40.0),
+        ("a", 10.0, 0.5, 41.0),
+        ("a", 20.0, 6.0, 60.0),
+        ("b", 0.0, 8.0, 70.0),
+        ("b", 30.0, 0.6, 30.0),
+    ]
+    assert select_highlights(candidates, budget=5.0) == [(3, 4.0), (2, 1.0)]
+
+    # Equal scores: the denser (shorter) window wins the tie
+    tied = [("a", 0.0, 4.0, 50.0), ("b", 0.0, 2.0, 50.0)]
+    assert [i for i, _ in select_highlights(tied, budget=2.0)] == [1]
+
+
+def test_selection_scales_to_long_vods():
+    rng = random.Random(7)
+    candidates = [
+        (f"vod_{i % 5}.mp4", i * 0.5, rng.uniform(0.5, 8.0), rng.uniform(0, 100))
+        for i in range(50_000)
+    ]
+    picks = select_highlights(candidates, budget=120.0, repeat_decay=0.9)
+    assert sum(take for _, take in picks) >= 120.0
+    spans = sorted((candidates[i][0], candidates[i][1], candidates[i][1] + take) for i, take in picks)
+    for (clip_a, _, end_a), (clip_b, start_b, _) in zip(spans, spans[1:]):
+        assert clip_a != clip_b or end_a <= start_b
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from pipeline.stage_graph import StageGraph
+
+
+def test_independent_stages_overlap_within_budget():
+    graph = StageGraph(budget=2)
+    started = threading.Barrier(2, timeout=5)
+
+    def light(ctx):
+        started.wait()  # only passes if both run at once
+        return ctx.stage.name
+
+    graph.add("analysis", lambda ctx: "slices")
+    graph.add("music", light, needs=["analysis"])
+    graph.add("transcription", light, needs=["analysis"])
+    graph.add("rendering", lambda ctx: (ctx.result("music"), ctx.result("transcription")),
+              needs=["music", "transcription"])
+
+    results = graph.run()
+    assert results["rendering"] == ("music", "transcription")
+    assert graph.timings["rendering"].started >= graph.timings["music"].started
+
+
+def test_late_result_releases_the_waiting_stages_budget():
+    # With one slot, rendering can only get its mutes if waiting frees the slot
+    graph = StageGraph(budget=1)
+    graph.add("analysis", lambda ctx: [1, 2])
+    graph.add("rendering", lambda ctx: sum(ctx.result("analysis")) + ctx.result("mutes"),
+              needs=["analysis"], cost=4)
+    graph.add("mutes", lambda ctx: (time.sleep(0.05), 10)[1], needs=["analysis"])
+
+    assert graph.run()["rendering"] == 13
+    assert graph.timings["rendering"].waited > 0
+
+
+def test_failure_cancels_pending_stages_and_is_raised():
+    graph = StageGraph(budget=1)
+    ran = []
+
+    def broken(ctx):
+        raise RuntimeError("decode failed")
+
+    graph.add("preprocessing", broken)
+    graph.add("rendering", lambda ctx: ran.append("rendering"), needs=["preprocessing"])
+
+    with pytest.raises(RuntimeError, match="decode failed"):
+        graph.run()
+    assert ran == []
+    assert "rendering" not in graph.timings
+
+
+def test_progress_is_monotonic_and_names_running_stages():
+    graph = StageGraph(budget=2)
+    graph.add("preprocessing", lambda ctx: None, weight=3)
+    graph.add("music", lambda ctx: time.sleep(0.02), needs=["preprocessing"])
+
+    def rendering(ctx):
+        for fraction in (0.5, 0.25, 1.0):  # a late, lower report is ignored
+            ctx.progress(fraction)
+            time.sleep(0.02)
+
+    graph.add("rendering", rendering, needs=["preprocessing"], weight=8)
+    reports = []
+
+    graph.run(lambda fraction, running: reports.append((fraction, running)))
+
+    fractions = [f for f, _ in reports]
+    assert fractions == sorted(fractions)
+    assert 7 / 12 in fractions  # preprocessing + half of rendering's weight
+    assert reports[-1] == (1.0, [])
+    assert any("rendering" in running for _, running in reports)
+
+
+def test_needs_must_name_earlier_stages():
+    graph = StageGraph(budget=1)
+    with pytest.raises(ValueError):
+        graph.add("rendering", lambda ctx: None, needs=["analysis"])
@@ -1,12 +1,20 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
 from db import get_session
 from models import Job, JobStatus
 from services.job_state import update_job_state
+import tasks
 from tasks import (
     RenderPipelineError,
     RetryableRenderError,
     _classify_ffmpeg_error,
+    _job_scope,
 )
-from pipeline.utils.ffmpeg import FFmpegExecutionError
+from pipeline.utils.ffmpeg import FFmpegCancelledError, FFmpegExecutionError, run_ffmpeg
 from sqlmodel import select
 
 
@@ -22,6 +30,48 @@ def test_classify_ffmpeg_error_fatal():
     assert isinstance(mapped, RenderPipelineError)
 
 
+def test_cancel_marker_cancels_the_jobs_ffmpeg_work(tmp_path, monkeypatch):
+    marker = tmp_path / "CANCELLED"
+    monkeypatch.setattr(tasks, "job_cancel_marker", lambda job_id: str(marker))
+    monkeypatch.setattr(tasks, "CANCEL_POLL_SECONDS", 0.01)
+
+    with _job_scope("job-1"):
+        marker.touch()
+        with pytest.raises(FFmpegCancelledError):
+            for _ in range(100):  # until the watcher has seen the marker
+                run_ffmpeg(["true"])
+    cancelled = FFmpegCancelledError(command=["ffmpeg"], returncode=-9, stderr="")
+    assert isinstance(_classify_ffmpeg_error(cancelled), RenderPipelineError)
+
+
+def test_only_the_owner_or_an_admin_can_cancel_a_job(tmp_path, monkeypatch):
+    from datetime import datetime, timezone
+
+    from fastapi import HTTPException
+
+    import api_v2
+    from models import User, UserRole
+
+    monkeypatch.setattr(api_v2, "job_cancel_marker", lambda job_id: str(tmp_path / job_id))
+    owned, anonymous = "a" * 32, "b" * 32  # job ids are uuid hex
+    now = datetime.now(timezone.utc)
+    with get_session() as session:
+        for job_id, user_id in ((owned, "u-1"), (anonymous, None)):
+            session.add(Job(job_id=job_id, user_id=user_id, created_at=now, updated_at=now))
+        session.commit()
+    owner, other = User(user_id="u-1"), User(user_id="u-2")
+    admin = User(user_id="u-3", role=UserRole.ADMIN)
+
+    for job_id, user in ((owned, other), (owned, None), (anonymous, owner), (anonymous, None)):
+        with pytest.raises(HTTPException) as denied:
+            api_v2.cancel_job_v2(job_id, user)
+        assert denied.value.status_code == 403
+    assert not any(tmp_path.iterdir())
+
+    assert api_v2.cancel_job_v2(owned, owner)["status"] == "cancelling"
+    assert api_v2.cancel_job_v2(anonymous, admin)["status"] == "cancelling"
+    assert sorted(p.name for p in tmp_path.iterdir()) == [owned, anonymous]
+
 def test_update_job_state_persists_progress():
     with get_session() as session:
         job = Job(job_id="test-job")
@@ -44,3 +94,218 @@ def test_update_job_state_persists_progress():
         assert stored.progress == "33"
         assert stored.status == JobStatus.PROCESSING
         assert stored.started_at is not None
+
+
+def test_render_job_retry_resumes_at_failed_stage(tmp_path, monkeypatch):
+    import tasks
+    from pipeline.highlight_detection import SceneSlice
+
+    upload_dir, export_dir = tmp_path / "uploads", tmp_path / "exports"
+    upload_dir.mkdir()
+    export_dir.mkdir()
+    (upload_dir / "a.mp4").write_bytes(b"upload")
+    calls = []
+
+    def preprocess(files, workdir):
+        calls.append("preprocess")
+        path = os.path.join(workdir, "000_a.mp4")
+        with open(path, "wb") as f:
+            f.write(b"normalized")
+        return [path]
+
+    class Detector:
+        def detect(self, clips, target):
+            calls.append("analysis")
+            return [SceneSlice(clips[0], 0.0, 2.0, 1.0, 1.0, 1.0)]
+
+    def music(duration, path, **_):
+        calls.append("music")
+        with open(path, "wb") as f:
+            f.write(b"music")
+
+    attempts = []
+
+    def render(clips, concat_path, outputs, finishing):
+        calls.append("render")
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FFmpegExecutionError(["ffmpeg"], 1, "Connection reset by peer")
+        for path in outputs.values():
+            with open(path, "wb") as f:
+                f.write(b"final")
+        return dict(outputs)
+
+    monkeypatch.setattr(tasks, "job_export_dir", lambda job_id: str(export_dir))
+    monkeypatch.setattr(tasks, "job_upload_dir", lambda job_id: str(upload_dir))
+    monkeypatch.setattr(tasks, "update_job_state", lambda *a, **k: None)
+    monkeypatch.setattr(tasks, "preprocess_clips", preprocess)
+    monkeypatch.setattr(tasks, "get_highlight_detector", Detector)
+    monkeypatch.setattr(tasks, "generate_music_bed", music)
+    monkeypatch.setattr(tasks, "profanity_in_slices", lambda clips: {})
+    monkeypatch.setattr(tasks, "render_variants", render)
+    monkeypatch.setattr(tasks.settings, "USE_OBJECT_STORAGE", False)
+
+    with pytest.raises(RetryableRenderError):
+        tasks.render_job.run("job-1", 10)
+    assert calls == ["preprocess", "analysis", "music", "render"]
+
+    calls.clear()
+    tasks.render_job.run("job-1", 10)
+    assert calls == ["render"]
+
+
+def test_cancelled_render_job_is_reported_cancelled(tmp_path, monkeypatch):
+    from pipeline.highlight_detection import SceneSlice
+
+    upload_dir, export_dir = tmp_path / "uploads", tmp_path / "exports"
+    upload_dir.mkdir()
+    export_dir.mkdir()
+    (upload_dir / "a.mp4").write_bytes(b"upload")
+    marker = tmp_path / "CANCELLED"
+    states = []
+
+    def preprocess(files, workdir):
+        path = os.path.join(workdir, "000_a.mp4")
+        with open(path, "wb") as f:
+            f.write(b"normalized")
+        return [path]
+
+    class Detector:
+        def detect(self, clips, target):
+            return [SceneSlice(clips[0], 0.0, 2.0, 1.0, 1.0, 1.0)]
+
+    def music(duration, path, **_):
+        with open(path, "wb") as f:
+            f.write(b"music")
+
+    def render(clips, concat_path, outputs, finishing):
+        marker.touch()  # the API cancels the job mid-encode
+        for _ in range(100):  # until the watcher has seen the marker
+            run_ffmpeg(["true"])
+        return dict(outputs)
+
+    monkeypatch.setattr(tasks, "job_cancel_marker", lambda job_id: str(marker))
+    monkeypatch.setattr(tasks, "CANCEL_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(tasks, "job_export_dir", lambda job_id: str(export_dir))
+    monkeypatch.setattr(tasks, "job_upload_dir", lambda job_id: str(upload_dir))
+    monkeypatch.setattr(tasks, "update_job_state", lambda job_id, **k: states.append(k))
+    monkeypatch.setattr(tasks, "preprocess_clips", preprocess)
+    monkeypatch.setattr(tasks, "get_highlight_detector", Detector)
+    monkeypatch.setattr(tasks, "generate_music_bed", music)
+    monkeypatch.setattr(tasks, "profanity_in_slices", lambda clips: {})
+    monkeypatch.setattr(tasks, "render_variants", render)
+    monkeypatch.setattr(tasks.settings, "USE_OBJECT_STORAGE", False)
+
+    with pytest.raises(FFmpegCancelledError):
+        tasks.render_job.run("job-1", 10)
+    assert states[-1]["stage"] == "cancelled"
+    assert states[-1]["status"] == JobStatus.FAILED
+    assert not any(state.get("stage") == "failed" for state in states)
+
+
+def test_large_job_fans_out_to_shards_and_resumes_from_their_files(tmp_path, monkeypatch):
+    from pipeline.highlight_detection import SceneSlice
+
+    upload_dir, export_dir = tmp_path / "uploads", tmp_path / "exports"
+    upload_dir.mkdir()
+    export_dir.mkdir()
+    for name in ("a.mp4", "b.mp4"):
+        (upload_dir / name).write_bytes(b"upload")
+    calls = []
+
+    def normalize(src, out):
+        calls.append(("normalize", os.path.basename(src)))
+        with open(out, "wb") as f:
+            f.write(b"normalized")
+
+    class Detector:
+        def detect(self, clips, target):
+            calls.append(("analysis", len(clips)))
+            return [SceneSlice(c, 0.0, 2.0, 1.0, 1.0, 1.0) for c in clips]
+
+    def music(duration, path, **_):
+        with open(path, "wb") as f:
+            f.write(b"music")
+
+    def render(clips, concat_path, outputs, finishing):
+        calls.append(("render", len(clips)))
+        for path in outputs.values():
+            with open(path, "wb") as f:
+                f.write(b"final")
+        return dict(outputs)
+
+    monkeypatch.setattr(tasks.celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(tasks.celery_app.conf, "task_eager_propagates", True)
+    monkeypatch.setattr(tasks, "job_export_dir", lambda job_id: str(export_dir))
+    monkeypatch.setattr(tasks, "job_upload_dir", lambda job_id: str(upload_dir))
+    monkeypatch.setattr(tasks, "update_job_state", lambda *a, **k: None)
+    monkeypatch.setattr(tasks, "normalize_clip", normalize)
+    monkeypatch.setattr(tasks, "get_clip_features", lambda path: None)
+    monkeypatch.setattr(tasks, "preprocess_clips", lambda *a: pytest.fail("preprocessed locally"))
+    monkeypatch.setattr(tasks, "get_highlight_detector", Detector)
+    monkeypatch.setattr(tasks, "generate_music_bed", music)
+    monkeypatch.setattr(tasks, "profanity_in_slices", lambda clips: {})
+    monkeypatch.setattr(
+        tasks,
+        "segment_encodes",
+        lambda clips, outputs, finishing: [(clip, {"landscape": "seg"}, "x264", "") for clip in clips],
+    )
+    monkeypatch.setattr(
+        tasks, "encode_segment", lambda clip, outs, encoder, suffix: calls.append(("segment", clip[0]))
+    )
+    monkeypatch.setattr(tasks, "render_variants", render)
+    monkeypatch.setattr(tasks.settings, "RENDER_SHARD_MIN_CLIPS", 2)
+    monkeypatch.setattr(tasks.settings, "RENDER_SHARD_MIN_SEGMENTS", 2)
+    monkeypatch.setattr(tasks.settings, "USE_OBJECT_STORAGE", False)
+
+    tasks.render_job.apply(args=("job-1", 10)).get()
+
+    clips = sorted(str(p) for p in (export_dir / "preprocessed").iterdir())
+    assert calls == [
+        ("normalize", "a.mp4"),
+        ("normalize", "b.mp4"),
+        ("analysis", 2),
+        ("segment", clips[0]),
+        ("segment", clips[1]),
+        ("render", 2),  # only assembly is left to the callback
+    ]
+    assert not any(name.endswith(".part.mp4") for name in os.listdir(export_dir / "preprocessed"))
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_sharded_preprocessing_matches_the_single_worker_bytes(tmp_path, monkeypatch):
+    from pipeline import preprocess
+    from pipeline.utils import workers
+
+    upload = str(tmp_path / "upload.mp4")
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=640x360:rate=25:duration=2",
+         "-c:v", "libx264", "-pix_fmt", "yuv420p", upload],
+        check=True,
+    )
+    monkeypatch.setattr(tasks, "job_cancel_marker", lambda job_id: str(tmp_path / "CANCELLED"))
+    monkeypatch.setattr(tasks, "get_clip_features", lambda path: None)
+    monkeypatch.setattr(preprocess.settings, "CPU_GOVERNOR_DIR", str(tmp_path / "slots"))
+
+    # A lone job on a big host, then a shard on a small, busy one
+    monkeypatch.setattr(workers, "available_cpus", lambda: 16)
+    (single,) = preprocess.preprocess_clips([upload], str(tmp_path / "single"))
+    monkeypatch.setattr(workers, "available_cpus", lambda: 2)
+    sharded = tasks.prepare_clip.run("job-1", upload, str(tmp_path / "shard.mp4"))
+
+    with open(single, "rb") as a, open(sharded, "rb") as b:
+        assert a.read() == b.read()
+
+def test_failed_shard_fails_the_job(tmp_path, monkeypatch):
+    updates = []
+    monkeypatch.setattr(tasks, "job_cancel_marker", lambda job_id: str(tmp_path / "CANCELLED"))
+    monkeypatch.setattr(tasks, "update_job_state", lambda job_id, **k: updates.append(k))
+
+    tasks.render_shards_failed(None, RenderPipelineError("decode failed"), None, "job-1")
+    (tmp_path / "CANCELLED").touch()
+    tasks.render_shards_failed(None, RenderPipelineError("cancelled"), None, "job-1")
+
+    assert [(u["status"], u["stage"]) for u in updates] == [
+        (JobStatus.FAILED, "failed"),
+        (JobStatus.FAILED, "cancelled"),
+    ]
@@ -0,0 +1,31 @@
+from pipeline import transcripts
+
+
+def test_only_selected_windows_are_transcribed_and_cached(tmp_path, monkeypatch):
+    calls = []
+
+    def transcribe_window(path, start, duration):
+        calls.append((path, start, duration))
+        word = {"word": "damn", "start": start + 0.5, "end": start + 0.9}
+        return {"words": [word], "profanity": [word]}
+
+    monkeypatch.setattr(transcripts, "transcribe_window", transcribe_window)
+    monkeypatch.setattr(transcripts, "cache_dir", lambda kind: str(tmp_path / "cache"))
+    (tmp_path / "cache").mkdir()
+    a, b = tmp_path / "a.mp4", tmp_path / "b.mp4"
+    a.write_bytes(b"clip a")
+    b.write_bytes(b"clip b")
+    clips = [(str(a), 10.0, 5.0), (str(b), 0.0, 3.0), (str(a), 10.0, 5.0)]
+
+    spans = transcripts.profanity_in_slices(clips)
+    assert sorted(calls) == [(str(a), 10.0, 5.0), (str(b), 0.0, 3.0)]
+    assert spans[str(a)] == [{"word": "damn", "start": 10.5, "end": 10.9}]
+    assert spans[str(b)] == [{"word": "damn", "start": 0.5, "end": 0.9}]
+
+    # Cached per (content, window): a renamed copy and a new window
+    c = tmp_path / "c.mp4"
+    c.write_bytes(b"clip a")
+    calls.clear()
+    spans = transcripts.profanity_in_slices([(str(c), 10.0, 5.0), (str(b), 4.0, 2.0)])
+    assert calls == [(str(b), 4.0, 2.0)]
+    assert spans[str(c)][0]["start"] == 10.5
@@ -0,0 +1,41 @@
+import pytest
+from celery import Celery
+
+import tasks
+from worker_profiles import TASK_ROUTES, configure_celery, worker_profiles
+
+
+def test_every_task_is_routed_to_a_queue_some_profile_consumes():
+    app_tasks = {name for name in tasks.celery_app.tasks if not name.startswith("celery.")}
+    assert app_tasks == set(TASK_ROUTES)
+
+    dedicated = {
+        queue for name, profile in worker_profiles().items() if name != "all" for queue in profile.queues
+    }
+    assert {route["queue"] for route in TASK_ROUTES.values()} <= dedicated
+    assert set(worker_profiles()["all"].queues) == dedicated
+
+
+def test_long_tasks_ack_late_and_io_tasks_do_not():
+    assert tasks.render_job.acks_late
+    assert tasks.warm_music_library.acks_late
+    assert not tasks.post_to_social_async.acks_late
+
+
+def test_profile_selects_queues_pool_and_prefetch():
+    app = Celery("profiles-test")
+
+    configure_celery(app, "io")
+    assert [q.name for q in app.conf.task_queues] == ["io"]
+    assert (app.conf.worker_pool, app.conf.worker_prefetch_multiplier) == ("threads", 4)
+
+    configure_celery(app, "render")
+    assert [q.name for q in app.conf.task_queues] == [
+        "render.shard", "render.priority", "render.standard", "render.bulk"
+    ]
+    assert (app.conf.worker_pool, app.conf.worker_prefetch_multiplier) == ("prefork", 1)
+    # Each queue has its own binding, so a message lands in one queue only
+    assert {q.routing_key for q in app.conf.task_queues} == {q.name for q in app.conf.task_queues}
+
+    with pytest.raises(ValueError):
+        configure_celery(app, "gpu")
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from pipeline.utils import workers
+
+
+@pytest.fixture
+def slots(tmp_path, monkeypatch):
+    monkeypatch.setattr(workers.settings, "CPU_GOVERNOR_ENABLED", True)
+    monkeypatch.setattr(workers.settings, "CPU_GOVERNOR_SLOTS", 3)
+    monkeypatch.setattr(workers.settings, "CPU_GOVERNOR_DIR", str(tmp_path))
+    monkeypatch.setattr(workers, "SLOT_POLL_SECONDS", 0.01)
+    return tmp_path
+
+
+def test_cpu_slots_hand_out_what_is_free_and_wait_for_the_minimum(slots):
+    with workers.cpu_slots(2) as first:
+        assert first == 2
+        with workers.cpu_slots(4) as second:  # capped to the host, then to what is free
+            assert second == 1
+
+            granted = []
+
+            def wait_for_slot():
+                with workers.cpu_slots(1) as n:
+                    granted.append(n)
+
+            waiter = threading.Thread(target=wait_for_slot)
+            waiter.start()
+            time.sleep(0.1)
+            assert granted == []  # every slot is taken
+        waiter.join(5)
+        assert granted == [1]
+
+
+def test_cpu_slots_are_shared_across_processes_and_freed_on_exit(slots):
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import fcntl, os, sys, time\n"
+            "for i in range(3):\n"
+            "    fd = os.open(os.path.join(sys.argv[1], f'slot-{i}'), os.O_RDWR | os.O_CREAT)\n"
+            "    fcntl.flock(fd, fcntl.LOCK_EX)\n"
+            "print('held', flush=True)\n"
+            "time.sleep(60)\n",
+            str(slots),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "held"
+        assert workers._take_slots(str(slots), 3, 3) == []
+    finally:
+        holder.kill()
+        holder.wait()
+
+    with workers.cpu_slots(3) as granted:
+        assert granted == 3
+    assert sorted(os.listdir(slots)) == ["slot-0", "slot-1", "slot-2"]
@@ -5,9 +5,10 @@ Editing Agent - Automates video editing using DaVinci Resolve or MoviePy/FFmpeg
 import os
 import json
 import subprocess
+import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Union
 import numpy as np
 from moviepy.editor import (
     VideoFileClip,
@@ -25,6 +26,10 @@ except ImportError:
     LIBROSA_AVAILABLE = False
     print("Warning: librosa not available. Beat detection will be disabled.")
 
+# Decoded audio comes from the backend's PCM cache (one decode per file content)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "backend" / "src"))
+from pipeline.audio_cache import load_pcm
+
 
 class Editor:
     """Automates video editing based on rules and meta patterns"""
@@ -74,13 +79,22 @@ class Editor:
                 .get("trending_patterns", {})
             )
 
-    def detect_beats(self, audio_path: str) -> List[float]:
-        """Detect beat timestamps in audio"""
+    def load_audio_pcm(self, input_video: str, clip, sr: int = 22050) -> Optional[np.ndarray]:
+        """Mono float32 PCM of the clip at ``sr``, memory-mapped from the backend's shared audio cache"""
+        if clip.audio is None:
+            return None
+        return load_pcm(input_video, sr)
+
+    def detect_beats(self, audio: Union[str, np.ndarray], sr: int = 22050) -> List[float]:
+        """Detect beat timestamps in audio (file path or mono float32 samples at ``sr``)"""
         if not LIBROSA_AVAILABLE:
             return []
 
         try:
-            y, sr = librosa.load(audio_path, sr=22050)
+            if isinstance(audio, str):
+                y, sr = librosa.load(audio, sr=sr)
+            else:
+                y = np.asarray(audio, dtype=np.float32)
             tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
             beat_times = librosa.frames_to_time(beats, sr=sr)
             return beat_times.tolist()
@@ -102,10 +116,9 @@ class Editor:
             edited_clips = []
             current_time = 0
 
-            # Extract audio for beat detection
-            audio_path = str(Path(output_path).parent / "temp_audio.wav")
-            clip.audio.write_audiofile(audio_path, verbose=False, logger=None)
-            beats = self.detect_beats(audio_path)
+            # Beat detection reads a memory-mapped PCM cache instead of a temp WAV
+            samples = self.load_audio_pcm(input_video, clip)
+            beats = self.detect_beats(samples) if samples is not None else []
 
             # Apply cut timing rules
             cut_timing = rules_data.get("cut_timing", {})
@@ -170,8 +183,6 @@ class Editor:
             # Cleanup
             clip.close()
             final_clip.close()
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
 
             return {
                 "success": True,